@@ -0,0 +1,265 @@
+"""
+Performance budgets for containers, so that a build fails when an image
+regresses on startup time, memory or CPU usage.
+
+A :class:`Budget` declares the limits, and is usually set on a container
+definition::
+
+    class WebContainer(ContainerDefinition):
+        BUDGET = Budget(startup_seconds=5, max_rss_bytes=128 * 1024 * 1024)
+
+Fixtures created with :func:`~seaworthy.pytest.fixtures.resource_fixture`
+check the budget automatically, sampling the container's resource usage
+while the fixture is in use (see :class:`BudgetMonitor`). The testtools
+matchers in :mod:`seaworthy.testtools` make the same checks.
+"""
+
+import logging
+
+import attr
+
+from seaworthy.usage import ResourceSampler, UsageSeries
+
+
+log = logging.getLogger(__name__)
+
+#: The default number of seconds between resource usage samples taken to
+#: check a budget.
+SAMPLE_INTERVAL = 0.5
+
+_MIB = 1024 * 1024
+
+
+def _format_seconds(value):
+    return '{:.3f}s'.format(value)
+
+
+def _format_bytes(value):
+    return '{:d} bytes ({:.1f} MiB)'.format(int(value), value / _MIB)
+
+
+_FORMATTERS = {
+    'startup_seconds': _format_seconds,
+    'max_rss_bytes': _format_bytes,
+    'max_cpu_seconds': _format_seconds,
+}
+
+
+@attr.s
+class BudgetViolation:
+    """
+    A measurement that is over its budget, or that couldn't be made.
+    """
+
+    #: The name of the limit, for example ``'startup_seconds'``.
+    name = attr.ib()
+    #: The measured value, or ``None`` if it couldn't be measured.
+    measured = attr.ib()
+    #: The budgeted value.
+    budget = attr.ib()
+
+    def __str__(self):
+        fmt = _FORMATTERS[self.name]
+        if self.measured is None:
+            return '{}: not measured (budget {})'.format(
+                self.name, fmt(self.budget))
+        return '{}: measured {}, budget {}'.format(
+            self.name, fmt(self.measured), fmt(self.budget))
+
+
+def describe_violations(name, violations):
+    """
+    Describe the budget violations of the named container, one per line.
+    """
+    lines = ['{} is over budget:'.format(name)]
+    lines.extend('  {}'.format(v) for v in violations)
+    return '\n'.join(lines)
+
+
+class BudgetExceeded(AssertionError):
+    """
+    Raised when a container is over its budget.
+    """
+
+    def __init__(self, name, violations):
+        super().__init__(describe_violations(name, violations))
+        self.name = name
+        self.violations = violations
+
+
+@attr.s
+class Budget:
+    """
+    Limits on a container's performance. Limits that are ``None`` aren't
+    checked.
+    """
+
+    #: The maximum number of seconds the container may take to set up,
+    #: including waiting for it to start, but not counting any time spent
+    #: pulling its image.
+    startup_seconds = attr.ib(default=None)
+    #: The maximum memory usage in bytes, not counting the page cache, at any
+    #: sample.
+    max_rss_bytes = attr.ib(default=None)
+    #: The maximum CPU time in seconds the container may use in total.
+    max_cpu_seconds = attr.ib(default=None)
+
+    def limits(self):
+        """
+        Get a dict of the limits that are set.
+        """
+        return {k: v for k, v in attr.asdict(self).items() if v is not None}
+
+    def needs_sampling(self):
+        """
+        Whether checking this budget needs resource usage samples.
+        """
+        return (self.max_rss_bytes is not None or
+                self.max_cpu_seconds is not None)
+
+    def violations(self, measurements):
+        """
+        Compare measurements with this budget.
+
+        :param measurements: A dict like the one :func:`measure` returns.
+        :returns: A list of :class:`BudgetViolation` objects.
+        """
+        violations = []
+        for name, limit in sorted(self.limits().items()):
+            measured = measurements.get(name)
+            if measured is None or measured > limit:
+                violations.append(BudgetViolation(name, measured, limit))
+        return violations
+
+    def check(self, name, measurements):
+        """
+        Compare measurements with this budget.
+
+        :param name: The name of the container, for the error message.
+        :param measurements: A dict like the one :func:`measure` returns.
+        :raises BudgetExceeded: If any limit is exceeded or not measured.
+        """
+        violations = self.violations(measurements)
+        if violations:
+            raise BudgetExceeded(name, violations)
+
+
+def measure(definition, series=None, source=None):
+    """
+    Measure a container for comparison with a :class:`Budget`.
+
+    :param definition:
+        The :class:`~seaworthy.definitions.ContainerDefinition`. Its startup
+        time is the duration of its latest setup, less the ``fetch_image``
+        phase, so that pulling the image on a cold machine doesn't count.
+    :param series:
+        A :class:`~seaworthy.usage.UsageSeries` of the container's resource
+        usage. If ``None``, and the container is created, one sample is
+        taken now.
+    :param source:
+        The ``source`` of the :class:`~seaworthy.usage.ResourceSampler` used
+        to take that sample.
+    :returns:
+        A dict with ``startup_seconds``, ``max_rss_bytes`` and
+        ``max_cpu_seconds`` keys, leaving out anything that couldn't be
+        measured.
+    """
+    measurements = {}
+    setup = definition.timings.get('setup')
+    if setup is not None and setup.seconds is not None and not setup.failed:
+        measurements['startup_seconds'] = (
+            setup.seconds - setup.phase_seconds('fetch_image'))
+    if series is None and definition.created:
+        # A single sample on this thread, without a background sampler.
+        sampler = ResourceSampler(definition, source=source)
+        sampler.sample()
+        series = sampler.series
+    if series is not None and len(series):
+        measurements['max_rss_bytes'] = series.summary('memory_bytes').max
+        measurements['max_cpu_seconds'] = series.summary('cpu_seconds').max
+    return measurements
+
+
+class BudgetMonitor:
+    """
+    Sample a container's resource usage while it is in use, and then check
+    its budget. The monitor doesn't sample if the budget doesn't need it::
+
+        container.setup()
+        monitor = BudgetMonitor(container).start()
+        ...  # Exercise the container
+        monitor.check()
+    """
+
+    def __init__(self, definition, budget=None, interval=SAMPLE_INTERVAL,
+                 source=None):
+        """
+        :param definition:
+            The :class:`~seaworthy.definitions.ContainerDefinition` to
+            monitor.
+        :param budget: The :class:`Budget`. Defaults to the definition's.
+        :param interval: The number of seconds between samples.
+        :param source:
+            The ``source`` of the :class:`~seaworthy.usage.ResourceSampler`.
+        """
+        if budget is None:
+            budget = definition.budget
+        if budget is None:
+            raise ValueError('No budget given and {} has none.'.format(
+                definition.name))
+        self.definition = definition
+        self.budget = budget
+        self.interval = interval
+        self.source = source
+        self._sampler = None
+        self._measurements = None
+
+    def start(self):
+        """
+        Start sampling, if the budget needs it.
+
+        :returns: This monitor.
+        """
+        if self.budget.needs_sampling() and self._sampler is None:
+            self._sampler = self.definition.sample_resources(
+                self.interval, source=self.source)
+        return self
+
+    def stop(self):
+        """
+        Stop sampling, take a final sample, and measure the container.
+        Further calls return the same measurements.
+
+        :returns: The measurements, like :func:`measure`.
+        """
+        if self._measurements is None:
+            series = None
+            if self._sampler is not None:
+                series = self._sampler.series
+                self._sampler.stop()
+                if self.definition.created:
+                    try:
+                        self._sampler.sample()
+                    except Exception:
+                        log.exception(
+                            'Error sampling resource usage of {}'.format(
+                                self.definition.name))
+            elif not self.budget.needs_sampling():
+                # Don't take a sample that isn't needed.
+                series = UsageSeries()
+            self._measurements = measure(
+                self.definition, series, self.source)
+        return self._measurements
+
+    def check(self):
+        """
+        Stop monitoring and check the budget.
+
+        :raises BudgetExceeded: If the container is over its budget.
+        """
+        self.budget.check(self.definition.name, self.stop())
+
+
+__all__ = [
+    'Budget', 'BudgetExceeded', 'BudgetMonitor', 'BudgetViolation',
+    'SAMPLE_INTERVAL', 'describe_violations', 'measure']
@@ -0,0 +1,318 @@
+"""
+Reading of container resource counters straight from the Linux cgroup
+filesystem, which takes microseconds instead of the second or two that the
+Docker stats API takes.
+
+The cgroup of a container is found from its inspection data: the cgroup
+membership of its main process (``/proc/<pid>/cgroup``), or else the usual
+places that Docker puts container cgroups. Both cgroup v1 and the unified
+cgroup v2 hierarchy are supported. This only works when the tests run on the
+Docker host (not, for example, with Docker Desktop's virtual machine), so
+:class:`CgroupStatsReader` falls back to another source, such as the Docker
+API, when the cgroup files can't be read.
+"""
+
+import logging
+import os
+import threading
+
+import attr
+
+
+log = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+PROC_ROOT = '/proc'
+
+
+@attr.s
+class CgroupLocation:
+    """
+    Where a container's cgroup counters are.
+    """
+
+    #: The cgroup version, 1 or 2.
+    version = attr.ib()
+    #: For cgroup v1, a dict mapping controller names (such as ``memory``)
+    #: to cgroup directories. For cgroup v2, ``{'unified': directory}``.
+    paths = attr.ib()
+    #: The host PID of the container's main process, for network counters.
+    pid = attr.ib(default=None)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _read_int(path):
+    return int(_read(path).strip())
+
+
+def _read_keyed(path):
+    """
+    Read a flat keyed file such as ``memory.stat`` into a dict.
+    """
+    values = {}
+    for line in _read(path).splitlines():
+        key, _, value = line.partition(' ')
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
+
+
+def parse_proc_cgroup(content, root=CGROUP_ROOT):
+    """
+    Parse the contents of ``/proc/<pid>/cgroup`` into a dict mapping
+    controller names to cgroup directories under ``root``. The cgroup v2
+    hierarchy is named ``unified``.
+    """
+    paths = {}
+    for line in content.splitlines():
+        parts = line.split(':', 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, path = parts
+        path = path.lstrip('/')
+        if not controllers:
+            paths['unified'] = os.path.join(root, path)
+            continue
+        for controller in controllers.split(','):
+            # Named hierarchies like name=systemd aren't useful to us.
+            if not controller.startswith('name='):
+                paths[controller] = os.path.join(root, controllers, path)
+    return paths
+
+
+def _guess_paths(attrs, root):
+    """
+    Find a container's cgroup directories from its ID and cgroup parent, for
+    when its process can't be seen.
+    """
+    container_id = attrs['Id']
+    parent = (attrs.get('HostConfig') or {}).get('CgroupParent') or ''
+    candidates = [
+        # The systemd cgroup driver
+        os.path.join(parent or 'system.slice',
+                     'docker-{}.scope'.format(container_id)),
+        # The cgroupfs cgroup driver
+        os.path.join(parent or 'docker', container_id),
+    ]
+    for candidate in candidates:
+        candidate = candidate.lstrip('/')
+        v1 = {c: os.path.join(root, c, candidate)
+              for c in ('memory', 'cpuacct', 'blkio')}
+        if all(os.path.isdir(p) for p in v1.values()):
+            return v1
+        unified = os.path.join(root, candidate)
+        if os.path.isfile(os.path.join(unified, 'cgroup.controllers')):
+            return {'unified': unified}
+    return None
+
+
+def _used_paths(paths):
+    if 'memory' in paths:
+        return [paths.get(c) for c in ('memory', 'cpuacct', 'blkio')]
+    return [paths.get('unified')]
+
+
+def _belongs_to(paths, container_id):
+    """
+    Check that the cgroup directories we read are the container's own, named
+    ``docker-<id>.scope`` or ``<id>``.
+    """
+    names = (container_id, 'docker-{}.scope'.format(container_id))
+    for path in _used_paths(paths):
+        if path is None:
+            return False
+        if not any(part in names for part in path.split(os.sep)):
+            return False
+    return True
+
+
+def find_cgroup(attrs, root=CGROUP_ROOT, proc=PROC_ROOT):
+    """
+    Find a container's cgroup.
+
+    The container's PID is in the Docker daemon's PID namespace, so with a
+    remote daemon or Docker-in-Docker it may be an unrelated local process.
+    Cgroups are therefore only used if their paths name the container's ID.
+
+    :param attrs: The container's inspection data.
+    :param root: Where the cgroup filesystem is mounted.
+    :param proc: Where the proc filesystem is mounted.
+    :returns: A :class:`CgroupLocation`, or ``None`` if it wasn't found.
+    """
+    pid = (attrs.get('State') or {}).get('Pid') or None
+    paths = None
+    if pid is not None:
+        try:
+            paths = parse_proc_cgroup(
+                _read(os.path.join(proc, str(pid), 'cgroup')), root)
+        except OSError:
+            pid = None
+    if not paths or not _belongs_to(paths, attrs['Id']):
+        pid = None
+        paths = _guess_paths(attrs, root)
+    if not paths or not _belongs_to(paths, attrs['Id']):
+        return None
+    version = 1 if 'memory' in paths else 2
+    return CgroupLocation(version, paths, pid)
+
+
+def _read_v1(paths):
+    memory = _read_int(os.path.join(paths['memory'], 'memory.usage_in_bytes'))
+    memory_stat = _read_keyed(os.path.join(paths['memory'], 'memory.stat'))
+    cpu_ns = _read_int(os.path.join(paths['cpuacct'], 'cpuacct.usage'))
+    read = write = 0
+    blkio = paths['blkio']
+    for name in ('blkio.throttle.io_service_bytes_recursive',
+                 'blkio.throttle.io_service_bytes'):
+        try:
+            content = _read(os.path.join(blkio, name))
+        except FileNotFoundError:
+            continue
+        for line in content.splitlines():
+            parts = line.split()
+            if len(parts) == 3 and parts[1] == 'Read':
+                read += int(parts[2])
+            elif len(parts) == 3 and parts[1] == 'Write':
+                write += int(parts[2])
+        break
+    return {
+        'cpu_seconds': cpu_ns / 1e9,
+        'memory_bytes': max(
+            memory - memory_stat.get('total_inactive_file', 0), 0),
+        'blkio_read_bytes': read,
+        'blkio_write_bytes': write,
+    }
+
+
+def _read_v2(path):
+    memory = _read_int(os.path.join(path, 'memory.current'))
+    memory_stat = _read_keyed(os.path.join(path, 'memory.stat'))
+    cpu_stat = _read_keyed(os.path.join(path, 'cpu.stat'))
+    read = write = 0
+    try:
+        io_stat = _read(os.path.join(path, 'io.stat'))
+    except FileNotFoundError:
+        # The io controller isn't enabled for this cgroup.
+        io_stat = ''
+    for line in io_stat.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                read += int(value)
+            elif key == 'wbytes':
+                write += int(value)
+    return {
+        'cpu_seconds': cpu_stat.get('usage_usec', 0) / 1e6,
+        'memory_bytes': max(memory - memory_stat.get('inactive_file', 0), 0),
+        'blkio_read_bytes': read,
+        'blkio_write_bytes': write,
+    }
+
+
+def read_net_dev(pid, proc=PROC_ROOT):
+    """
+    Read the total bytes received and sent on the network interfaces
+    (except loopback) in a process's network namespace.
+
+    :returns: A tuple of ``(rx_bytes, tx_bytes)``.
+    """
+    rx = tx = 0
+    content = _read(os.path.join(proc, str(pid), 'net', 'dev'))
+    # The first two lines are headers.
+    for line in content.splitlines()[2:]:
+        interface, _, counters = line.partition(':')
+        if interface.strip() == 'lo':
+            continue
+        fields = counters.split()
+        rx += int(fields[0])
+        tx += int(fields[8])
+    return rx, tx
+
+
+def read_cgroup_stats(location, proc=PROC_ROOT):
+    """
+    Read a container's counters from its cgroup, in the same form as
+    :func:`seaworthy.usage.parse_api_stats`. Network counters are only
+    available if the container's process is visible, and are otherwise 0.
+
+    :param CgroupLocation location: The container's cgroup.
+    :raises OSError: If the files can't be read.
+    """
+    if location.version == 1:
+        stats = _read_v1(location.paths)
+    else:
+        stats = _read_v2(location.paths['unified'])
+    rx = tx = 0
+    if location.pid is not None:
+        rx, tx = read_net_dev(location.pid, proc)
+    stats['net_rx_bytes'] = rx
+    stats['net_tx_bytes'] = tx
+    return stats
+
+
+class CgroupStatsReader:
+    """
+    Read containers' counters from the cgroup filesystem, falling back to
+    another source for containers whose cgroup files can't be read. An
+    instance can be used as the ``source`` of a
+    :class:`~seaworthy.usage.ResourceSampler`.
+
+    The cgroup of each container is found once and remembered, as is the
+    need to fall back for a container.
+    """
+
+    def __init__(self, fallback=None, root=CGROUP_ROOT, proc=PROC_ROOT):
+        """
+        :param fallback:
+            A function that reads the counters from a Docker container model
+            when the cgroup can't be read, such as
+            :func:`seaworthy.usage.api_stats`. If ``None``, :exc:`OSError`
+            is raised instead.
+        :param root: Where the cgroup filesystem is mounted.
+        :param proc: Where the proc filesystem is mounted.
+        """
+        self.fallback = fallback
+        self.root = root
+        self.proc = proc
+        self._locations = {}
+        self._lock = threading.Lock()
+
+    def location(self, container):
+        """
+        Get the :class:`CgroupLocation` of a container, or ``None`` if its
+        cgroup can't be used.
+
+        :param container: The Docker container model.
+        """
+        with self._lock:
+            if container.id not in self._locations:
+                self._locations[container.id] = find_cgroup(
+                    container.attrs, self.root, self.proc)
+            return self._locations[container.id]
+
+    def __call__(self, container):
+        location = self.location(container)
+        if location is None and self.fallback is None:
+            raise FileNotFoundError(
+                'No cgroup found for container {}'.format(container.name))
+        if location is not None:
+            try:
+                return read_cgroup_stats(location, self.proc)
+            except (OSError, ValueError) as e:
+                if self.fallback is None:
+                    raise
+                log.debug(
+                    "Can't read cgroup stats for {}, falling back: {}".format(
+                        container.name, e))
+                with self._lock:
+                    self._locations[container.id] = None
+        return self.fallback(container)
+
+
+__all__ = [
+    'CgroupLocation', 'CgroupStatsReader', 'find_cgroup', 'parse_proc_cgroup',
+    'read_cgroup_stats', 'read_net_dev']
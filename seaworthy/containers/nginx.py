@@ -1,5 +1,5 @@
-from seaworthy.client import wait_for_response
 from seaworthy.definitions import ContainerDefinition
+from seaworthy.probes import HttpProbe
 
 
 class NginxContainer(ContainerDefinition):
@@ -22,11 +22,12 @@ class NginxContainer(ContainerDefinition):
         """
         return {'publish_all_ports': True}
 
-    def wait_for_start(self):
+    def readiness_probe(self):
         """
-        Wait for Nginx to return any valid HTTP response.
+        Return an :class:`~seaworthy.probes.HttpProbe` that passes once Nginx
+        returns any valid HTTP response.
         """
-        wait_for_response(self.http_client(), self.wait_timeout)
+        return HttpProbe.for_container(self)
 
     def exec_nginx(self, args):
         """
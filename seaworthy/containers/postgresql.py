@@ -21,6 +21,10 @@ class PostgreSQLContainer(ContainerDefinition):
     DEFAULT_WAIT_PATTERNS = (
         r'database system is ready to accept connections',
         r'database system is ready to accept connections',)
+    # Containers started from a snapshot already have a database, so
+    # PostgreSQL only starts up once.
+    SNAPSHOT_WAIT_PATTERNS = (
+        r'database system is ready to accept connections',)
 
     DEFAULT_DATABASE = 'database'
     DEFAULT_USER = 'user'
@@ -69,6 +73,16 @@ class PostgreSQLContainer(ContainerDefinition):
         assert result.exit_code == 0, result.output.decode('utf-8')
         return result
 
+    def prepare_snapshot(self):
+        """
+        Write all data to disk with a ``CHECKPOINT`` before a snapshot is
+        taken, so that PostgreSQL has less to recover when it starts from the
+        snapshot.
+        """
+        self.exec_pg_success([
+            'psql', '-U', self.user, '--dbname', self.database,
+            '-c', 'CHECKPOINT'])
+
     def clean(self):
         """
         Remove all data by dropping and recreating the configured database.
@@ -3,11 +3,22 @@ Wrappers over Docker resource types to aid in setup/teardown of and interaction
 with Docker resources.
 """
 
+import asyncio
+import copy
 import functools
+import hashlib
+import inspect
+import json
+import shlex
+import time
 
+import docker
 from docker import models
 
-from seaworthy.helpers import DockerHelper
+from seaworthy import events, probes, timing, tracing, usage
+from seaworthy.helpers import (
+    AsyncDockerHelper, DockerHelper, LABEL_REUSE_EXPIRES, LABEL_REUSE_HASH,
+    reuse_expired)
 from seaworthy.stream.logs import stream_logs, wait_for_logs_matching
 from seaworthy.stream.matchers import RegexMatcher, UnorderedMatcher
 
@@ -37,6 +48,65 @@ def deep_merge(*dicts):
     return result
 
 
+def _spec_value(value):
+    """
+    Convert a value from a create spec into something that can be encoded as
+    JSON in a stable way, so that it can be hashed.
+    """
+    if isinstance(value, dict):
+        return {_spec_key(k): _spec_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_spec_value(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_spec_value(v) for v in value), key=repr)
+    if isinstance(value, models.resource.Model):
+        # Names (which are namespaced) are stable across runs, IDs are not.
+        return getattr(value, 'name', value.id)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def _spec_key(key):
+    if isinstance(key, str):
+        return key
+    return json.dumps(_spec_value(key), sort_keys=True)
+
+
+def _callable_fingerprint(func):
+    """
+    Identify a callable by its name and, where available, its source code, so
+    that changing the function changes the fingerprint.
+    """
+    name = '{}.{}'.format(
+        getattr(func, '__module__', None),
+        getattr(func, '__qualname__', type(func).__qualname__))
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = ''
+    return '{}\n{}'.format(name, source)
+
+
+def _tmpfs_paths(tmpfs):
+    # tmpfs mounts may be given as a dict or as a list of 'path:options'
+    if isinstance(tmpfs, dict):
+        return sorted(tmpfs.keys())
+    return sorted(mount.split(':', 1)[0] for mount in tmpfs or [])
+
+
+def _nanoseconds(seconds):
+    # Docker API durations are in nanoseconds
+    return int(seconds * 10**9)
+
+
+def _health_settled(state):
+    # Whether waiting for a container to be healthy is over: it's healthy, it
+    # has no healthcheck, or it's no longer running.
+    return (state is None or state.status != 'running' or
+            state.health in (None, 'healthy'))
+
+
 class _DefinitionBase:
     __model_type__ = None
 
@@ -47,6 +117,9 @@ class _DefinitionBase:
         self._create_kwargs = {} if create_kwargs is None else create_kwargs
 
         self._helper = None
+        # The thread pool that the *_async() methods run in. None means the
+        # event loop's default executor.
+        self._executor = None
         self.set_helper(helper)
 
         self._inner = None
@@ -110,12 +183,47 @@ class _DefinitionBase:
 
         self.remove()
 
+    def _run_async(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    def setup_async(self, helper=None, **kwargs):
+        """
+        Like :meth:`setup`, but runs in a thread pool and returns an asyncio
+        future, so that many resources can be set up concurrently. If the
+        helper is an :class:`~seaworthy.helpers.AsyncDockerHelper`, its thread
+        pool is used.
+
+        :returns: An asyncio future for this definition instance.
+        """
+        self.set_helper(helper)
+        return self._run_async(self.setup, **kwargs)
+
+    def teardown_async(self):
+        """
+        Like :meth:`teardown`, but runs in a thread pool and returns an
+        asyncio future.
+        """
+        return self._run_async(self.teardown)
+
     def __enter__(self):
         return self.setup()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.teardown()
 
+    def _emit(self, kind):
+        """
+        Emit a lifecycle event for this definition's resource to the helper's
+        event bus. See :mod:`seaworthy.events`.
+        """
+        event_bus = getattr(self._helper, 'events', None)
+        if event_bus is not None and self._inner is not None:
+            event_bus.emit(
+                kind, self.__model_type__.__name__.lower(), self._inner.name,
+                self._inner, self)
+
     @property
     def helper(self):
         if self._helper is None:
@@ -132,6 +240,11 @@ class _DefinitionBase:
         if helper is None:
             return
 
+        # Async helpers also give us a thread pool for the *_async() methods
+        if isinstance(helper, AsyncDockerHelper):
+            self._executor = helper.executor
+            helper = helper.helper
+
         # Get the right kind of helper if given a DockerHelper
         if isinstance(helper, DockerHelper):
             helper = helper._helper_for_model(self.__model_type__)
@@ -160,6 +273,19 @@ class _DefinitionBase:
             return wrapper
         return deco
 
+    def clone(self, name):
+        """
+        Create a copy of this definition with a different name. The copy has
+        the same helper as this definition, but no resource is created for it
+        yet.
+
+        :param name: The name for the copy.
+        """
+        clone = copy.copy(self)
+        clone.name = name
+        clone._inner = None
+        return clone
+
     def inner(self):
         """
         :returns: the underlying Docker model object
@@ -205,13 +331,44 @@ class ContainerDefinition(_DefinitionBase):
 
     (Note that this only works if the container has a helper set and does not
     have a container created.)
+
+    The :meth:`setup`, :meth:`run`, :meth:`halt` and :meth:`teardown`
+    operations are timed, broken down into phases such as ``fetch_image``,
+    ``create``, ``start`` and ``wait_for_start``. The latest
+    :class:`~seaworthy.timing.LifecycleTiming` for each operation is kept in
+    :attr:`timings`, and is passed to each function in
+    :attr:`timing_listeners` as ``listener(definition, timing)``. See
+    :mod:`seaworthy.timing` for listeners that see every definition.
     """
 
     __model_type__ = models.containers.Container
     WAIT_TIMEOUT = 10.0
+    #: The repository that snapshot images are tagged in. See
+    #: :meth:`setup_snapshot`.
+    SNAPSHOT_REPOSITORY = 'seaworthy-snapshot'
+    #: The wait patterns to use for containers started from a snapshot image,
+    #: if they differ from the usual ones. See :meth:`setup_snapshot`.
+    SNAPSHOT_WAIT_PATTERNS = None
+    #: Whether to wait for the container's healthcheck to report that it is
+    #: healthy when it starts. See :meth:`wait_until_healthy`.
+    WAIT_FOR_HEALTHY = False
+    #: The healthcheck interval, in seconds, for containers that wait until
+    #: they are healthy. Docker's default of 30 seconds is far too long for
+    #: tests.
+    HEALTHCHECK_INTERVAL = 0.1
+    #: The healthcheck start period, in seconds, for containers that wait
+    #: until they are healthy. Failed checks during this period don't count
+    #: towards the healthcheck's retries.
+    HEALTHCHECK_START_PERIOD = 0.5
+    #: The :class:`~seaworthy.budgets.Budget` for the container's startup
+    #: time and resource usage, if any. See :attr:`budget`.
+    BUDGET = None
+    # Where captured paths are stored in snapshot images
+    _SNAPSHOT_DIR = '/.seaworthy-snapshot'
 
     def __init__(self, name, image, wait_patterns=None, wait_timeout=None,
-                 create_kwargs=None, helper=None):
+                 create_kwargs=None, helper=None, reuse_expiry=None,
+                 wait_for_healthy=None, budget=None):
         """
         :param name:
             The name for the container. The actual name of the container is
@@ -228,8 +385,31 @@ class ContainerDefinition(_DefinitionBase):
             Other kwargs to use when creating the container.
         :param seaworthy.helper.ContainerHelper helper:
             A ContainerHelper instance used to create containers.
+        :param reuse_expiry:
+            If set, the container is reusable across test runs: it is left
+            running on teardown, and a later setup of an identical definition
+            adopts it instead of creating a new container. The container
+            expires this many seconds after it was created. See
+            :meth:`reuse_hash`.
+        :param wait_for_healthy:
+            Whether to wait for the container's healthcheck to report that it
+            is healthy when it starts, in addition to waiting for the
+            ``wait_patterns``. Defaults to ``self.WAIT_FOR_HEALTHY``.
+        :param budget:
+            A :class:`~seaworthy.budgets.Budget` that pytest fixtures for the
+            container check when they are torn down. Defaults to
+            ``self.BUDGET``.
         """
         super().__init__(name, create_kwargs=create_kwargs, helper=helper)
+        self.reuse_expiry = reuse_expiry
+        if wait_for_healthy is not None:
+            self.wait_for_healthy = wait_for_healthy
+        else:
+            self.wait_for_healthy = self.WAIT_FOR_HEALTHY
+        if budget is not None:
+            self.budget = budget
+        else:
+            self.budget = self.BUDGET
 
         self._create_args = (image,)
         if wait_patterns:
@@ -242,6 +422,27 @@ class ContainerDefinition(_DefinitionBase):
             self.wait_timeout = self.WAIT_TIMEOUT
 
         self._http_clients = []
+        self._samplers = []
+        self._snapshot_image = None
+
+        #: A dict mapping operation names to the latest
+        #: :class:`~seaworthy.timing.LifecycleTiming` for that operation.
+        self.timings = {}
+        #: Functions to call with ``(definition, timing)`` when an operation
+        #: finishes.
+        self.timing_listeners = []
+        #: The :class:`~seaworthy.probes.ProbeResult` of the latest wait for
+        #: the :meth:`readiness_probe`, recording how long it took to pass.
+        self.probe_result = None
+
+    def clone(self, name):
+        clone = super().clone(name)
+        clone._http_clients = []
+        clone._samplers = []
+        clone.timings = {}
+        clone.probe_result = None
+        clone.timing_listeners = list(self.timing_listeners)
+        return clone
 
     def setup(self, helper=None, **run_kwargs):
         """
@@ -262,37 +463,177 @@ class ContainerDefinition(_DefinitionBase):
             return
 
         self.set_helper(helper)
-        self.run(**run_kwargs)
-        self.wait_for_start()
+        with timing.operation(self, 'setup'):
+            if self.reuse_expiry is not None:
+                with timing.phase('adopt'):
+                    adopted = self._adopt(run_kwargs)
+                if adopted:
+                    self._emit(events.READY)
+                    return self
+            self.run(**run_kwargs)
+            with timing.phase('wait_for_start'):
+                self.wait_for_start()
+        self._emit(events.READY)
         return self
 
     def teardown(self):
         """
-        Stop and remove the container if it exists.
+        Stop and remove the container if it exists. Reusable containers are
+        left running, see :meth:`expire`.
         """
         while self._http_clients:
             self._http_clients.pop().close()
-        if self.created:
+        while self._samplers:
+            self._samplers.pop().stop()
+        if not self.created:
+            return
+        self._snapshot_image = None
+        if self.reuse_expiry is not None:
+            self._inner = None
+            return
+        with timing.operation(self, 'teardown'):
             self.halt()
 
-    def status(self):
+    def reuse_hash(self, **run_kwargs):
+        """
+        Get a hash of everything that determines what this container looks
+        like once it has been set up: the definition class, the image, the
+        fully merged create kwargs and the wait patterns. A reusable container
+        is only adopted by a definition with the same hash.
+
+        :param **run_kwargs: Keyword arguments that would be passed to
+            :meth:`.run`.
+        :returns: A hex digest string.
+        """
+        kwargs = dict(run_kwargs)
+        kwargs.pop('fetch_image', None)
+        cls = type(self)
+        spec = {
+            'class': '{}.{}'.format(cls.__module__, cls.__qualname__),
+            'args': self._create_args,
+            'kwargs': self.merge_kwargs(self._create_kwargs, kwargs),
+            'wait_matchers': [repr(m) for m in self.wait_matchers or []],
+        }
+        encoded = json.dumps(_spec_value(spec), sort_keys=True)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def merge_kwargs(self, default_kwargs, kwargs):
+        """
+        Merge kwargs as usual. If the container waits until it is healthy,
+        its healthcheck interval and start period are shortened, unless they
+        are set explicitly.
+        """
+        merged = super().merge_kwargs(default_kwargs, kwargs)
+        if self.wait_for_healthy:
+            merged = deep_merge(self._healthcheck_kwargs(), merged)
+        return merged
+
+    def _healthcheck_kwargs(self):
+        # Without a test, the image's healthcheck test is used.
+        return {'healthcheck': {
+            'interval': _nanoseconds(self.HEALTHCHECK_INTERVAL),
+            'start_period': _nanoseconds(self.HEALTHCHECK_START_PERIOD),
+        }}
+
+    def _reusable_kwargs(self, kwargs):
+        labels = {
+            LABEL_REUSE_HASH: self.reuse_hash(**kwargs),
+            LABEL_REUSE_EXPIRES: str(int(time.time() + self.reuse_expiry)),
+        }
+        extra = {'labels': labels}
+
+        # The helper's default network is removed on teardown, so a reusable
+        # container can't be connected to it.
+        merged = self.merge_kwargs(self._create_kwargs, kwargs)
+        if (merged.get('network') is None and
+                merged.get('network_mode') is None and
+                not merged.get('network_disabled', False)):
+            extra['network_mode'] = 'bridge'
+        return deep_merge(kwargs, extra)
+
+    def _adopt(self, run_kwargs):
+        """
+        Adopt a running reusable container that matches this definition, and
+        remove any stale one that doesn't.
+
+        :returns: Whether a container was adopted.
+        """
+        spec_hash = self.reuse_hash(**run_kwargs)
+        adopted = None
+        for container in self.helper.list_reusable(self.name):
+            labels = container.attrs.get('Labels') or {}
+            if (adopted is None and
+                    labels.get(LABEL_REUSE_HASH) == spec_hash and
+                    container.status == 'running' and
+                    not reuse_expired(labels)):
+                adopted = container
+            else:
+                self.helper.remove(container, force=True)
+
+        if adopted is None:
+            return False
+
+        # Sparse listings don't have everything we need, such as ports.
+        self.helper.get_state(adopted, reload=True)
+        self._inner = adopted
+        self._emit(events.ADOPT)
+        try:
+            with tracing.span('clean {}'.format(self.name), 'clean'):
+                self.clean()
+        except NotImplementedError:
+            pass
+        else:
+            self._emit(events.CLEAN)
+        return True
+
+    def expire(self):
+        """
+        Stop and remove this definition's reusable container, whether or not
+        it has been set up in this run.
+        """
+        while self._http_clients:
+            self._http_clients.pop().close()
+        self._inner = None
+        for container in self.helper.list_reusable(self.name):
+            self.helper.remove(container, force=True)
+
+    def state(self, reload=False):
         """
-        Get the container's current status from Docker.
+        Get the container's current :class:`~seaworthy.helpers.ContainerState`
+        (status, health, exit code and OOM flag).
+
+        If the helper tracks container states (see the ``track_state``
+        parameter of :class:`~seaworthy.helpers.DockerHelper`), the state is
+        read from there without an API call. Otherwise, the container is
+        inspected.
 
         If the container does not exist (before creation and after removal),
-        the status is ``None``.
+        the state is ``None``.
+
+        :param reload: Whether to inspect the container even if its state is
+            tracked.
         """
         if not self.created:
             return None
-        self.inner().reload()
-        return self.inner().status
+        return self.helper.get_state(self.inner(), reload=reload)
+
+    def status(self):
+        """
+        Get the container's current status. See :meth:`state`.
+
+        If the container does not exist (before creation and after removal),
+        the status is ``None``.
+        """
+        state = self.state()
+        return None if state is None else state.status
 
     def start(self):
         """
         Start the container. The container must have been created.
         """
         self.inner().start()
-        self.inner().reload()
+        self.state(reload=True)
+        self._emit(events.START)
 
     def stop(self, timeout=5):
         """
@@ -303,7 +644,8 @@ class ContainerDefinition(_DefinitionBase):
             a ``SIGKILL``. Default: 5 (half the Docker default)
         """
         self.inner().stop(timeout=timeout)
-        self.inner().reload()
+        self.state(reload=True)
+        self._emit(events.STOP)
 
     def run(self, fetch_image=True, **kwargs):
         """
@@ -315,8 +657,12 @@ class ContainerDefinition(_DefinitionBase):
             ``True``.
         :param **kwargs: Keyword arguments passed to :meth:`.create`.
         """
-        self.create(fetch_image=fetch_image, **kwargs)
-        self.start()
+        if self.reuse_expiry is not None:
+            kwargs = self._reusable_kwargs(kwargs)
+        with timing.operation(self, 'run'):
+            self.create(fetch_image=fetch_image, **kwargs)
+            with timing.phase('start'):
+                self.start()
 
     def wait_for_start(self):
         """
@@ -324,19 +670,261 @@ class ContainerDefinition(_DefinitionBase):
 
         By default this will wait for the log lines matching the patterns
         passed in the ``wait_patterns`` parameter of the constructor using an
-        UnorderedMatcher. For more advanced checks for container startup, this
-        method should be overridden.
+        UnorderedMatcher. If :attr:`wait_for_healthy` is set, it first waits
+        until the container is healthy (see :meth:`wait_until_healthy`).
+        Finally, it waits for the :meth:`readiness_probe`, if there is one.
+        For more advanced checks for container startup, override
+        :meth:`readiness_probe` or this method.
         """
-        if self.wait_matchers:
-            matcher = UnorderedMatcher(*self.wait_matchers)
+        if self.wait_for_healthy:
+            self.wait_until_healthy(timeout=self.wait_timeout)
+        matchers = self.wait_matchers
+        if (self._snapshot_image is not None and
+                self.SNAPSHOT_WAIT_PATTERNS is not None):
+            matchers = [RegexMatcher(p) for p in self.SNAPSHOT_WAIT_PATTERNS]
+        if matchers:
+            matcher = UnorderedMatcher(*matchers)
             self.wait_for_logs_matching(matcher, timeout=self.wait_timeout)
+        probe = self.readiness_probe()
+        if probe is not None:
+            self.wait_for_probe(probe)
+
+    def readiness_probe(self):
+        """
+        Override this method to return a :class:`~seaworthy.probes.Probe`
+        that passes once the container is ready to be used. It is called
+        by :meth:`wait_for_start` after the container has started. By
+        default, there is no probe.
+        """
+        return None
+
+    def wait_for_probe(self, probe, timeout=None, backoff=None):
+        """
+        Wait for a :class:`~seaworthy.probes.Probe` to pass, and keep its
+        result in :attr:`probe_result`.
+
+        :param timeout:
+            Number of seconds to wait. Defaults to ``self.wait_timeout``.
+        :param backoff:
+            The :class:`~seaworthy.probes.Backoff` between attempts.
+        :returns: The :class:`~seaworthy.probes.ProbeResult`.
+        :raises ~seaworthy.probes.ProbeTimeout:
+            If the probe doesn't pass in time.
+        """
+        if timeout is None:
+            timeout = self.wait_timeout
+        try:
+            self.probe_result = probe.wait(timeout, backoff=backoff)
+        except probes.ProbeTimeout as e:
+            self.probe_result = e.result
+            raise
+        return self.probe_result
+
+    def wait_until_healthy(self, timeout=None):
+        """
+        Wait for the container's healthcheck to report that it is healthy.
+        The container's health status is followed with the Docker events
+        stream, so the wait ends as soon as the healthcheck passes.
+
+        Containers created while :attr:`wait_for_healthy` is set run their
+        healthchecks every :attr:`HEALTHCHECK_INTERVAL` seconds, so that this
+        doesn't take as long as Docker's default interval.
+
+        :param timeout:
+            Number of seconds to wait. Defaults to ``self.wait_timeout``.
+        :raises RuntimeError:
+            If the container has no healthcheck or stops before it is healthy.
+        :raises TimeoutError: If the container isn't healthy in time.
+        """
+        if timeout is None:
+            timeout = self.wait_timeout
+        with tracing.span('wait_for_healthy {}'.format(self.name), 'wait'):
+            state = self.helper.wait_for_state(
+                self.inner(), _health_settled, timeout=timeout)
+        if state is None or state.status != 'running':
+            raise RuntimeError(
+                'Container {} stopped before it was healthy: {}'.format(
+                    self.name, state))
+        if state.health is None:
+            raise RuntimeError(
+                'Container {} has no healthcheck'.format(self.name))
+
+    def wait_for_start_async(self):
+        """
+        Like :meth:`wait_for_start`, but runs in a thread pool and returns an
+        asyncio future.
+        """
+        return self._run_async(self.wait_for_start)
+
+    def snapshot_paths(self, **run_kwargs):
+        """
+        Get the paths in the container whose content must be captured
+        explicitly when a snapshot image is committed, because ``docker
+        commit`` doesn't include them. By default, these are the container's
+        ``tmpfs`` mounts.
+
+        :param **run_kwargs: Keyword arguments that would be passed to
+            :meth:`.run`.
+        """
+        kwargs = dict(run_kwargs)
+        kwargs.pop('fetch_image', None)
+        merged = self.merge_kwargs(self._create_kwargs, kwargs)
+        return _tmpfs_paths(merged.get('tmpfs'))
+
+    def snapshot_tag(self, initialise, key=None, **run_kwargs):
+        """
+        Get the tag of the snapshot image for this definition. The tag is a
+        hash of the definition (see :meth:`reuse_hash`), the ID of the image
+        the definition uses, the initialiser's name and source code, and
+        ``key``.
+
+        :param initialise: The initialiser, see :meth:`setup_snapshot`.
+        :param key: See :meth:`setup_snapshot`.
+        :param **run_kwargs: Keyword arguments that would be passed to
+            :meth:`.run`.
+        :returns: A ``repository:tag`` string.
+        """
+        image, = self._create_args
+        spec = {
+            'definition': self.reuse_hash(**run_kwargs),
+            'image_id': self.helper._image_helper.fetch(image).id,
+            'initialise': _callable_fingerprint(initialise),
+            'key': None if key is None else str(key),
+            'paths': self.snapshot_paths(**run_kwargs),
+        }
+        encoded = json.dumps(spec, sort_keys=True)
+        digest = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+        return '{}/{}:{}'.format(
+            self.SNAPSHOT_REPOSITORY, self.name.lower(), digest)
+
+    def setup_snapshot(self, initialise, key=None, helper=None,
+                       **run_kwargs):
+        """
+        Set up the container from a snapshot image of a fully initialised
+        container, building the snapshot image first if necessary.
+
+        To build the snapshot image, a copy of this definition is set up, and
+        ``initialise`` is called with it. Once :meth:`prepare_snapshot` has
+        been called, the content of :meth:`snapshot_paths` (such as ``tmpfs``
+        mounts) is copied into the container's filesystem and the container is
+        committed to an image tagged with :meth:`snapshot_tag`. The image's
+        entrypoint is wrapped to copy the content back when a container is
+        started from it, so this requires ``sh`` and ``cp`` in the image.
+
+        The snapshot image is only rebuilt when its tag changes. When it is
+        rebuilt, older snapshot images for this definition are removed.
+
+        :param initialise:
+            A callable that takes the set up definition and initialises the
+            container, e.g. by running database migrations.
+        :param key:
+            Any extra value that should cause the snapshot to be rebuilt when
+            it changes, such as a hash of the migration files.
+        :param helper:
+            The resource helper to use, if one was not provided when this
+            container definition was created.
+        :param **run_kwargs: Keyword arguments passed to :meth:`.run`.
+
+        :returns: This container definition instance.
+        """
+        if self.created:
+            return
+
+        self.set_helper(helper)
+        tag = self.snapshot_tag(initialise, key, **run_kwargs)
+        client = self.helper.collection.client
+        try:
+            client.images.get(tag)
+        except docker.errors.ImageNotFound:
+            self._build_snapshot(tag, initialise, run_kwargs)
+
+        # Building the snapshot image is timed as the builder's own setup, so
+        # this only times starting the container from it.
+        kwargs = dict(run_kwargs, fetch_image=False)
+        with timing.operation(self, 'setup'):
+            create_args, self._create_args = self._create_args, (tag,)
+            try:
+                self.run(**kwargs)
+            finally:
+                self._create_args = create_args
+            self._snapshot_image = tag
+            with timing.phase('wait_for_start'):
+                self.wait_for_start()
+        self._emit(events.READY)
+        return self
+
+    def prepare_snapshot(self):
+        """
+        Called on the fully initialised container before a snapshot image is
+        committed from it. Override this to make sure that everything has been
+        written to disk, for example.
+        """
+
+    def _build_snapshot(self, tag, initialise, run_kwargs):
+        builder = self.clone('{}_snapshot'.format(self.name))
+        builder.reuse_expiry = None
+        builder.setup(**run_kwargs)
+        try:
+            initialise(builder)
+            builder.prepare_snapshot()
+            builder._commit_snapshot(tag, self.snapshot_paths(**run_kwargs))
+        finally:
+            builder.teardown()
+        self._remove_old_snapshots(tag)
+
+    def _commit_snapshot(self, tag, paths):
+        container = self.inner()
+        changes = []
+        if paths:
+            def saved(path):
+                return shlex.quote(self._SNAPSHOT_DIR + path)
+
+            capture = ' && '.join(
+                'mkdir -p {1} && cp -a {0}/. {1}/'.format(
+                    shlex.quote(path), saved(path)) for path in paths)
+            result = container.exec_run(['sh', '-c', capture], user='root')
+            if result.exit_code != 0:
+                raise RuntimeError('Failed to capture {}: {}'.format(
+                    ', '.join(paths), result.output.decode('utf-8')))
+
+            # The captured content is copied back into place before the
+            # original entrypoint runs.
+            restore = ' && '.join(
+                'cp -a {}/. {}/'.format(saved(path), shlex.quote(path))
+                for path in paths)
+            config = container.attrs['Config']
+            entrypoint = ['/bin/sh', '-c', restore + ' && exec "$0" "$@"']
+            entrypoint.extend(config.get('Entrypoint') or [])
+            changes.append('ENTRYPOINT {}'.format(json.dumps(entrypoint)))
+            # Setting the entrypoint resets the command, so set that too.
+            cmd = config.get('Cmd') or []
+            changes.append('CMD {}'.format(json.dumps(cmd)))
+
+        repository, image_tag = tag.rsplit(':', 1)
+        container.commit(repository, image_tag, changes=changes)
+
+    def _remove_old_snapshots(self, tag):
+        client = self.helper.collection.client
+        repository = tag.rsplit(':', 1)[0]
+        for image in client.images.list(name=repository):
+            for old_tag in image.tags:
+                if old_tag == tag or not old_tag.startswith(repository + ':'):
+                    continue
+                try:
+                    client.images.remove(old_tag)
+                except docker.errors.APIError:
+                    # Probably still in use by a container
+                    pass
 
     def halt(self, stop_timeout=5):
         """
         Stop the container and remove it. The opposite of :meth:`run`.
         """
-        self.stop(timeout=stop_timeout)
-        self.remove()
+        with timing.operation(self, 'halt'):
+            with timing.phase('stop'):
+                self.stop(timeout=stop_timeout)
+            with timing.phase('remove'):
+                self.remove()
 
     def clean(self):
         """
@@ -426,6 +1014,21 @@ class ContainerDefinition(_DefinitionBase):
             self.inner(), matcher, timeout=timeout, encoding=encoding,
             **logs_kwargs)
 
+    def sample_resources(self, interval=1.0, **kwargs):
+        """
+        Start sampling this container's resource usage in the background.
+        Sampling stops when the container is torn down, if
+        :meth:`~seaworthy.usage.ResourceSampler.stop` isn't called before.
+
+        :param interval: The number of seconds between samples.
+        :param **kwargs:
+            Other arguments for :class:`~seaworthy.usage.ResourceSampler`.
+        :returns: The started :class:`~seaworthy.usage.ResourceSampler`.
+        """
+        sampler = usage.ResourceSampler(self, interval=interval, **kwargs)
+        self._samplers.append(sampler)
+        return sampler.start()
+
     def http_client(self, port=None):
         """
         Construct an HTTP client for this container.
@@ -437,6 +1040,44 @@ class ContainerDefinition(_DefinitionBase):
         return client
 
 
+class _ContainerHelperMixin:
+    """
+    The helper handling of objects that set up copies of a
+    :class:`ContainerDefinition`, such as replica sets and pools. They keep
+    the container helper in ``_helper``.
+    """
+
+    @property
+    def helper(self):
+        if self._helper is None:
+            raise RuntimeError('No helper set.')
+        return self._helper
+
+    def set_helper(self, helper):
+        """
+        Set the helper used to set up containers. This works the same way as
+        :meth:`.ContainerDefinition.set_helper`.
+        """
+        # We don't want to "unset" in this method.
+        if helper is None:
+            return
+
+        # Get the right kind of helper if given a DockerHelper
+        if isinstance(helper, AsyncDockerHelper):
+            helper = helper.helper
+        if isinstance(helper, DockerHelper):
+            helper = helper._helper_for_model(
+                ContainerDefinition.__model_type__)
+
+        # We already have this one.
+        if helper is self._helper:
+            return
+        if self._helper is None:
+            self._helper = helper
+        else:
+            raise RuntimeError('Cannot replace existing helper.')
+
+
 class NetworkDefinition(_DefinitionBase):
     """
     This is the base class for network definitions.
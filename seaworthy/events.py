@@ -0,0 +1,115 @@
+"""
+A synchronous event bus for resource lifecycle events, so that resources can
+be observed without subclassing every definition.
+
+Each :class:`~seaworthy.helpers.DockerHelper` has an :class:`EventBus` that its
+resource helpers and the definitions that use them emit events to. Listeners
+are called on the thread that emitted the event, in the order they were
+subscribed. Emitting an event when there are no listeners does nothing beyond
+checking for listeners.
+"""
+
+import logging
+import time
+
+import attr
+
+
+log = logging.getLogger(__name__)
+
+#: A resource was created.
+CREATE = 'create'
+#: A resource was removed.
+REMOVE = 'remove'
+#: A container was started.
+START = 'start'
+#: A container was stopped.
+STOP = 'stop'
+#: A container definition finished setting up and is ready to be used.
+READY = 'ready'
+#: A container was cleaned.
+CLEAN = 'clean'
+#: A container definition adopted a reusable container.
+ADOPT = 'adopt'
+
+KINDS = (CREATE, REMOVE, START, STOP, READY, CLEAN, ADOPT)
+
+
+@attr.s(frozen=True)
+class LifecycleEvent:
+    """
+    Something that happened to a resource.
+    """
+
+    #: The kind of event, one of :data:`KINDS`.
+    kind = attr.ib()
+    #: The type of resource, such as ``'container'`` or ``'network'``.
+    resource_type = attr.ib()
+    #: The Docker name of the resource, including the helper's namespace.
+    name = attr.ib()
+    #: The :func:`time.monotonic` time of the event.
+    timestamp = attr.ib()
+    #: The Docker model of the resource, if there is one.
+    resource = attr.ib(default=None)
+    #: The definition that emitted the event, if any.
+    definition = attr.ib(default=None)
+
+
+class EventBus:
+    """
+    Pass lifecycle events to the listeners that are interested in them.
+    """
+
+    def __init__(self):
+        # Replaced rather than mutated, so that emit() doesn't need a lock.
+        self._listeners = ()
+
+    def subscribe(self, listener, kinds=None):
+        """
+        Call a function with each :class:`LifecycleEvent`.
+
+        :param listener: The function to call.
+        :param kinds:
+            The kinds of event to call the function with. If ``None``, it is
+            called with every event.
+        :returns: The listener, so that this can be used as a decorator.
+        """
+        kinds = None if kinds is None else frozenset(kinds)
+        self._listeners += ((listener, kinds),)
+        return listener
+
+    def unsubscribe(self, listener):
+        """
+        Stop calling a function that was subscribed.
+        """
+        self._listeners = tuple(
+            entry for entry in self._listeners if entry[0] is not listener)
+
+    @property
+    def has_listeners(self):
+        return bool(self._listeners)
+
+    def emit(self, kind, resource_type, name, resource=None, definition=None):
+        """
+        Create an event and pass it to the interested listeners. Errors in
+        listeners are logged and don't stop the other listeners being called.
+        """
+        listeners = self._listeners
+        if not listeners:
+            return
+
+        event = LifecycleEvent(
+            kind, resource_type, name, time.monotonic(), resource, definition)
+        for listener, kinds in listeners:
+            if kinds is not None and kind not in kinds:
+                continue
+            try:
+                listener(event)
+            except Exception:
+                log.exception(
+                    'Error in lifecycle event listener {!r}'.format(listener))
+
+
+__all__ = [
+    'ADOPT', 'CLEAN', 'CREATE', 'EventBus', 'KINDS', 'LifecycleEvent',
+    'READY', 'REMOVE', 'START', 'STOP']
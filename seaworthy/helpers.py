@@ -3,10 +3,34 @@ Classes that track resource creation and removal to ensure that all resources
 are namespaced and cleaned up after use.
 """
 
+import asyncio
+import collections
+import functools
+import gzip
 import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import attr
 
 import docker
 from docker import models
+from docker.utils import version_gte
+
+from seaworthy import events, timing, tracing
+from seaworthy.instrumentation import ApiCallRecorder
+from seaworthy.utils import parse_rfc3339_nano
+
+try:
+    from docker.models.containers import _create_container_args
+except ImportError:  # pragma: no cover
+    # This is a private function in the Docker client so it may disappear.
+    _create_container_args = None
 
 # This is a hack to control our generated documentation. The value of the
 # attribute is ignored, only its presence or absence can be detected by the
@@ -16,32 +40,329 @@ __apigen_inherited_members__ = None
 
 log = logging.getLogger(__name__)
 
+#: The default number of resources that are removed concurrently during
+#: :meth:`DockerHelper.teardown`.
+DEFAULT_TEARDOWN_WORKERS = 8
+
+#: The default number of threads that :class:`AsyncDockerHelper` runs
+#: blocking calls in.
+DEFAULT_ASYNC_WORKERS = 16
+
+#: The default number of images that are pulled concurrently by
+#: :func:`fetch_images`.
+DEFAULT_FETCH_WORKERS = 4
+
+#: Label for the namespace of the helper that created a resource.
+LABEL_NAMESPACE = 'seaworthy.namespace'
+#: Label for the session (a unique ID per helper) that created a resource.
+LABEL_SESSION = 'seaworthy.session'
+#: Label for the ID of the process that created a resource.
+LABEL_PID = 'seaworthy.pid'
+#: Label for the hostname of the machine where a resource was created.
+LABEL_HOST = 'seaworthy.host'
+#: Label for the hash of the create spec of a reusable container.
+LABEL_REUSE_HASH = 'seaworthy.reuse.hash'
+#: Label for the time (in seconds since the epoch) when a reusable container
+#: expires.
+LABEL_REUSE_EXPIRES = 'seaworthy.reuse.expires'
+
+
+def session_labels(namespace, session):
+    """
+    Get the labels that are added to every resource created by a helper.
+
+    :param namespace: The namespace of the helper.
+    :param session: The session ID of the helper.
+    :returns: dict
+    """
+    return {
+        LABEL_NAMESPACE: namespace,
+        LABEL_SESSION: session,
+        LABEL_PID: str(os.getpid()),
+        LABEL_HOST: socket.gethostname(),
+    }
+
+
+def reuse_expired(labels, now=None):
+    """
+    Check whether a reusable container has expired. Containers without a valid
+    expiry label are always considered expired.
+
+    :param labels: The labels of the container.
+    :param now:
+        The current time in seconds since the epoch. Defaults to
+        ``time.time()``.
+    :returns: bool
+    """
+    try:
+        expires = float(labels[LABEL_REUSE_EXPIRES])
+    except (KeyError, ValueError):
+        return True
+    return expires <= (time.time() if now is None else now)
+
+
+def _label_filter(key, value=None):
+    label = key if value is None else '{}={}'.format(key, value)
+    return {'label': label}
+
+
+@attr.s
+class PullProgress:
+    """
+    A progress event from the Docker daemon for an image that is being pulled.
+    """
+
+    #: The image being pulled, as ``repository:tag``.
+    image = attr.ib()
+    #: The ID of the layer the event is about, or ``None`` for events about
+    #: the whole image.
+    layer = attr.ib()
+    #: The status message, e.g. ``'Downloading'`` or ``'Pull complete'``.
+    status = attr.ib()
+    #: The number of bytes processed so far, if known.
+    current = attr.ib(default=None)
+    #: The total number of bytes, if known.
+    total = attr.ib(default=None)
+
+
+@attr.s
+class ImageFetch:
+    """
+    The result of fetching a single image.
+    """
+
+    #: The image that was fetched, as ``repository:tag``.
+    tag = attr.ib()
+    #: The ``Image`` model object.
+    image = attr.ib()
+    #: Whether the image had to be pulled.
+    pulled = attr.ib()
+    #: The time in seconds it took to fetch the image.
+    seconds = attr.ib()
+    #: Whether the image was loaded from an image archive.
+    loaded = attr.ib(default=False)
+
+
+def fetch_images(client, images, workers=DEFAULT_FETCH_WORKERS,
+                 progress=None, archive_dir=None):
+    """
+    Fetch images if they aren't already present. See
+    :func:`fetch_images_timed`.
+
+    :returns: A list of ``Image`` model objects, in the same order as
+        ``images``.
+    """
+    fetches = fetch_images_timed(
+        client, images, workers, progress, archive_dir)
+    by_tag = {fetch.tag: fetch.image for fetch in fetches}
+    return [by_tag[_normalize_image_tag(image)] for image in images]
+
 
-def fetch_images(client, images):
+def fetch_images_timed(client, images, workers=DEFAULT_FETCH_WORKERS,
+                       progress=None, archive_dir=None):
     """
-    Fetch images if they aren't already present.
+    Fetch images if they aren't already present, pulling up to ``workers``
+    images concurrently. Names that refer to the same repository and tag (such
+    as ``redis``, ``redis:latest`` and ``docker.io/library/redis:latest``) are
+    only fetched once.
+
+    :param client: The Docker client to use.
+    :param images: A list of image names.
+    :param workers: The maximum number of images to pull at the same time.
+    :param progress:
+        A callable that is called with a :class:`PullProgress` for every
+        progress event while images are pulled. It is called from worker
+        threads.
+    :param archive_dir:
+        A directory of image archives to load missing images from before
+        trying to pull them. See :func:`fetch_image`.
+    :returns:
+        A list of :class:`ImageFetch` objects, one for each distinct image,
+        in the order they first appear in ``images``.
     """
-    return [fetch_image(client, image) for image in images]
+    tags = []
+    for image in images:
+        tag = _normalize_image_tag(image)
+        if tag not in tags:
+            tags.append(tag)
+    if not tags:
+        return []
+
+    def fetch(tag):
+        return _fetch_image_timed(client, tag, progress, archive_dir)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(tags))) as executor:
+        return list(executor.map(fetch, tags))
 
 
-def fetch_image(client, name):
+def fetch_image(client, name, progress=None, archive_dir=None):
     """
     Fetch an image if it isn't already present.
 
     This works like ``docker pull`` and will pull the tag ``latest`` if no tag
     is specified in the image name.
+
+    :param progress:
+        A callable that is called with a :class:`PullProgress` for every
+        progress event if the image is pulled.
+    :param archive_dir:
+        A directory of image archives created by :func:`export_images` (or
+        ``docker save``, named as described in :func:`image_archive_path`).
+        If the image isn't present but there is an archive for it, the
+        archive is loaded instead of pulling the image.
     """
+    return _fetch_image_timed(client, name, progress, archive_dir).image
+
+
+def _fetch_image_timed(client, name, progress=None, archive_dir=None):
+    start = time.monotonic()
+    pulled = loaded = False
     try:
         image = client.images.get(name)
     except docker.errors.ImageNotFound:
-        name, tag = _parse_image_tag(name)
-        tag = 'latest' if tag is None else tag
+        image = None
+        if archive_dir is not None:
+            image = _load_image_archive(client, name, archive_dir)
+            loaded = image is not None
+        if image is None:
+            image = _pull_image(client, name, progress)
+            pulled = True
 
-        log.info("Pulling tag '{}' for image '{}'...".format(tag, name))
-        image = client.images.pull(name, tag=tag)
+    seconds = time.monotonic() - start
+    log.debug("Found image '{}' for tag '{}' in {:.3f}s".format(
+        image.id, name, seconds))
+    return ImageFetch(name, image, pulled, seconds, loaded)
 
-    log.debug("Found image '{}' for tag '{}'".format(image.id, name))
-    return image
+
+#: The file extensions of image archives, in the order they are looked for.
+#: The Docker daemon decompresses archives itself when they are loaded.
+IMAGE_ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tar.bz2', '.tar.xz')
+
+
+def image_archive_path(archive_dir, tag, compress=True):
+    """
+    Get the path of the archive for an image in an image archive directory.
+    The file name is the normalized ``repository:tag`` of the image, quoted
+    so that it is a valid file name, e.g. ``redis%3Aalpine.tar.gz``.
+
+    :param archive_dir: The image archive directory.
+    :param tag: The image name.
+    :param compress: Whether to use the name of a gzipped archive.
+    """
+    name = quote(_normalize_image_tag(tag), safe='')
+    extension = '.tar.gz' if compress else '.tar'
+    return os.path.join(archive_dir, name + extension)
+
+
+def _find_image_archive(archive_dir, tag):
+    base = image_archive_path(archive_dir, tag, compress=False)[:-len('.tar')]
+    for extension in IMAGE_ARCHIVE_EXTENSIONS:
+        if os.path.isfile(base + extension):
+            return base + extension
+    return None
+
+
+def _load_image_archive(client, name, archive_dir):
+    path = _find_image_archive(archive_dir, name)
+    if path is None:
+        return None
+
+    log.info("Loading image '{}' from '{}'...".format(name, path))
+    with open(path, 'rb') as archive:
+        # The file is streamed to the daemon rather than read into memory.
+        client.images.load(archive)
+
+    try:
+        return client.images.get(name)
+    except docker.errors.ImageNotFound:
+        log.warning("Archive '{}' does not contain image '{}'".format(
+            path, name))
+        return None
+
+
+def export_images(client, images, archive_dir, compress=True,
+                  overwrite=False):
+    """
+    Save images to an image archive directory, so that they can be loaded
+    later by :func:`fetch_image` without pulling them.
+
+    :param client: The Docker client to use.
+    :param images: A list of image names. The images must be present.
+    :param archive_dir:
+        The image archive directory. It is created if it doesn't exist.
+    :param compress: Whether to gzip the archives.
+    :param overwrite:
+        Whether to replace existing archives. If ``False``, images that
+        already have an archive in the directory are skipped.
+    :returns: A list of the paths of the archives that were written.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    paths = []
+    for tag in images:
+        tag = _normalize_image_tag(tag)
+        if not overwrite and _find_image_archive(archive_dir, tag):
+            continue
+
+        path = image_archive_path(archive_dir, tag, compress)
+        log.info("Saving image '{}' to '{}'...".format(tag, path))
+        image = client.images.get(tag)
+        # Write to a temporary file first so that an interrupted export
+        # doesn't leave a truncated archive behind.
+        tmp_path = path + '.tmp'
+        opener = gzip.open if compress else open
+        with opener(tmp_path, 'wb') as archive:
+            for chunk in image.save(named=_saved_tag(image, tag)):
+                archive.write(chunk)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def _saved_tag(image, tag):
+    # Images from Docker Hub may be tagged with or without their prefixes.
+    for image_tag in image.tags:
+        if _normalize_image_tag(image_tag) == tag:
+            return image_tag
+    return True
+
+
+def _pull_image(client, name, progress):
+    name, tag = _parse_image_tag(name)
+    tag = 'latest' if tag is None else tag
+
+    log.info("Pulling tag '{}' for image '{}'...".format(tag, name))
+    if progress is None:
+        return client.images.pull(name, tag=tag)
+
+    image = '{}:{}'.format(name, tag)
+    for event in client.api.pull(name, tag=tag, stream=True, decode=True):
+        # Errors during a streamed pull are reported as events, not raised.
+        if 'error' in event:
+            raise docker.errors.APIError(event['error'])
+        detail = event.get('progressDetail') or {}
+        progress(PullProgress(
+            image, event.get('id'), event.get('status'),
+            detail.get('current'), detail.get('total')))
+    return client.images.get(image)
+
+
+def _normalize_image_tag(name):
+    """
+    Normalize an image name to ``repository:tag`` form, so that different
+    names for the same image on Docker Hub compare equal.
+    """
+    if '@' in name:
+        # Digests are already unambiguous
+        return name
+
+    name, tag = _parse_image_tag(name)
+    for prefix in ['docker.io/', 'index.docker.io/']:
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    if name.startswith('library/'):
+        name = name[len('library/'):]
+    return '{}:{}'.format(name, 'latest' if tag is None else tag)
 
 
 def _parse_image_tag(name_tag):
@@ -66,15 +387,43 @@ def _parse_volume_short_form(short_form):
     return {'bind': bind, 'mode': mode}
 
 
+def _remove_all(executor, resources):
+    """
+    Remove ``(helper, resource)`` pairs, concurrently if an executor is given.
+    """
+    def remove(helper_resource):
+        helper, resource = helper_resource
+        return helper._timed_teardown_remove(resource)
+
+    if executor is None:
+        return [remove(r) for r in resources]
+    return list(executor.map(remove, resources))
+
+
+@attr.s
+class RemovalTiming:
+    """
+    The time taken to remove a single resource during teardown.
+    """
+
+    kind = attr.ib()
+    name = attr.ib()
+    seconds = attr.ib()
+
+
 class _HelperBase:
     __collection_type__ = None
 
-    def __init__(self, client, namespace):
+    def __init__(self, client, namespace, session=None, event_bus=None):
         self.collection = self.__collection_type__(client=client)
         self.namespace = namespace
+        self.session = uuid.uuid4().hex if session is None else session
+        self.labels = session_labels(namespace, self.session)
+        #: The :class:`~seaworthy.events.EventBus` that lifecycle events are
+        #: emitted to.
+        self.events = events.EventBus() if event_bus is None else event_bus
 
         self._model_name = self.collection.model.__name__.lower()
-        self._ids = set()
 
     def _resource_name(self, name):
         return '{}_{}'.format(self.namespace, name)
@@ -99,17 +448,52 @@ class _HelperBase:
 
         return model.id, model
 
-    def create(self, name, *args, **kwargs):
+    def _merge_labels(self, labels):
+        # Docker also accepts a list of label keys with empty values
+        if isinstance(labels, (list, tuple)):
+            labels = {label: '' for label in labels}
+
+        merged = dict(self.labels)
+        if labels:
+            merged.update(labels)
+        return merged
+
+    def _list(self, filters):
+        """
+        List resources of this type that match the given filters.
+        """
+        return self.collection.list(filters=filters)
+
+    def list_session(self):
+        """
+        List the resources of this type that were created in this helper's
+        session and still exist. This makes a single API call, no matter how
+        many resources there are.
+        """
+        return self._list(_label_filter(LABEL_SESSION, self.session))
+
+    def create(self, name, *args, labels=None, **kwargs):
         """
         Create an instance of this resource type.
+
+        The resource is labelled with the helper's namespace and session as
+        well as the current process so that it can be found again later, even
+        if this process goes away. See :attr:`labels`.
         """
         resource_name = self._resource_name(name)
         log.info(
             "Creating {} '{}'...".format(self._model_name, resource_name))
-        resource = self.collection.create(*args, name=resource_name, **kwargs)
-        self._ids.add(resource.id)
+        resource = self._create(
+            *args, name=resource_name, labels=self._merge_labels(labels),
+            **kwargs)
+        self.events.emit(
+            events.CREATE, self._model_name, resource_name, resource)
         return resource
 
+    def _create(self, *args, **kwargs):
+        # Override in subclass for different creation behaviour
+        return self.collection.create(*args, **kwargs)
+
     def remove(self, resource, **kwargs):
         """
         Remove an instance of this resource type.
@@ -117,20 +501,51 @@ class _HelperBase:
         log.info(
             "Removing {} '{}'...".format(self._model_name, resource.name))
         resource.remove(**kwargs)
-        self._ids.remove(resource.id)
+        self.events.emit(
+            events.REMOVE, self._model_name, resource.name, resource)
 
-    def _teardown(self):
-        for resource_id in self._ids.copy():
-            # Check if the resource exists before trying to remove it
-            try:
-                resource = self.collection.get(resource_id)
-            except docker.errors.NotFound:
+    def _teardown(self, executor=None):
+        """
+        Remove all the resources that still exist.
+
+        :param executor:
+            A :class:`concurrent.futures.Executor` to remove the resources
+            with. If ``None``, the resources are removed one at a time.
+        :returns: A list of :class:`RemovalTiming` objects.
+        """
+        return _remove_all(executor, self._teardown_resources())
+
+    def _teardown_resources(self, ignore_ids=()):
+        """
+        Find the resources that must be removed during teardown, as a list of
+        ``(helper, resource)`` pairs.
+        """
+        resources = []
+        for resource in self.list_session():
+            if resource.id in ignore_ids or self._keep_on_teardown(resource):
                 continue
 
             log.warning("{} '{}' still existed during teardown".format(
                 self._model_name.title(), resource.name))
 
+            resources.append((self, resource))
+        return resources
+
+    def _keep_on_teardown(self, resource):
+        # Override in subclass to leave some resources behind on teardown
+        return False
+
+    def _timed_teardown_remove(self, resource):
+        start = time.monotonic()
+        with tracing.span(
+                'remove {}'.format(resource.name), 'teardown',
+                kind=self._model_name):
             self._teardown_remove(resource)
+        timing = RemovalTiming(
+            self._model_name, resource.name, time.monotonic() - start)
+        log.debug("Removed {} '{}' in {:.3f}s".format(
+            timing.kind, timing.name, timing.seconds))
+        return timing
 
     def _teardown_remove(self, resource):
         # Override in subclass for different removal behaviour on teardown
@@ -146,14 +561,73 @@ class ContainerHelper(_HelperBase):
     __collection_type__ = models.containers.ContainerCollection
 
     def __init__(self, client, namespace, image_helper, network_helper,
-                 volume_helper):
-        super().__init__(client, namespace)
+                 volume_helper, session=None, event_bus=None):
+        super().__init__(client, namespace, session, event_bus)
         self._image_helper = image_helper
         self._network_helper = network_helper
         self._volume_helper = volume_helper
+        #: The :class:`ContainerStateCache` that container states can be read
+        #: from, or ``None`` if states aren't tracked.
+        self.states = None
+
+    def get_state(self, container, reload=False):
+        """
+        Get the :class:`ContainerState` of a container. This is read from
+        :attr:`states` if it is tracking the container, otherwise the
+        container is reloaded.
+
+        :param container: The container model.
+        :param reload:
+            Whether to reload the container even if its state is tracked.
+            The reloaded state is also recorded in :attr:`states`.
+        """
+        if self.states is not None and not reload:
+            state = self.states.get(container.id)
+            if state is not None:
+                return state
+        container.reload()
+        state = ContainerState.from_attrs(container.attrs)
+        if self.states is not None:
+            self.states.observe(container)
+        return state
+
+    def wait_for_state(self, container, predicate, timeout=None):
+        """
+        Wait until the state of a container satisfies a predicate, using the
+        Docker events stream rather than polling.
+
+        If :attr:`states` isn't tracking containers, a
+        :class:`ContainerStateCache` that only tracks this container is used
+        while waiting.
+
+        :param container: The container model.
+        :param predicate:
+            A function that takes a :class:`ContainerState` (or ``None`` if
+            the container has been removed) and returns whether to stop
+            waiting.
+        :param timeout: The maximum number of seconds to wait, or ``None``.
+        :returns: The state that satisfied the predicate.
+        :raises TimeoutError: If the timeout is reached first.
+        """
+        states = self.states
+        if states is not None and states.running:
+            self.get_state(container, reload=True)
+            return states.wait_for(container.id, predicate, timeout)
+
+        states = ContainerStateCache(
+            self.collection.client, self.namespace, container_id=container.id)
+        # The events stream is opened before the container is inspected, so
+        # that no changes are missed in between.
+        states.start()
+        try:
+            container.reload()
+            states.observe(container)
+            return states.wait_for(container.id, predicate, timeout)
+        finally:
+            states.stop()
 
     def create(self, name, image, fetch_image=False, network=None, volumes={},
-               **kwargs):
+               network_aliases=(), **kwargs):
         """
         Create a new container.
 
@@ -167,6 +641,10 @@ class ContainerHelper(_HelperBase):
             given an alias with the ``name`` parameter. Note that, unlike the
             Docker Python client, this parameter can be a ``Network`` model
             object, and not just a network ID or name.
+        :param network_aliases:
+            Extra aliases for the container on the network. Several
+            containers can share an alias, in which case DNS lookups of the
+            alias return all of them.
         :param volumes:
             A mapping of volumes to bind parameters. The keys to this mapping
             can be any of three types of objects:
@@ -203,15 +681,72 @@ class ContainerHelper(_HelperBase):
         create_kwargs.update(kwargs)
 
         if fetch_image:
-            self._image_helper.fetch(image)
+            with timing.phase('fetch_image'):
+                self._image_helper.fetch(image)
 
-        container = super().create(name, image, **create_kwargs)
+        aliases = [name] + list(network_aliases)
+        if network is not None and self._can_alias_at_create():
+            create_kwargs['aliases'] = aliases
+            network = None
+        with timing.phase('create'):
+            container = super().create(name, image, **create_kwargs)
 
         if network is not None:
-            self._connect_container_network(container, network, aliases=[name])
-
+            with timing.phase('connect_network'):
+                self._connect_container_network(
+                    container, network, aliases=aliases)
         return container
 
+    def _can_alias_at_create(self):
+        return (_create_container_args is not None and
+                version_gte(self.collection.client.api._version, '1.22'))
+
+    def _create(self, image, aliases=None, **kwargs):
+        if aliases is None:
+            return super()._create(image, **kwargs)
+
+        # The high-level client doesn't allow endpoint aliases to be set when
+        # a container is created, so we go through the low-level client to
+        # create the container on its network with its aliases in one call.
+        api = self.collection.client.api
+        if isinstance(image, models.images.Image):
+            image = image.id
+        kwargs['image'] = image
+        kwargs['version'] = api._version
+        create_kwargs = _create_container_args(kwargs)
+        network = create_kwargs['host_config']['NetworkMode']
+        create_kwargs['networking_config'] = api.create_networking_config({
+            network: api.create_endpoint_config(aliases=aliases),
+        })
+        resp = api.create_container(**create_kwargs)
+        return self.collection.get(resp['Id'])
+
+    def _list(self, filters):
+        # A sparse listing doesn't inspect each container, but sparse
+        # containers only have a list of 'Names' and no 'Name'.
+        containers = self.collection.list(
+            all=True, sparse=True, filters=filters)
+        for container in containers:
+            container.attrs.setdefault(
+                'Name', container.attrs['Names'][0])
+        return containers
+
+    def list_reusable(self, name):
+        """
+        List the reusable containers with the given name in this helper's
+        namespace. These may have been created by any session.
+
+        :param name: The container name, without the namespace prefix.
+        """
+        filters = {'label': [
+            '{}={}'.format(LABEL_NAMESPACE, self.namespace), LABEL_REUSE_HASH]}
+        resource_name = self._resource_name(name)
+        return [c for c in self._list(filters) if c.name == resource_name]
+
+    def _keep_on_teardown(self, resource):
+        # Reusable containers outlive the session that created them
+        return LABEL_REUSE_HASH in (resource.attrs.get('Labels') or {})
+
     def _network_for_container(self, network, create_kwargs):
         # If a network is specified use that
         if network is not None:
@@ -248,13 +783,11 @@ class ContainerHelper(_HelperBase):
         return create_volumes
 
     def _connect_container_network(self, container, network, **connect_kwargs):
-        # FIXME: Hack to make sure the container has the right network aliases.
-        # Only the low-level Docker client API allows us to specify endpoint
-        # aliases at container creation time:
-        # https://docker-py.readthedocs.io/en/stable/api.html#docker.api.container.ContainerApiMixin.create_container
-        # If we don't specify a network when the container is created then the
-        # default bridge network is attached which we don't want, so we
-        # reattach our custom network as that allows specifying aliases.
+        # Fallback for when we can't set the network aliases at container
+        # creation time (see _create()). If we don't specify a network when
+        # the container is created then the default bridge network is attached
+        # which we don't want, so we reattach our custom network as that allows
+        # specifying aliases.
         network.disconnect(container)
         network.connect(container, **connect_kwargs)
         # Reload the container data to get the new network setup
@@ -286,20 +819,466 @@ class ContainerHelper(_HelperBase):
         self.remove(container, force=True)
 
 
+class _EventWatcher:
+    """
+    Consume the Docker events stream in a background thread and pass each
+    event to a callback.
+    """
+
+    def __init__(self, client, filters, callback):
+        self._client = client
+        self._filters = filters
+        self._callback = callback
+        self._stream = None
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        # The stream is opened before this method returns, so that no events
+        # that happen afterwards are missed.
+        self._stream = self._client.events(
+            decode=True, filters=self._filters)
+        self._thread = threading.Thread(
+            target=self._run, name='seaworthy-events', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for event in self._stream:
+                try:
+                    self._callback(event)
+                except Exception:
+                    log.exception('Error handling Docker event {}'.format(
+                        event))
+        except Exception:
+            # Closing the stream can make reads fail in various ways.
+            if not self._stopped:
+                log.exception('Error reading Docker events')
+
+    def stop(self):
+        self._stopped = True
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception as e:
+                log.debug('Error closing Docker events stream: {}'.format(e))
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def _parse_time_nano(value):
+    """
+    Parse an RFC 3339 time from the Docker API into nanoseconds since the
+    epoch. Unset times (the zero time) and unparseable ones are 0.
+    """
+    try:
+        return max(parse_rfc3339_nano(value or ''), 0)
+    except ValueError:
+        return 0
+
+
+@attr.s
+class ContainerState:
+    """
+    The state of a container, as last seen by Docker events or inspection.
+    """
+
+    #: The container's ID.
+    id = attr.ib()
+    #: The container's status, such as ``'created'``, ``'running'`` or
+    #: ``'exited'``.
+    status = attr.ib()
+    #: The container's health status (``'starting'``, ``'healthy'`` or
+    #: ``'unhealthy'``), or ``None`` if it has no healthcheck.
+    health = attr.ib(default=None)
+    #: The exit code of the container's last run, or ``None``.
+    exit_code = attr.ib(default=None)
+    #: Whether the container has been killed for running out of memory.
+    oom_killed = attr.ib(default=False)
+    #: The daemon time, in nanoseconds since the epoch, of the latest change
+    #: that this state reflects.
+    time_nano = attr.ib(default=0)
+
+    @classmethod
+    def from_attrs(cls, attrs):
+        """
+        Create a state from a container's inspection data.
+        """
+        state = attrs.get('State') or {}
+        health = (state.get('Health') or {}).get('Status')
+        times = [attrs.get('Created'), state.get('StartedAt'),
+                 state.get('FinishedAt')]
+        # Docker reports an exit code of 0 for containers that haven't exited.
+        exit_code = None
+        if state.get('Status') in ('exited', 'dead'):
+            exit_code = state.get('ExitCode')
+        return cls(
+            attrs['Id'], state.get('Status'), health=health,
+            exit_code=exit_code,
+            oom_killed=state.get('OOMKilled', False),
+            time_nano=max(_parse_time_nano(t) for t in times))
+
+
+class ContainerStateCache:
+    """
+    Keep track of the state of the containers in a namespace by consuming the
+    Docker events stream in a background thread, so that reading a
+    container's state doesn't need an API call.
+
+    A container is only tracked once an event for it has been seen or it has
+    been passed to :meth:`observe`. Events older than the state they would
+    change are ignored, so states from inspection and from events can be
+    mixed freely.
+    """
+
+    # How each container event action changes the status
+    STATUS_ACTIONS = {
+        'create': 'created',
+        'start': 'running',
+        'restart': 'running',
+        'unpause': 'running',
+        'pause': 'paused',
+        'die': 'exited',
+    }
+
+    def __init__(self, client, namespace, container_id=None):
+        """
+        :param client: The Docker client to read events with.
+        :param namespace: The namespace of the containers to track.
+        :param container_id:
+            If set, only this container is tracked, which is useful for
+            short-lived caches that wait for a single container.
+        """
+        self._client = client
+        self.namespace = namespace
+        self.container_id = container_id
+        self._states = {}
+        self._changed = threading.Condition()
+        self._watcher = None
+
+    @property
+    def running(self):
+        return self._watcher is not None and self._watcher.running
+
+    def start(self):
+        """
+        Start consuming events.
+        """
+        if self._watcher is not None:
+            return
+        filters = {
+            'type': 'container',
+            'label': '{}={}'.format(LABEL_NAMESPACE, self.namespace),
+        }
+        if self.container_id is not None:
+            filters['container'] = self.container_id
+        self._watcher = _EventWatcher(self._client, filters, self.handle_event)
+        self._watcher.start()
+
+    def stop(self):
+        """
+        Stop consuming events and forget all the states.
+        """
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.stop()
+        with self._changed:
+            self._states.clear()
+
+    def get(self, container_id):
+        """
+        Get the :class:`ContainerState` of a container, or ``None`` if it
+        isn't being tracked.
+        """
+        with self._changed:
+            return self._states.get(container_id)
+
+    def observe(self, container):
+        """
+        Update the state of a container from its (freshly reloaded)
+        inspection data.
+        """
+        self._update(ContainerState.from_attrs(container.attrs))
+
+    def _update(self, new):
+        with self._changed:
+            old = self._states.get(new.id)
+            if old is None or new.time_nano >= old.time_nano:
+                self._states[new.id] = new
+                self._changed.notify_all()
+            elif old.status is None or old.health is None:
+                # Events don't include everything: health changes don't
+                # include the status of a container that we haven't seen
+                # before, and start events can't tell whether the container
+                # has a healthcheck. Inspection fills in what's missing.
+                self._states[new.id] = attr.evolve(
+                    old, status=old.status or new.status,
+                    health=old.health or new.health)
+                self._changed.notify_all()
+
+    def handle_event(self, event):
+        """
+        Update the state table from a Docker container event.
+        """
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        action = event.get('Action', event.get('status', ''))
+        attributes = event.get('Actor', {}).get('Attributes') or {}
+        time_nano = event.get('timeNano') or event.get('time', 0) * 10**9
+        if container_id is None:
+            return
+
+        with self._changed:
+            old = self._states.get(container_id)
+            if old is not None and time_nano < old.time_nano:
+                return
+            if action == 'destroy':
+                self._states.pop(container_id, None)
+                self._changed.notify_all()
+                return
+
+            if old is None:
+                old = ContainerState(container_id, None)
+            new = attr.evolve(old, time_nano=time_nano)
+            if action in self.STATUS_ACTIONS:
+                new.status = self.STATUS_ACTIONS[action]
+            if action == 'die':
+                exit_code = attributes.get('exitCode')
+                new.exit_code = None if exit_code is None else int(exit_code)
+            elif action == 'oom':
+                new.oom_killed = True
+            elif action.startswith('health_status:'):
+                new.health = action.split(':', 1)[1].strip()
+            elif action in ('start', 'restart'):
+                new.exit_code = None
+                new.oom_killed = False
+                new.health = None if old.health is None else 'starting'
+            self._states[container_id] = new
+            self._changed.notify_all()
+
+    def wait_for(self, container_id, predicate, timeout=None):
+        """
+        Wait until the state of a container satisfies a predicate.
+
+        :param predicate:
+            A function that takes a :class:`ContainerState` (or ``None`` if
+            the container isn't tracked) and returns whether to stop waiting.
+        :param timeout: The maximum number of seconds to wait, or ``None``.
+        :returns: The state that satisfied the predicate.
+        :raises TimeoutError: If the timeout is reached first.
+        """
+        with self._changed:
+            if not self._changed.wait_for(
+                    lambda: predicate(self._states.get(container_id)),
+                    timeout):
+                raise TimeoutError(
+                    'Timeout ({}s) waiting for container {} state. Last '
+                    'state: {}'.format(
+                        timeout, container_id,
+                        self._states.get(container_id)))
+            return self._states.get(container_id)
+
+
 class ImageHelper:
     """
     .. todo::
 
         Document this properly.
+
+    Images that have been fetched are cached for the lifetime of the helper,
+    so fetching the same tag again makes no API calls. A cached image is
+    dropped when the Docker daemon reports that it was deleted or untagged
+    (which also happens when a tag is moved to another image by a tag, load
+    or import), or that its tag was pulled and now refers to another image.
     """
-    def __init__(self, client):
+
+    #: The image event actions that may invalidate cached images.
+    INVALIDATING_ACTIONS = frozenset(['delete', 'pull', 'untag'])
+
+    def __init__(self, client, cache=True, archive_dir=None):
+        """
+        :param client: The Docker client to use.
+        :param cache: Whether to cache fetched images.
+        :param archive_dir:
+            A directory of image archives to load missing images from before
+            trying to pull them. See :func:`fetch_image`.
+        """
         self.collection = client.images
+        self.archive_dir = archive_dir
+        self._use_cache = cache
+        # Every tag fetched through this helper, for export()
+        self._fetched = []
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # Bumped when a tag is invalidated (or, under ``None``, when the
+        # whole cache is), so that an image that was fetched while its tag
+        # was invalidated isn't cached.
+        self._generations = collections.Counter()
+        self._watcher = None
+
+    def _cached(self, key):
+        with self._cache_lock:
+            return self._cache.get(key)
+
+    def _generation(self, key):
+        with self._cache_lock:
+            return self._generations[None], self._generations[key]
+
+    def _store(self, key, image, generation):
+        with self._cache_lock:
+            if generation == (self._generations[None], self._generations[key]):
+                self._cache[key] = image
+
+    def _watch_events(self):
+        with self._cache_lock:
+            if self._watcher is not None:
+                return
+            self._watcher = _EventWatcher(
+                self.collection.client, {'type': 'image'}, self._handle_event)
+            self._watcher.start()
+
+    def _handle_event(self, event):
+        action = event.get('Action', event.get('status'))
+        if action not in self.INVALIDATING_ACTIONS:
+            return
+        ref = event.get('id')
+        if not ref:
+            return
+        if action == 'pull':
+            self._handle_pull(_normalize_image_tag(ref))
+            return
+        # Deletes and untags name the image by its ID.
+        with self._cache_lock:
+            keys = [key for key, image in self._cache.items()
+                    if image.id == ref]
+        for key in keys:
+            log.debug("Image event '{}' for '{}', invalidating '{}'".format(
+                action, ref, key))
+            self.invalidate(key)
+
+    def _handle_pull(self, key):
+        """
+        Drop a cached image if a pull moved its tag to another image. This
+        is usually our own pull of the image we just cached, so the tag is
+        looked up rather than the image dropped every time.
+        """
+        cached = self._cached(key)
+        if cached is None:
+            return
+        try:
+            current = self.collection.get(key).id
+        except docker.errors.APIError:
+            current = None
+        if current != cached.id:
+            log.debug("Tag '{}' was pulled, invalidating it".format(key))
+            self.invalidate(key)
+
+    def invalidate(self, tag=None):
+        """
+        Remove an image from the cache, so that it is looked up again the
+        next time it is fetched.
 
-    def fetch(self, tag):
+        :param tag: The image to remove. If ``None``, the cache is cleared.
+        """
+        key = None if tag is None else _normalize_image_tag(tag)
+        with self._cache_lock:
+            self._generations[key] += 1
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def fetch(self, tag, progress=None):
         """
-        Fetch this image if it isn't already present.
+        Fetch this image if it isn't already present. See :func:`fetch_image`.
         """
-        return fetch_image(self.collection.client, tag)
+        key = _normalize_image_tag(tag)
+        self._record_fetched([key])
+        if not self._use_cache:
+            return fetch_image(
+                self.collection.client, tag, progress, self.archive_dir)
+
+        image = self._cached(key)
+        if image is None:
+            self._watch_events()
+            generation = self._generation(key)
+            image = fetch_image(
+                self.collection.client, tag, progress, self.archive_dir)
+            self._store(key, image, generation)
+        return image
+
+    def fetch_all(self, tags, workers=DEFAULT_FETCH_WORKERS, progress=None):
+        """
+        Fetch several images concurrently if they aren't already present. See
+        :func:`fetch_images_timed`. Images that are already cached are not
+        fetched again.
+
+        :returns: A list of :class:`ImageFetch` objects.
+        """
+        self._record_fetched(_normalize_image_tag(tag) for tag in tags)
+        if not self._use_cache:
+            return fetch_images_timed(
+                self.collection.client, tags, workers, progress,
+                self.archive_dir)
+
+        keys = []
+        fetches = {}
+        for tag in tags:
+            key = _normalize_image_tag(tag)
+            if key in keys:
+                continue
+            keys.append(key)
+            image = self._cached(key)
+            if image is not None:
+                fetches[key] = ImageFetch(key, image, False, 0.0)
+
+        missing = [key for key in keys if key not in fetches]
+        if missing:
+            self._watch_events()
+            generations = {key: self._generation(key) for key in missing}
+            for fetch in fetch_images_timed(
+                    self.collection.client, missing, workers, progress,
+                    self.archive_dir):
+                self._store(fetch.tag, fetch.image, generations[fetch.tag])
+                fetches[fetch.tag] = fetch
+        return [fetches[key] for key in keys]
+
+    def _record_fetched(self, keys):
+        with self._cache_lock:
+            for key in keys:
+                if key not in self._fetched:
+                    self._fetched.append(key)
+
+    def export(self, archive_dir=None, compress=True, overwrite=False):
+        """
+        Save every image that was fetched through this helper to an image
+        archive directory. See :func:`export_images`.
+
+        :param archive_dir:
+            The image archive directory. Defaults to the helper's
+            ``archive_dir``.
+        :returns: A list of the paths of the archives that were written.
+        """
+        if archive_dir is None:
+            archive_dir = self.archive_dir
+        if archive_dir is None:
+            raise ValueError('No image archive directory given.')
+        with self._cache_lock:
+            tags = list(self._fetched)
+        return export_images(
+            self.collection.client, tags, archive_dir, compress, overwrite)
+
+    def close(self):
+        """
+        Stop watching for image events.
+        """
+        with self._cache_lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.stop()
 
 
 class NetworkHelper(_HelperBase):
@@ -310,18 +1289,21 @@ class NetworkHelper(_HelperBase):
     """
     __collection_type__ = models.networks.NetworkCollection
 
-    def __init__(self, client, namespace):
-        super().__init__(client, namespace)
+    def __init__(self, client, namespace, session=None, event_bus=None):
+        super().__init__(client, namespace, session, event_bus)
         self._default_network = None
+        self._default_lock = threading.Lock()
 
-    def _teardown(self):
-        # Remove the default network
-        if self._default_network is not None:
-            self.remove(self._default_network)
-            self._default_network = None
+    def _teardown_resources(self, ignore_ids=()):
+        # The default network is expected to exist until teardown, so it is
+        # removed without a warning.
+        default_network, self._default_network = self._default_network, None
+        if default_network is None:
+            return super()._teardown_resources(ignore_ids)
 
-        # Remove all other networks
-        super()._teardown()
+        ignore_ids = set(ignore_ids) | {default_network.id}
+        return ([(self, default_network)] +
+                super()._teardown_resources(ignore_ids))
 
     def get_default(self, create=True):
         """
@@ -331,9 +1313,13 @@ class NetworkHelper(_HelperBase):
         :param create:
             Whether or not to create the network if it doesn't already exist.
         """
-        if self._default_network is None and create:
-            log.debug("Creating default network...")
-            self._default_network = self.create('default', driver='bridge')
+        # Containers may be created concurrently, but we only want one
+        # default network.
+        with self._default_lock:
+            if self._default_network is None and create:
+                log.debug("Creating default network...")
+                self._default_network = self.create(
+                    'default', driver='bridge')
 
         return self._default_network
 
@@ -383,17 +1369,68 @@ class DockerHelper:
         Document this properly.
     """
 
-    def __init__(self, namespace='test', client=None):
+    def __init__(self, namespace='test', client=None,
+                 teardown_workers=DEFAULT_TEARDOWN_WORKERS, session=None,
+                 image_archive_dir=None, instrument_api=False,
+                 track_state=False):
+        """
+        :param namespace:
+            The namespace to prefix the names of all created resources with.
+        :param client:
+            The Docker client to use. If ``None``, a client is created from
+            the environment.
+        :param teardown_workers:
+            The maximum number of resources to remove concurrently during
+            :meth:`teardown`.
+        :param session:
+            A unique ID for this helper's resources. All resources are
+            labelled with it so that they can be found and removed during
+            :meth:`teardown`. If ``None``, a random ID is generated.
+        :param image_archive_dir:
+            A directory of image archives to load missing images from. See
+            :class:`ImageHelper`.
+        :param instrument_api:
+            Whether to count and time the Docker API calls made through the
+            client. If ``True``, the calls are available from
+            :attr:`api_calls`.
+        :param track_state:
+            Whether to keep track of the state of this namespace's containers
+            by consuming the Docker events stream in a background thread. If
+            ``True``, container definitions read their status from it instead
+            of inspecting the container. See :class:`ContainerStateCache`.
+        """
         self._namespace = namespace
+        self.session = uuid.uuid4().hex if session is None else session
         if client is None:
             client = docker.client.from_env()
         self._client = client
 
-        self.images = ImageHelper(self._client)
-        self.networks = NetworkHelper(self._client, namespace)
-        self.volumes = VolumeHelper(self._client, namespace)
+        #: The :class:`~seaworthy.instrumentation.ApiCallRecorder` for this
+        #: helper's client, or ``None`` if the API isn't instrumented.
+        self.api_calls = None
+        if instrument_api:
+            self.api_calls = ApiCallRecorder(helper=namespace)
+            self.api_calls.instrument(self._client)
+        self._teardown_workers = teardown_workers
+
+        #: The :class:`~seaworthy.events.EventBus` that this helper's
+        #: resource helpers and the definitions that use them emit lifecycle
+        #: events to.
+        self.events = events.EventBus()
+
+        self.images = ImageHelper(
+            self._client, archive_dir=image_archive_dir)
+        self.networks = NetworkHelper(
+            self._client, namespace, self.session, self.events)
+        self.volumes = VolumeHelper(
+            self._client, namespace, self.session, self.events)
         self.containers = ContainerHelper(
-            self._client, namespace, self.images, self.networks, self.volumes)
+            self._client, namespace, self.images, self.networks, self.volumes,
+            self.session, self.events)
+        if track_state:
+            self.containers.states = ContainerStateCache(
+                self._client, namespace)
+            self.containers.states.start()
 
     def _helper_for_model(self, model_type):
         """
@@ -414,11 +1451,147 @@ class DockerHelper:
     def teardown(self):
         """
         Clean up all resources when we're done with them.
+
+        Resources of the same kind are removed concurrently. All containers
+        are removed before any networks or volumes, because networks and
+        volumes can't be removed while containers still use them.
+
+        :returns:
+            A list of :class:`RemovalTiming` objects, one for each resource
+            that was removed.
+        """
+        stages = [
+            [self.containers],
+            [self.networks, self.volumes],
+        ]
+        timings = []
+        try:
+            with tracing.span(
+                    'teardown helper {}'.format(self._namespace),
+                    'teardown'), \
+                    ThreadPoolExecutor(
+                        max_workers=self._teardown_workers) as ex:
+                for stage in stages:
+                    resources = []
+                    for helper in stage:
+                        resources.extend(helper._teardown_resources())
+                    timings.extend(_remove_all(ex, resources))
+        finally:
+            # Stop the event stream watchers even if a removal failed, so
+            # their threads and connections aren't leaked.
+            self.images.close()
+            if self.containers.states is not None:
+                self.containers.states.stop()
+            # We need to close the underlying APIClient explicitly to avoid
+            # ResourceWarnings from unclosed HTTP connections.
+            self._client.api.close()
+
+        return timings
+
+
+class AsyncDockerHelper:
+    """
+    An asyncio interface to a :class:`DockerHelper`.
+
+    The Docker SDK is blocking, so every call is run in a thread pool and
+    wrapped in an asyncio future. This lets the daemon calls, log streaming
+    and readiness checks for many containers overlap on one event loop, so
+    that setting up several containers takes about as long as the slowest of
+    them rather than the sum of all of them.
+
+    Definitions given this helper (or set up with
+    :meth:`~seaworthy.definitions.ContainerDefinition.setup_async`) run their
+    blocking work in this helper's thread pool::
+
+        async with AsyncDockerHelper() as helper:
+            await helper.setup(redis, postgresql)
+            ...
+
+    The helper works as a ``pytest-asyncio`` fixture::
+
+        @pytest.fixture
+        async def docker_helper():
+            async with AsyncDockerHelper() as helper:
+                yield helper
+    """
+
+    def __init__(self, namespace='test', client=None,
+                 workers=DEFAULT_ASYNC_WORKERS, **kwargs):
+        """
+        :param namespace: See :class:`DockerHelper`.
+        :param client: See :class:`DockerHelper`.
+        :param workers:
+            The number of threads to run blocking calls in. Each container
+            that is waiting to start occupies a thread, so this limits how
+            many containers can be set up at the same time.
+        :param kwargs: Other keyword arguments for :class:`DockerHelper`.
         """
-        self.containers._teardown()
-        self.networks._teardown()
-        self.volumes._teardown()
+        self.helper = DockerHelper(
+            namespace=namespace, client=client, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    @property
+    def containers(self):
+        return self.helper.containers
+
+    @property
+    def images(self):
+        return self.helper.images
+
+    @property
+    def networks(self):
+        return self.helper.networks
+
+    @property
+    def volumes(self):
+        return self.helper.volumes
+
+    def _helper_for_model(self, model_type):
+        return self.helper._helper_for_model(model_type)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Run a blocking function in this helper's thread pool.
+
+        :returns: An asyncio future for the function's result.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    def setup(self, *definitions, **kwargs):
+        """
+        Set up several definitions concurrently.
+
+        :param definitions: The resource definitions to set up.
+        :param kwargs: Keyword arguments passed to each definition's
+            ``setup()``.
+        :returns: An asyncio future for a list of the definitions.
+        """
+        return asyncio.gather(*[
+            d.setup_async(helper=self, **kwargs) for d in definitions])
+
+    def fetch_images(self, images, **kwargs):
+        """
+        Fetch images concurrently. See :meth:`ImageHelper.fetch_all`.
+
+        :returns: An asyncio future for a list of :class:`ImageFetch`.
+        """
+        return self.run(self.images.fetch_all, images, **kwargs)
+
+    def teardown(self):
+        """
+        Tear down the underlying :class:`DockerHelper` and shut down the
+        thread pool.
+
+        :returns: An asyncio future for the list of :class:`RemovalTiming`.
+        """
+        future = self.run(self.helper.teardown)
+        future.add_done_callback(lambda _: self.executor.shutdown(wait=False))
+        return future
+
+    def __aenter__(self):
+        return asyncio.sleep(0, result=self)
 
-        # We need to close the underlying APIClient explicitly to avoid
-        # ResourceWarnings from unclosed HTTP connections.
-        self._client.api.close()
+    def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.teardown()
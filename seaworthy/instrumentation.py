@@ -0,0 +1,248 @@
+"""
+Counting and timing of the Docker API calls made through a client, so that
+the number of daemon round trips a fixture costs can be measured.
+
+Calls are recorded at the HTTP level, so every request to the daemon is
+counted, whichever part of the Docker client made it. Each call is attributed
+to the resource definition whose lifecycle operation (see
+:mod:`seaworthy.timing`) was running on the calling thread, or to the name
+given to :meth:`ApiCallRecorder.attribute`.
+"""
+
+import contextlib
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import attr
+
+from seaworthy import timing
+
+
+# Path segments after a resource ID that name an action on that resource.
+_RESOURCE_ACTIONS = {
+    'archive', 'attach', 'changes', 'connect', 'disable', 'disconnect',
+    'enable', 'export', 'get', 'history', 'inspect', 'json', 'kill', 'logs',
+    'pause', 'push', 'rename', 'resize', 'restart', 'start', 'stats', 'stop',
+    'tag', 'top', 'unpause', 'update', 'upgrade', 'wait',
+}
+# Path segments directly after a collection that aren't resource IDs.
+_COLLECTION_ACTIONS = {
+    'build', 'create', 'get', 'json', 'load', 'prune', 'pull', 'search',
+}
+_COLLECTIONS = {
+    'configs', 'containers', 'distribution', 'exec', 'images', 'networks',
+    'nodes', 'plugins', 'secrets', 'services', 'tasks', 'volumes',
+}
+_VERSION_RE = re.compile(r'^v\d+\.\d+$')
+
+
+def endpoint_name(method, url):
+    """
+    Get a name for the API endpoint of a request, with resource IDs and names
+    replaced by ``{id}``. For example,
+    ``GET /v1.35/containers/3f4e.../json`` is ``GET /containers/{id}/json``.
+    """
+    parts = [p for p in urlsplit(url).path.split('/') if p]
+    if parts and _VERSION_RE.match(parts[0]):
+        parts = parts[1:]
+
+    if (len(parts) >= 2 and parts[0] in _COLLECTIONS and
+            not (len(parts) == 2 and parts[1] in _COLLECTION_ACTIONS)):
+        # Image names may contain slashes, so everything between the
+        # collection and the action is the ID.
+        if len(parts) > 2 and parts[-1] in _RESOURCE_ACTIONS:
+            parts = [parts[0], '{id}', parts[-1]]
+        else:
+            parts = [parts[0], '{id}']
+
+    return '{} /{}'.format(method.upper(), '/'.join(parts))
+
+
+@attr.s
+class ApiCall:
+    """
+    A single call to the Docker API.
+    """
+
+    #: The endpoint, as returned by :func:`endpoint_name`.
+    endpoint = attr.ib()
+    #: The :func:`time.monotonic` time at which the call started.
+    started = attr.ib()
+    #: The time in seconds until the response headers were received.
+    seconds = attr.ib()
+    #: The name of the definition the call is attributed to, or ``None``.
+    definition = attr.ib(default=None)
+    #: The lifecycle operation that made the call, or ``None``.
+    operation = attr.ib(default=None)
+    #: The name of the helper that owns the client, or ``None``.
+    helper = attr.ib(default=None)
+    #: Whether the call raised an exception or got an error response.
+    failed = attr.ib(default=False)
+
+
+@attr.s
+class EndpointStats:
+    """
+    Totals for the calls to a single endpoint.
+    """
+
+    endpoint = attr.ib()
+    count = attr.ib()
+    seconds = attr.ib()
+
+
+class ApiCallRecorder:
+    """
+    Record every Docker API call made through one or more clients. Use
+    :meth:`instrument` to start recording a client's calls.
+
+    Recording a call is cheap, but the recorder keeps every call until
+    :meth:`reset` is called, so it is best suited to test runs rather than
+    long-lived processes.
+    """
+
+    def __init__(self, helper=None):
+        """
+        :param helper:
+            A name for the helper that owns the instrumented clients, to
+            attribute the calls to.
+        """
+        self.helper = helper
+        self._calls = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def instrument(self, client):
+        """
+        Record the API calls made through a ``docker.DockerClient`` (or a
+        low-level ``docker.APIClient``). Only this client instance is
+        affected.
+
+        :returns: The client.
+        """
+        api = getattr(client, 'api', client)
+        if getattr(api, '_seaworthy_recorder', None) is self:
+            return client
+
+        # requests.Session.request() is where every HTTP request that the
+        # Docker client makes ends up, so we wrap it on the instance.
+        request = api.request
+
+        def recorded_request(method, url, *args, **kwargs):
+            start = time.monotonic()
+            failed = True
+            try:
+                response = request(method, url, *args, **kwargs)
+                failed = response.status_code >= 400
+                return response
+            finally:
+                self._record(method, url, start, failed)
+
+        api.request = recorded_request
+        api._seaworthy_recorder = self
+        return client
+
+    def uninstrument(self, client):
+        """
+        Stop recording the API calls made through a client.
+        """
+        api = getattr(client, 'api', client)
+        if getattr(api, '_seaworthy_recorder', None) is self:
+            del api.request
+            del api._seaworthy_recorder
+
+    def _record(self, method, url, start, failed):
+        seconds = time.monotonic() - start
+        operation = timing.current_operation()
+        definition = getattr(self._local, 'definition', None)
+        if definition is None and operation is not None:
+            definition = operation.name
+        if operation is not None:
+            operation.api_calls += 1
+
+        call = ApiCall(
+            endpoint_name(method, url), start, seconds, definition=definition,
+            operation=None if operation is None else operation.operation,
+            helper=self.helper, failed=failed)
+        with self._lock:
+            self._calls.append(call)
+
+    @contextlib.contextmanager
+    def attribute(self, definition):
+        """
+        Attribute the calls made on this thread to a definition, whether or
+        not a lifecycle operation is running::
+
+            with recorder.attribute(container.name):
+                container.status()
+
+        :param definition: A definition or the name of one.
+        """
+        previous = getattr(self._local, 'definition', None)
+        self._local.definition = getattr(definition, 'name', definition)
+        try:
+            yield
+        finally:
+            self._local.definition = previous
+
+    def calls(self, definition=None, endpoint=None, operation=None):
+        """
+        Get the recorded calls, optionally only those matching the given
+        definition name, endpoint and operation.
+
+        :returns: A list of :class:`ApiCall` objects, in the order they
+            finished.
+        """
+        with self._lock:
+            calls = list(self._calls)
+        definition = getattr(definition, 'name', definition)
+        return [
+            c for c in calls
+            if (definition is None or c.definition == definition) and
+            (endpoint is None or c.endpoint == endpoint) and
+            (operation is None or c.operation == operation)
+        ]
+
+    def count(self, **filters):
+        """
+        Count the recorded calls. Takes the same filters as :meth:`calls`.
+        """
+        return len(self.calls(**filters))
+
+    def stats(self, **filters):
+        """
+        Get totals per endpoint. Takes the same filters as :meth:`calls`.
+
+        :returns: A list of :class:`EndpointStats` objects, the most called
+            endpoints first.
+        """
+        totals = {}
+        for call in self.calls(**filters):
+            count, seconds = totals.get(call.endpoint, (0, 0.0))
+            totals[call.endpoint] = (count + 1, seconds + call.seconds)
+        stats = [EndpointStats(e, c, s) for e, (c, s) in totals.items()]
+        return sorted(stats, key=lambda s: (-s.count, s.endpoint))
+
+    def by_definition(self):
+        """
+        Get the number of calls attributed to each definition.
+
+        :returns: A dict mapping definition names (or ``None`` for calls that
+            weren't attributed) to call counts.
+        """
+        counts = {}
+        for call in self.calls():
+            counts[call.definition] = counts.get(call.definition, 0) + 1
+        return counts
+
+    def reset(self):
+        """
+        Forget all the recorded calls.
+        """
+        with self._lock:
+            del self._calls[:]
+
+
+__all__ = ['ApiCall', 'ApiCallRecorder', 'EndpointStats', 'endpoint_name']
@@ -0,0 +1,301 @@
+"""
+A pool of ready-to-use containers that can be leased to tests, to avoid paying
+for container startup in every test that needs a container.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import attr
+
+from seaworthy import events
+from seaworthy.definitions import ContainerDefinition, _ContainerHelperMixin
+
+
+log = logging.getLogger(__name__)
+
+
+@attr.s
+class PoolStats:
+    """
+    Counters for a :class:`ContainerPool`.
+    """
+
+    #: The number of leases served by a container that was already ready.
+    hits = attr.ib(default=0)
+    #: The number of leases that had to wait for a container to be set up.
+    misses = attr.ib(default=0)
+    #: The number of containers that could not be cleaned and were replaced.
+    discarded = attr.ib(default=0)
+    #: The time in seconds it took to set up each container in the pool.
+    refill_seconds = attr.ib(default=attr.Factory(list))
+
+
+@attr.s
+class _SetupFailed:
+    """
+    Put on the ready queue in place of a container that couldn't be set up,
+    so that a waiting lease gets the error.
+    """
+
+    exception = attr.ib()
+
+
+class ContainerPool(_ContainerHelperMixin):
+    """
+    A pool of containers created from a single :class:`.ContainerDefinition`.
+
+    The pool keeps ``size`` containers set up and ready. A container is leased
+    from the pool with :meth:`acquire` (or :meth:`lease`) and returned with
+    :meth:`release`, at which point it is cleaned using the definition's
+    ``clean()`` method and becomes ready for the next lease. Containers are
+    replaced in the background as they are leased, so that a lease rarely has
+    to wait for a container to start. Released containers that aren't needed
+    to keep the pool full are torn down.
+
+    The definition passed to the pool is only used as a template: each
+    container in the pool is set up from a copy of it (see
+    :meth:`.ContainerDefinition.clone`) with a name like ``<name>_pool0``. The
+    definition must implement ``clean()``, otherwise containers are torn down
+    and replaced when they are released.
+    """
+
+    def __init__(self, definition, size=2, helper=None):
+        """
+        :param ~seaworthy.definitions.ContainerDefinition definition:
+            The definition to create containers from.
+        :param size: The number of containers to keep ready.
+        :param helper:
+            The helper to set the containers up with. This can also be set
+            later using :meth:`set_helper` or :meth:`setup`.
+        """
+        if not isinstance(definition, ContainerDefinition):
+            raise TypeError(
+                'ContainerPool requires a ContainerDefinition, got {}'.format(
+                    type(definition)))
+        if size < 1:
+            raise ValueError('Pool size must be at least 1.')
+
+        self.definition = definition
+        self.size = size
+        self.stats = PoolStats()
+
+        self._helper = None
+        self.set_helper(helper)
+
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._failures = 0
+        self._leased = set()
+        self._pending = 0
+        self._next_index = 0
+        self._executor = None
+
+    @property
+    def started(self):
+        return self._executor is not None
+
+    def setup(self, helper=None, wait=False):
+        """
+        Start filling the pool in the background.
+
+        :param helper:
+            The helper to use, if one was not provided when this pool was
+            created.
+        :param wait: Whether to block until every container is ready.
+
+        :returns: This pool instance.
+        """
+        self.set_helper(helper)
+        if self._helper is None:
+            raise RuntimeError('No helper set.')
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size)
+        futures = self._refill()
+        if wait:
+            for future in futures:
+                future.result()
+        return self
+
+    def teardown(self):
+        """
+        Stop refilling the pool and tear down every container, including any
+        that are still leased.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.shutdown(wait=True)
+
+        containers = list(self._leased)
+        self._leased.clear()
+        while True:
+            try:
+                container = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(container, _SetupFailed):
+                containers.append(container)
+        with self._lock:
+            self._failures = 0
+        for container in containers:
+            container.teardown()
+
+    def __enter__(self):
+        return self.setup()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.teardown()
+
+    def _new_container(self):
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        return self.definition.clone(
+            '{}_pool{}'.format(self.definition.name, index))
+
+    def _spawn(self):
+        start = time.monotonic()
+        container = self._new_container()
+        try:
+            container.setup(helper=self.helper)
+        except Exception as e:
+            log.exception(
+                "Failed to set up pool container '{}'".format(container.name))
+            container.teardown()
+            with self._lock:
+                self._pending -= 1
+                self._failures += 1
+                self._ready.put(_SetupFailed(e))
+            raise
+
+        seconds = time.monotonic() - start
+        log.debug("Pool container '{}' ready in {:.3f}s".format(
+            container.name, seconds))
+        with self._lock:
+            self.stats.refill_seconds.append(seconds)
+            self._pending -= 1
+            # A released container may have taken this one's place.
+            surplus = self._ready_count() >= self.size
+            if not surplus:
+                self._ready.put(container)
+        if surplus:
+            container.teardown()
+
+    def _ready_count(self):
+        """
+        The number of ready containers, not counting setup failures that
+        haven't been reported yet. Must be called with the lock held.
+        """
+        return self._ready.qsize() - self._failures
+
+    def _refill(self):
+        """
+        Schedule enough containers to be set up to fill the pool.
+        """
+        with self._lock:
+            if self._executor is None:
+                return []
+            missing = self.size - self._ready_count() - self._pending
+            missing = max(missing, 0)
+            self._pending += missing
+            return [self._executor.submit(self._spawn)
+                    for _ in range(missing)]
+
+    def acquire(self, timeout=None):
+        """
+        Lease a ready container from the pool, waiting for one to be set up
+        if none are ready yet.
+
+        :param timeout:
+            The number of seconds to wait for a container. If ``None``, wait
+            forever.
+        :returns: A set up :class:`.ContainerDefinition`.
+        :raises TimeoutError: If no container is ready within the timeout.
+        :raises Exception:
+            If a container failed to set up, the error from its setup. The
+            next lease tries to set up another container.
+        """
+        if not self.started:
+            raise RuntimeError('Pool not set up.')
+
+        try:
+            container = self._ready.get_nowait()
+            with self._lock:
+                self.stats.hits += 1
+        except queue.Empty:
+            with self._lock:
+                self.stats.misses += 1
+            # Make sure a container is on its way before we wait for it.
+            self._refill()
+            try:
+                container = self._ready.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(
+                    'Timeout ({}s) waiting for a pool container.'.format(
+                        timeout))
+
+        if isinstance(container, _SetupFailed):
+            with self._lock:
+                self._failures -= 1
+            raise container.exception
+
+        self._leased.add(container)
+        # Replace the container we just took.
+        self._refill()
+        return container
+
+    def release(self, container):
+        """
+        Return a leased container to the pool. The container is cleaned before
+        it is leased again. If it can't be cleaned, it is torn down and
+        replaced.
+        """
+        self._leased.remove(container)
+        if not self.started:
+            container.teardown()
+            return
+
+        with self._lock:
+            surplus = self._ready_count() >= self.size
+        if surplus:
+            # The pool was refilled while this container was leased.
+            container.teardown()
+            return
+
+        try:
+            container.clean()
+        except Exception as e:
+            if not isinstance(e, NotImplementedError):
+                log.warning("Failed to clean pool container '{}': {}".format(
+                    container.name, e))
+            with self._lock:
+                self.stats.discarded += 1
+            container.teardown()
+            self._refill()
+            return
+
+        container._emit(events.CLEAN)
+        self._ready.put(container)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        A context manager that leases a container for the duration of the
+        block. See :meth:`acquire` and :meth:`release`.
+        """
+        container = self.acquire(timeout=timeout)
+        try:
+            yield container
+        finally:
+            self.release(container)
+
+
+__all__ = ['ContainerPool', 'PoolStats']
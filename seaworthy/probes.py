@@ -0,0 +1,589 @@
+"""
+Readiness probes, for waiting until a container is ready to be used.
+
+A probe checks something once, such as whether a TCP port accepts connections
+or whether an HTTP request gets a response. :meth:`Probe.wait` checks a probe
+repeatedly until it passes, with an exponential :class:`Backoff` between
+attempts. Probes can be combined with :func:`all_of` and :func:`any_of`, and
+the combination is waited for under a single deadline::
+
+    probe = all_of(
+        TcpProbe.for_container(postgresql),
+        ExecProbe(postgresql, ['pg_isready']))
+    result = probe.wait(timeout=10)
+    print(result.seconds)
+
+Every wait returns a :class:`ProbeResult` recording how long each probe took
+to become ready.
+"""
+
+import errno
+import os
+import random
+import selectors
+import socket
+import time
+
+import attr
+
+from seaworthy import tracing
+from seaworthy.stream.matchers import (
+    RegexMatcher, UnorderedMatcher, to_matcher)
+
+
+@attr.s
+class Backoff:
+    """
+    Exponentially increasing delays between probe attempts, with random
+    jitter so that many probes started at once don't stay in step.
+    """
+
+    #: The first delay, in seconds.
+    initial = attr.ib(default=0.01)
+    #: The longest delay, in seconds.
+    maximum = attr.ib(default=1.0)
+    #: How much each delay is multiplied by.
+    factor = attr.ib(default=2.0)
+    #: The fraction of each delay that is random. With a jitter of 0.5, each
+    #: delay is between half of and the full nominal delay.
+    jitter = attr.ib(default=0.5)
+
+    def delays(self):
+        """
+        Generate the delays, forever.
+        """
+        delay = self.initial
+        while True:
+            yield delay * (1 - self.jitter * random.random())
+            delay = min(delay * self.factor, self.maximum)
+
+
+@attr.s
+class ProbeResult:
+    """
+    The outcome of waiting for a probe.
+    """
+
+    #: The name of the probe.
+    name = attr.ib()
+    #: Whether the probe passed.
+    ready = attr.ib()
+    #: The time it took the probe to pass, or the time spent waiting for it
+    #: if it didn't.
+    seconds = attr.ib()
+    #: The number of times the probe was checked.
+    attempts = attr.ib()
+    #: A description of the last error raised by the probe, if any.
+    error = attr.ib(default=None)
+    #: The results of the probes a combined probe is made of.
+    probes = attr.ib(default=attr.Factory(list))
+
+    def format(self, indent=''):
+        """
+        Describe the result (and those of any combined probes) in a few
+        lines.
+        """
+        if self.ready:
+            outcome = 'ready after {:.2f}s'.format(self.seconds)
+        else:
+            outcome = 'not ready after {:.2f}s'.format(self.seconds)
+        line = '{}{}: {} ({} attempts)'.format(
+            indent, self.name, outcome, self.attempts)
+        if self.error is not None:
+            line += ', last error: {}'.format(self.error)
+        return '\n'.join(
+            [line] + [p.format(indent + '  ') for p in self.probes])
+
+
+class ProbeTimeout(TimeoutError):
+    """
+    Raised when a probe doesn't pass in time.
+    """
+
+    def __init__(self, timeout, result):
+        super().__init__('Timeout ({}s) waiting for probe:\n{}'.format(
+            timeout, result.format()))
+        #: The :class:`ProbeResult` of the wait.
+        self.result = result
+
+
+class Probe:
+    """
+    Base class for probes. Subclasses implement :meth:`check`.
+    """
+
+    def __init__(self, name):
+        #: A name for the probe, used in results and error messages.
+        self.name = name
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
+
+    def check(self, timeout):
+        """
+        Check whether the probe passes. Exceptions count as failures.
+
+        :param timeout:
+            The number of seconds left before the deadline, which any
+            blocking calls should respect.
+        :returns: Whether the probe passed.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def reset(self):
+        """
+        Forget anything remembered from earlier checks. Called at the start
+        of each wait.
+        """
+
+    def results(self):
+        """
+        Get the results of the probes this probe is made of, if any.
+        """
+        return []
+
+    def wait(self, timeout, backoff=None):
+        """
+        Check the probe until it passes, with a backoff between attempts.
+
+        :param timeout: The maximum number of seconds to wait.
+        :param Backoff backoff:
+            The delays between attempts. Defaults to ``Backoff()``.
+        :returns: A :class:`ProbeResult`.
+        :raises ProbeTimeout:
+            If the probe doesn't pass in time. Its ``result`` attribute has
+            the details.
+        """
+        if backoff is None:
+            backoff = Backoff()
+        delays = backoff.delays()
+        self.reset()
+        started = time.monotonic()
+        deadline = started + timeout
+        attempts = 0
+        with tracing.span('probe {}'.format(self.name), 'wait'):
+            while True:
+                attempts += 1
+                ready, error = _attempt(self, deadline)
+                now = time.monotonic()
+                result = ProbeResult(
+                    self.name, ready, now - started, attempts, error,
+                    self.results())
+                if ready:
+                    return result
+                if now >= deadline:
+                    raise ProbeTimeout(timeout, result)
+                time.sleep(min(next(delays), deadline - now))
+
+
+def _attempt(probe, deadline):
+    """
+    Check a probe once, returning whether it passed and a description of the
+    error if it raised one.
+    """
+    try:
+        return bool(probe.check(max(deadline - time.monotonic(), 0.001))), None
+    except Exception as e:
+        return False, '{}: {}'.format(type(e).__name__, e)
+
+
+class _CombinedProbe(Probe):
+    def __init__(self, probes, name):
+        if not probes:
+            raise ValueError('At least one probe is required')
+        super().__init__(name)
+        self.probes = probes
+        self._states = {}
+        self._started = None
+
+    def reset(self):
+        self._started = time.monotonic()
+        self._states = {}
+        for probe in self.probes:
+            probe.reset()
+            # [passed_at, attempts, error]
+            self._states[probe] = [None, 0, None]
+
+    def _check_probe(self, probe, deadline):
+        state = self._states[probe]
+        if state[0] is None:
+            ready, state[2] = _attempt(probe, deadline)
+            state[1] += 1
+            if ready:
+                state[0] = time.monotonic()
+        return state[0] is not None
+
+    def results(self):
+        now = time.monotonic()
+        results = []
+        for probe in self.probes:
+            passed_at, attempts, error = self._states[probe]
+            ready = passed_at is not None
+            seconds = (passed_at if ready else now) - self._started
+            results.append(ProbeResult(
+                probe.name, ready, seconds, attempts, error, probe.results()))
+        return results
+
+
+class AllProbe(_CombinedProbe):
+    """
+    Passes once every one of its probes has passed. Probes that have passed
+    aren't checked again.
+    """
+
+    def __init__(self, *probes, name='all'):
+        super().__init__(probes, name)
+
+    def check(self, timeout):
+        deadline = time.monotonic() + timeout
+        return all([self._check_probe(p, deadline) for p in self.probes])
+
+
+class AnyProbe(_CombinedProbe):
+    """
+    Passes as soon as any one of its probes passes.
+    """
+
+    def __init__(self, *probes, name='any'):
+        super().__init__(probes, name)
+
+    def check(self, timeout):
+        deadline = time.monotonic() + timeout
+        return any(self._check_probe(p, deadline) for p in self.probes)
+
+
+def all_of(*probes, name='all'):
+    """
+    Combine probes into one that passes when all of them have passed.
+    """
+    return AllProbe(*probes, name=name)
+
+
+def any_of(*probes, name='any'):
+    """
+    Combine probes into one that passes when any of them passes.
+    """
+    return AnyProbe(*probes, name=name)
+
+
+class TcpProbe(Probe):
+    """
+    Passes when a TCP connection to an address is accepted.
+    """
+
+    #: The longest time to wait for a single connection attempt.
+    CONNECT_TIMEOUT = 1.0
+
+    def __init__(self, host, port, name=None):
+        if name is None:
+            name = 'tcp {}:{}'.format(host, port)
+        super().__init__(name)
+        self.host = host
+        self.port = int(port)
+
+    @classmethod
+    def for_container(cls, container, container_port=None):
+        """
+        Probe a port that a container publishes on the host.
+
+        :param container:
+            The :class:`~seaworthy.definitions.ContainerDefinition`.
+        :param container_port:
+            The container port. If ``None``, the first published port is used.
+        """
+        if container_port is not None:
+            host, port = container.get_host_port(container_port)
+        else:
+            host, port = container.get_first_host_port()
+        return cls(host, port, name='tcp {} {}'.format(container.name, port))
+
+    def check(self, timeout):
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=min(timeout, self.CONNECT_TIMEOUT))
+        sock.close()
+        return True
+
+
+# connect_ex() results that mean a non-blocking connection is in progress
+_CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+class _PortConnection:
+    """
+    The state of the connection attempts to one port in
+    :func:`wait_for_ports`.
+    """
+
+    def __init__(self, probe, delays, started):
+        self.probe = probe
+        self.delays = delays
+        self.started = started
+        self.sock = None
+        self.attempt_deadline = None
+        self.retry_at = started
+        self.accepted_at = None
+        self.attempts = 0
+        self.error = None
+
+    def connect(self, selector, now):
+        """
+        Start a non-blocking connection attempt.
+        """
+        self.attempts += 1
+        self.retry_at = None
+        try:
+            family, type_, proto, _, address = socket.getaddrinfo(
+                self.probe.host, self.probe.port, type=socket.SOCK_STREAM)[0]
+            self.sock = socket.socket(family, type_, proto)
+            self.sock.setblocking(False)
+            err = self.sock.connect_ex(address)
+        except OSError as e:
+            self.failed(now, '{}: {}'.format(type(e).__name__, e))
+            return
+        if err == 0:
+            self.accepted(now)
+        elif err in _CONNECT_IN_PROGRESS:
+            self.attempt_deadline = now + self.probe.CONNECT_TIMEOUT
+            selector.register(self.sock, selectors.EVENT_WRITE, self)
+        else:
+            self.failed(now, _errno_error(err))
+
+    def connected(self, selector, now):
+        """
+        Finish a connection attempt once its socket is writable.
+        """
+        selector.unregister(self.sock)
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err == 0:
+            self.accepted(now)
+        else:
+            self.failed(now, _errno_error(err))
+
+    def timed_out(self, selector, now):
+        selector.unregister(self.sock)
+        self.failed(now, 'timeout: connection attempt timed out')
+
+    def accepted(self, now):
+        self.close()
+        self.accepted_at = now
+        self.error = None
+
+    def failed(self, now, error):
+        self.close()
+        self.error = error
+        self.retry_at = now + next(self.delays)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def result(self, now):
+        ready = self.accepted_at is not None
+        seconds = (self.accepted_at if ready else now) - self.started
+        return ProbeResult(
+            self.probe.name, ready, seconds, self.attempts, self.error)
+
+
+def _errno_error(err):
+    return '{}: {}'.format(errno.errorcode.get(err, err), os.strerror(err))
+
+
+def wait_for_ports(probes, timeout, backoff=None):
+    """
+    Wait until many TCP ports accept connections, from a single thread.
+
+    Rather than checking each port in turn, this makes non-blocking
+    connection attempts to all of the ports at once and waits for them with a
+    single selector. Each port that refuses a connection is retried with its
+    own :class:`Backoff`.
+
+    Note that Docker's userland proxy may accept connections to a published
+    port before the container listens on it.
+
+    :param probes:
+        The ports to wait for, as :class:`TcpProbe` objects (see
+        :meth:`TcpProbe.for_container`) or ``(host, port)`` tuples.
+    :param timeout: The maximum number of seconds to wait for all the ports.
+    :param Backoff backoff:
+        The delays between attempts for each port. Defaults to
+        ``Backoff()``.
+    :returns:
+        A :class:`ProbeResult` whose ``probes`` are the results for each port,
+        in order, with the time each one took to accept a connection.
+    :raises ProbeTimeout: If any of the ports isn't accepting in time.
+    """
+    if backoff is None:
+        backoff = Backoff()
+    probes = [p if isinstance(p, Probe) else TcpProbe(*p) for p in probes]
+    if not probes:
+        raise ValueError('At least one port is required')
+    started = time.monotonic()
+    deadline = started + timeout
+    connections = [_PortConnection(p, backoff.delays(), started)
+                   for p in probes]
+    selector = selectors.DefaultSelector()
+    try:
+        with tracing.span('wait_for_ports', 'wait', ports=len(probes)):
+            now = started
+            while True:
+                pending = [c for c in connections if c.accepted_at is None]
+                if not pending or now >= deadline:
+                    break
+                for conn in pending:
+                    if conn.retry_at is not None and conn.retry_at <= now:
+                        conn.connect(selector, now)
+                    elif (conn.sock is not None and
+                            conn.attempt_deadline <= now):
+                        conn.timed_out(selector, now)
+
+                # Sleep until something happens or needs to be done.
+                wake_at = [deadline]
+                for conn in pending:
+                    if conn.sock is not None:
+                        wake_at.append(conn.attempt_deadline)
+                    elif conn.retry_at is not None:
+                        wake_at.append(conn.retry_at)
+                for key, _ in selector.select(
+                        max(min(wake_at) - time.monotonic(), 0)):
+                    key.data.connected(selector, time.monotonic())
+                now = time.monotonic()
+    finally:
+        for conn in connections:
+            if conn.sock is not None:
+                selector.unregister(conn.sock)
+                conn.close()
+        selector.close()
+
+    results = [c.result(now) for c in connections]
+    ready = all(r.ready for r in results)
+    result = ProbeResult(
+        'ports', ready, now - started, max(r.attempts for r in results),
+        probes=results)
+    if not ready:
+        raise ProbeTimeout(timeout, result)
+    return result
+
+
+class HttpProbe(Probe):
+    """
+    Passes when an HTTP GET request gets a response.
+    """
+
+    def __init__(self, client, path='/', expected_status_code=None,
+                 name=None):
+        """
+        :param ~seaworthy.client.ContainerHttpClient client:
+            The HTTP client to make requests with.
+        :param path: The path to request.
+        :param int expected_status_code:
+            If set, only a response with this status code passes.
+        """
+        if name is None:
+            name = 'http {}'.format(path)
+        super().__init__(name)
+        self.client = client
+        self.path = path
+        self.expected_status_code = expected_status_code
+
+    @classmethod
+    def for_container(cls, container, container_port=None, **kwargs):
+        """
+        Probe a container with its :meth:`http_client`.
+        """
+        kwargs.setdefault('name', 'http {}'.format(container.name))
+        return cls(container.http_client(port=container_port), **kwargs)
+
+    def check(self, timeout):
+        response = self.client.get(
+            self.path, timeout=timeout, allow_redirects=False)
+        return (self.expected_status_code is None or
+                response.status_code == self.expected_status_code)
+
+
+class ExecProbe(Probe):
+    """
+    Passes when a command run in a container exits successfully.
+    """
+
+    def __init__(self, container, cmd, name=None):
+        """
+        :param container:
+            The :class:`~seaworthy.definitions.ContainerDefinition`.
+        :param cmd: The command to run, as for ``exec_run``.
+        """
+        if name is None:
+            name = 'exec {} {}'.format(container.name, cmd)
+        super().__init__(name)
+        self.container = container
+        self.cmd = cmd
+
+    def check(self, timeout):
+        exit_code, _ = self.container.inner().exec_run(self.cmd)
+        return exit_code == 0
+
+
+class LogProbe(Probe):
+    """
+    Passes once a container's logs have lines matching all the given
+    patterns, in any order.
+    """
+
+    def __init__(self, container, *patterns, name=None, encoding='utf-8'):
+        """
+        :param container:
+            The :class:`~seaworthy.definitions.ContainerDefinition`.
+        :param patterns:
+            Regexes, or stateless matchers such as
+            :class:`~seaworthy.stream.matchers.RegexMatcher`.
+        """
+        if not patterns:
+            raise ValueError('At least one pattern is required')
+        if name is None:
+            name = 'logs {}'.format(container.name)
+        super().__init__(name)
+        self.container = container
+        self.matchers = [to_matcher(RegexMatcher, p) for p in patterns]
+        self.encoding = encoding
+        self.reset()
+
+    def reset(self):
+        self._matcher = UnorderedMatcher(*self.matchers)
+        self._offset = 0
+
+    def check(self, timeout):
+        # Only complete lines that haven't been matched before are matched.
+        logs = self.container.inner().logs()
+        end = logs.rfind(b'\n') + 1
+        lines = logs[self._offset:end].decode(self.encoding).splitlines()
+        self._offset = max(end, self._offset)
+        for line in lines:
+            if self._matcher(line.rstrip()):
+                return True
+        return False
+
+
+class HealthProbe(Probe):
+    """
+    Passes when a container's healthcheck reports that it is healthy.
+    """
+
+    def __init__(self, container, name=None):
+        """
+        :param container:
+            The :class:`~seaworthy.definitions.ContainerDefinition`.
+        """
+        if name is None:
+            name = 'health {}'.format(container.name)
+        super().__init__(name)
+        self.container = container
+
+    def check(self, timeout):
+        state = self.container.state()
+        return state is not None and state.health == 'healthy'
+
+
+__all__ = [
+    'AllProbe', 'AnyProbe', 'Backoff', 'ExecProbe', 'HealthProbe',
+    'HttpProbe', 'LogProbe', 'Probe', 'ProbeResult', 'ProbeTimeout',
+    'TcpProbe', 'all_of', 'any_of', 'wait_for_ports']
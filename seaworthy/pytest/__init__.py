@@ -8,4 +8,7 @@ pieces to make Seaworthy work better with pytest.
 from .checks import dockertest
 from .fixtures import docker_helper
 
+# The plugin's command line options and reports.
+pytest_plugins = ['seaworthy.pytest.durations', 'seaworthy.pytest.trace']
+
 __all__ = ['docker_helper', 'dockertest']
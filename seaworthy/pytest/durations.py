@@ -0,0 +1,182 @@
+"""
+A report of the slowest container setups, waits and teardowns made through
+Seaworthy's pytest fixtures.
+
+pytest's own ``--durations`` option charges the setup of a shared container to
+whichever test happened to request the fixture first. With
+``--seaworthy-durations=N``, the lifecycle timings (see
+:mod:`seaworthy.timing`) of the definitions set up and torn down by
+:func:`~seaworthy.pytest.fixtures.resource_fixture` and the fixtures built on
+it are collected, and the N slowest are listed in the terminal summary with
+their phase breakdown and the number of Docker API calls they made.
+
+pytest sets fixtures up one at a time, so everything timed while a fixture is
+being set up or torn down is charged to it, including the definitions that
+stacks, replica sets and pools set up on their own worker threads.
+"""
+
+import contextlib
+import threading
+
+import attr
+
+from seaworthy import timing
+
+
+# The fixture being set up or torn down, shared by every thread.
+_fixture = None
+_recorder = None
+
+
+@attr.s
+class FixtureDuration:
+    """
+    The time taken by a fixture to set up, wait for or tear down a
+    definition.
+    """
+
+    #: The name of the fixture.
+    fixture = attr.ib()
+    #: The name of the definition.
+    definition = attr.ib()
+    #: The definition's image, if it has one.
+    image = attr.ib()
+    #: ``'setup'``, ``'wait'`` or ``'teardown'``.
+    kind = attr.ib()
+    #: The duration in seconds.
+    seconds = attr.ib()
+    #: A list of :class:`~seaworthy.timing.PhaseTiming` objects.
+    phases = attr.ib(default=attr.Factory(list))
+    #: The number of Docker API calls made, if they were recorded.
+    api_calls = attr.ib(default=0)
+
+    def format(self):
+        image = '' if self.image is None else ' ({})'.format(self.image)
+        line = '{:.2f}s {:<8} {} [{}]{}'.format(
+            self.seconds, self.kind, self.fixture, self.definition, image)
+        if self.phases:
+            line += ' -- {}'.format(', '.join(
+                '{} {:.2f}s'.format(p.name, p.seconds) for p in self.phases))
+        if self.api_calls:
+            line += ' -- {} API calls'.format(self.api_calls)
+        return line
+
+
+def _image_name(definition):
+    args = getattr(definition, '_create_args', ())
+    if not args:
+        return None
+    image = args[0]
+    if isinstance(image, str):
+        return image
+    tags = getattr(image, 'tags', None)
+    return tags[0] if tags else getattr(image, 'short_id', None)
+
+
+class DurationsRecorder:
+    """
+    Collect the lifecycle timings of definitions while a fixture is setting
+    them up or tearing them down. Instances are registered as global timing
+    listeners by the ``--seaworthy-durations`` option.
+    """
+
+    def __init__(self):
+        self._durations = []
+        self._lock = threading.Lock()
+
+    def __call__(self, definition, lifecycle_timing):
+        fixture = _fixture
+        if fixture is None:
+            return
+
+        image = _image_name(definition)
+        kind = lifecycle_timing.operation
+        if kind == 'halt':
+            kind = 'teardown'
+        durations = [FixtureDuration(
+            fixture, definition.name, image, kind, lifecycle_timing.seconds,
+            lifecycle_timing.phases, lifecycle_timing.api_calls)]
+
+        waits = [p for p in lifecycle_timing.phases
+                 if p.name == 'wait_for_start']
+        if waits:
+            durations.append(FixtureDuration(
+                fixture, definition.name, image, 'wait',
+                sum(p.seconds for p in waits)))
+
+        with self._lock:
+            self._durations.extend(durations)
+
+    def slowest(self, count=None):
+        """
+        Get the slowest durations, slowest first.
+
+        :param count: The maximum number of durations. ``None`` or ``0``
+            means all of them.
+        """
+        with self._lock:
+            durations = sorted(
+                self._durations, key=lambda d: d.seconds, reverse=True)
+        return durations[:count] if count else durations
+
+
+@contextlib.contextmanager
+def fixture_scope(name):
+    """
+    Attribute the definition timings recorded on any thread to a fixture
+    until the block ends.
+    """
+    global _fixture
+    previous, _fixture = _fixture, name
+    try:
+        yield
+    finally:
+        _fixture = previous
+
+
+def enabled():
+    """
+    Whether the durations report is enabled for the current pytest run.
+    """
+    return _recorder is not None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('seaworthy')
+    group.addoption(
+        '--seaworthy-durations', type=int, default=None, metavar='N',
+        help='show the N slowest container setups, waits and teardowns '
+             'made through seaworthy fixtures (N=0 for all).')
+
+
+def pytest_configure(config):
+    global _recorder
+    if config.getoption('seaworthy_durations') is None:
+        return
+    _recorder = DurationsRecorder()
+    timing.add_listener(_recorder)
+
+
+def pytest_unconfigure(config):
+    global _recorder
+    if _recorder is not None:
+        timing.remove_listener(_recorder)
+        _recorder = None
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _recorder is None:
+        return
+    count = terminalreporter.config.getoption('seaworthy_durations')
+    if count:
+        title = 'slowest {} seaworthy durations'.format(count)
+    else:
+        title = 'slowest seaworthy durations'
+    terminalreporter.write_sep('=', title)
+
+    durations = _recorder.slowest(count)
+    if not durations:
+        terminalreporter.write_line(
+            'No containers were set up by seaworthy fixtures.')
+    for duration in durations:
+        terminalreporter.write_line(duration.format())
@@ -6,8 +6,10 @@ import os
 
 import pytest
 
+from seaworthy import budgets, events, tracing
 from seaworthy.definitions import ContainerDefinition, _DefinitionBase
 from seaworthy.helpers import DockerHelper
+from seaworthy.pytest import durations
 
 
 def docker_helper_fixture(name='docker_helper', scope='module', **kwargs):
@@ -23,7 +25,9 @@ def docker_helper_fixture(name='docker_helper', scope='module', **kwargs):
     :param scope: The scope of the fixture.
     :param kwargs:
         Keyword arguments to pass to the :class:`~seaworthy.DockerHelper`
-        constructor.
+        constructor. Unless ``instrument_api`` is given, the API is
+        instrumented when ``--seaworthy-durations`` is used, so that the
+        report includes API call counts.
     """
     @pytest.fixture(name=name, scope=scope)
     def fixture():
@@ -31,7 +35,9 @@ def docker_helper_fixture(name='docker_helper', scope='module', **kwargs):
         if 'PYTEST_XDIST_WORKER' in os.environ:  # pragma: no cover
             namespace = '{}_{}'.format(
                 namespace, os.environ['PYTEST_XDIST_WORKER'])
-        docker_helper = DockerHelper(namespace=namespace, **kwargs)
+        helper_kwargs = dict(kwargs)
+        helper_kwargs.setdefault('instrument_api', durations.enabled())
+        docker_helper = DockerHelper(namespace=namespace, **helper_kwargs)
         yield docker_helper
         docker_helper.teardown()
     return fixture
@@ -76,6 +82,11 @@ def resource_fixture(definition, name, scope='function', dependencies=()):
         on. These fixtures will be requested from pytest and so will be setup,
         but nothing is done with the actual fixture values.
 
+    If the definition has a :class:`~seaworthy.budgets.Budget`, its resource
+    usage is sampled while the fixture is in use, and the fixture fails at
+    teardown with :exc:`~seaworthy.budgets.BudgetExceeded` if the container
+    is over budget.
+
     :returns: The fixture function.
     """
     @pytest.fixture(name=name, scope=scope)
@@ -83,9 +94,18 @@ def resource_fixture(definition, name, scope='function', dependencies=()):
         for dependency in dependencies:
             request.getfixturevalue(dependency)
 
-        definition.setup(helper=docker_helper)
+        with durations.fixture_scope(name):
+            definition.setup(helper=docker_helper)
+        monitor = None
+        if getattr(definition, 'budget', None) is not None:
+            monitor = budgets.BudgetMonitor(definition).start()
         yield definition
-        definition.teardown()
+        try:
+            if monitor is not None:
+                monitor.check()
+        finally:
+            with durations.fixture_scope(name):
+                definition.teardown()
 
     return fixture
 
@@ -118,7 +138,9 @@ def _clean_container_fixture(name, raw_name):
     def clean_fixture(request):
         container = request.getfixturevalue(raw_name)
         if 'clean_{}'.format(name) in request.keywords:
-            container.clean()
+            with tracing.span('clean {}'.format(container.name), 'clean'):
+                container.clean()
+            container._emit(events.CLEAN)
         return container
 
     return clean_fixture
@@ -198,5 +220,59 @@ def _definition_clean_fixtures(self, name, scope='function', dependencies=()):
 ContainerDefinition.pytest_clean_fixtures = _definition_clean_fixtures
 
 
-__all__ = ['clean_container_fixtures', 'docker_helper',
-           'docker_helper_fixture', 'image_fetch_fixture', 'resource_fixture']
+def container_pool_fixtures(pool, name, scope='module', timeout=60):
+    """
+    Creates fixtures for a :class:`~seaworthy.pool.ContainerPool`. The pool is
+    set up and filled once for the given scope, and each test that uses the
+    fixture leases a container from the pool and returns it afterwards.
+
+    .. note:: This function returns two fixture functions. It is important to
+        keep references to the returned functions within the scope of the tests
+        that use the fixtures.
+
+    .. code-block:: python
+
+        f1, f2 = container_pool_fixtures(
+            ContainerPool(PostgreSQLContainer(), size=2), 'postgresql')
+
+        def test_database(postgresql):
+            \"""
+            Test something with a clean PostgreSQL container from the pool.
+            \"""
+
+    :param pool: A :class:`~seaworthy.pool.ContainerPool`.
+    :param name:
+        The fixture name. The pool itself is available as a fixture called
+        ``pool_<name>``.
+    :param scope: The scope of the pool fixture.
+    :param timeout:
+        The number of seconds a test waits for a container from the pool
+        before it fails.
+
+    :returns:
+        A tuple of two fixture functions.
+    """
+    pool_name = 'pool_{}'.format(name)
+
+    @pytest.fixture(name=pool_name, scope=scope)
+    def pool_fixture(docker_helper):
+        # Fill the pool inside the scope, so that the setups made on its
+        # worker threads are charged to this fixture.
+        with durations.fixture_scope(pool_name):
+            pool.setup(helper=docker_helper, wait=True)
+        yield pool
+        with durations.fixture_scope(pool_name):
+            pool.teardown()
+
+    @pytest.fixture(name=name)
+    def lease_fixture(request):
+        leased = request.getfixturevalue(pool_name).lease(timeout=timeout)
+        with leased as container:
+            yield container
+
+    return pool_fixture, lease_fixture
+
+
+__all__ = ['clean_container_fixtures', 'container_pool_fixtures',
+           'docker_helper', 'docker_helper_fixture', 'image_fetch_fixture',
+           'resource_fixture']
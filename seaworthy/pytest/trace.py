@@ -0,0 +1,64 @@
+"""
+Write a timeline of the container lifecycle spans recorded during a pytest
+run (see :mod:`seaworthy.tracing`) to a trace file, enabled with
+``--seaworthy-trace=PATH``.
+
+With pytest-xdist, each worker records its own spans and sends them to the
+controller when it finishes, and the controller writes a single file with a
+process per worker.
+"""
+
+import pytest
+
+from seaworthy import tracing
+
+
+_WORKEROUTPUT_KEY = 'seaworthy_trace'
+
+
+def _is_worker(config):
+    return hasattr(config, 'workerinput')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('seaworthy')
+    group.addoption(
+        '--seaworthy-trace', default=None, metavar='PATH',
+        help='write a Chrome trace (Trace Event JSON) of the container '
+             'lifecycle to PATH.')
+
+
+def pytest_configure(config):
+    if config.getoption('seaworthy_trace') is None:
+        return
+    # Workers are named after their xdist worker ID by default.
+    process_name = None if _is_worker(config) else 'pytest'
+    config._seaworthy_trace = tracing.start_tracing(process_name)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session):
+    # This runs after session-scoped fixtures have been torn down, but before
+    # an xdist worker reports that it has finished.
+    config = session.config
+    recorder = getattr(config, '_seaworthy_trace', None)
+    if recorder is not None and _is_worker(config):
+        config.workeroutput[_WORKEROUTPUT_KEY] = recorder.events()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    recorder = getattr(node.config, '_seaworthy_trace', None)
+    events = getattr(node, 'workeroutput', {}).get(_WORKEROUTPUT_KEY)
+    if recorder is not None and events:
+        recorder.extend(events)
+
+
+def pytest_unconfigure(config):
+    recorder = getattr(config, '_seaworthy_trace', None)
+    if recorder is None:
+        return
+    tracing.stop_tracing()
+    del config._seaworthy_trace
+    if not _is_worker(config):
+        recorder.write(config.getoption('seaworthy_trace'))
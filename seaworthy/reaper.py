@@ -0,0 +1,284 @@
+"""
+Find and remove Docker resources that were left behind by test runs that never
+got to tear down, for example because the test process was killed.
+
+Resources are found by the labels that the helpers in
+:mod:`seaworthy.helpers` add to everything they create. A resource is only
+considered orphaned if it is old enough and the process that created it is no
+longer running. Reusable containers are only considered orphaned once they have
+expired.
+
+This functionality is also available as the ``seaworthy-reap`` command.
+"""
+
+import argparse
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import attr
+
+import docker
+
+from seaworthy.helpers import (
+    LABEL_HOST, LABEL_NAMESPACE, LABEL_PID, LABEL_REUSE_HASH, _label_filter,
+    reuse_expired)
+from seaworthy.utils import parse_rfc3339_nano
+
+
+log = logging.getLogger(__name__)
+
+#: Resources younger than this many seconds are never reaped by default.
+DEFAULT_MIN_AGE = 60.0
+#: The default number of resources that are removed concurrently.
+DEFAULT_WORKERS = 8
+
+
+def _parse_timestamp(value):
+    """
+    Parse a Docker creation time into seconds since the epoch. Containers use
+    integer timestamps, networks and volumes use RFC 3339 strings (with
+    nanosecond precision, which we throw away).
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(parse_rfc3339_nano(value) // 10**9)
+
+
+def _created_at(kind, resource):
+    attrs = resource.attrs
+    if kind == 'volume':
+        return _parse_timestamp(attrs['CreatedAt'])
+    return _parse_timestamp(attrs['Created'])
+
+
+def _labels(resource):
+    # Sparse containers have their labels at the top level, not in 'Config'
+    return resource.attrs.get('Labels') or {}
+
+
+def owner_alive(labels):
+    """
+    Check whether the process that created a resource may still be running.
+
+    We can only tell if the resource was created on this host. Resources from
+    other hosts, or without process labels, are assumed to be in use.
+
+    :param labels: The labels of the resource.
+    :returns: bool
+    """
+    if labels.get(LABEL_HOST) != socket.gethostname():
+        return True
+
+    try:
+        pid = int(labels[LABEL_PID])
+    except (KeyError, ValueError):
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to someone else
+        return True
+    return True
+
+
+@attr.s
+class ReapSummary:
+    """
+    The resources that were (or, for a dry run, would have been) reclaimed by
+    :func:`reap`.
+    """
+
+    containers = attr.ib(default=attr.Factory(list))
+    networks = attr.ib(default=attr.Factory(list))
+    volumes = attr.ib(default=attr.Factory(list))
+    failed = attr.ib(default=attr.Factory(list))
+    dry_run = attr.ib(default=False)
+
+    def total(self):
+        """
+        Return the number of resources reclaimed.
+        """
+        return len(self.containers) + len(self.networks) + len(self.volumes)
+
+    def describe(self):
+        """
+        Describe the reclaimed resources in a human-readable way.
+        """
+        verb = 'Would reclaim' if self.dry_run else 'Reclaimed'
+        lines = ['{} {} containers, {} networks, {} volumes'.format(
+            verb, len(self.containers), len(self.networks),
+            len(self.volumes))]
+        for kind in ['containers', 'networks', 'volumes']:
+            for name in getattr(self, kind):
+                lines.append('  {} {}'.format(kind[:-1], name))
+        if self.failed:
+            lines.append('Failed to remove {} resources:'.format(
+                len(self.failed)))
+            for name in self.failed:
+                lines.append('  {}'.format(name))
+        return '\n'.join(lines)
+
+
+def _list_labelled(client, kind, namespace):
+    if namespace is None:
+        filters = _label_filter(LABEL_NAMESPACE)
+    else:
+        filters = _label_filter(LABEL_NAMESPACE, namespace)
+
+    if kind == 'container':
+        containers = client.containers.list(
+            all=True, sparse=True, filters=filters)
+        for container in containers:
+            container.attrs.setdefault('Name', container.attrs['Names'][0])
+        return containers
+    if kind == 'network':
+        return client.networks.list(filters=filters)
+    return client.volumes.list(filters=filters)
+
+
+def find_orphans(client, namespace=None, min_age=DEFAULT_MIN_AGE,
+                 check_owner=True):
+    """
+    Find resources created by Seaworthy helpers that appear to be orphaned.
+
+    :param client: The Docker client to use.
+    :param namespace:
+        Only consider resources created by helpers with this namespace. If
+        ``None``, resources from any namespace are considered.
+    :param min_age:
+        Only consider resources that were created at least this many seconds
+        ago.
+    :param check_owner:
+        Whether to skip resources whose creating process may still be running.
+        See :func:`owner_alive`.
+    :returns:
+        A dict mapping resource kinds (``'container'``, ``'network'``,
+        ``'volume'``) to lists of model objects.
+    """
+    now = time.time()
+    orphans = {}
+    for kind in ['container', 'network', 'volume']:
+        orphans[kind] = []
+        for resource in _list_labelled(client, kind, namespace):
+            if now - _created_at(kind, resource) < min_age:
+                continue
+            labels = _labels(resource)
+            if LABEL_REUSE_HASH in labels and not reuse_expired(labels, now):
+                continue
+            if check_owner and owner_alive(labels):
+                continue
+            orphans[kind].append(resource)
+    return orphans
+
+
+def _remove(kind, resource):
+    if kind == 'container':
+        resource.remove(force=True, v=True)
+    else:
+        resource.remove()
+
+
+def reap(client=None, namespace=None, min_age=DEFAULT_MIN_AGE,
+         check_owner=True, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Remove orphaned resources created by Seaworthy helpers.
+
+    Containers are removed first, in parallel batches of up to ``workers``
+    resources, and then networks and volumes are removed in the same way.
+    Resources that can't be removed are logged and skipped.
+
+    :param client:
+        The Docker client to use. If ``None``, a client is created from the
+        environment.
+    :param namespace: See :func:`find_orphans`.
+    :param min_age: See :func:`find_orphans`.
+    :param check_owner: See :func:`find_orphans`.
+    :param workers: The number of resources to remove concurrently.
+    :param dry_run: If ``True``, find the resources but don't remove them.
+    :returns: A :class:`ReapSummary`.
+    """
+    own_client = client is None
+    if own_client:
+        client = docker.client.from_env()
+
+    try:
+        orphans = find_orphans(client, namespace, min_age, check_owner)
+        summary = ReapSummary(dry_run=dry_run)
+        if dry_run:
+            for kind, resources in orphans.items():
+                getattr(summary, kind + 's').extend(r.name for r in resources)
+            return summary
+
+        def remove(kind_resource):
+            kind, resource = kind_resource
+            try:
+                _remove(kind, resource)
+            except docker.errors.NotFound:
+                # Someone else got there first
+                return
+            except docker.errors.APIError as e:
+                log.warning("Failed to remove {} '{}': {}".format(
+                    kind, resource.name, e))
+                summary.failed.append(resource.name)
+                return
+            log.info("Removed {} '{}'".format(kind, resource.name))
+            getattr(summary, kind + 's').append(resource.name)
+
+        stages = [['container'], ['network', 'volume']]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for stage in stages:
+                batch = [(kind, r) for kind in stage for r in orphans[kind]]
+                list(executor.map(remove, batch))
+        return summary
+    finally:
+        if own_client:
+            client.api.close()
+
+
+def main(argv=None):
+    """
+    Entry point for the ``seaworthy-reap`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog='seaworthy-reap',
+        description='Remove Docker resources left behind by Seaworthy test '
+                    'runs that never tore down.')
+    parser.add_argument(
+        '--namespace', help='Only reap resources from this helper namespace.')
+    parser.add_argument(
+        '--min-age', type=float, default=DEFAULT_MIN_AGE, metavar='SECONDS',
+        help='Only reap resources at least this old (default: %(default)s).')
+    parser.add_argument(
+        '--no-owner-check', dest='check_owner', action='store_false',
+        help="Reap resources even if the process that created them may still "
+             "be running, or was on another host.")
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS,
+        help='Number of resources to remove concurrently '
+             '(default: %(default)s).')
+    parser.add_argument(
+        '--dry-run', action='store_true',
+        help="List the resources that would be reaped but don't remove them.")
+    parser.add_argument(
+        '-v', '--verbose', action='store_true', help='Log each removal.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(message)s')
+
+    summary = reap(
+        namespace=args.namespace, min_age=args.min_age,
+        check_owner=args.check_owner, workers=args.workers,
+        dry_run=args.dry_run)
+    print(summary.describe())
+    return 1 if summary.failed else 0
+
+
+__all__ = ['find_orphans', 'main', 'owner_alive', 'reap', 'ReapSummary']
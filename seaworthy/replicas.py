@@ -0,0 +1,202 @@
+"""
+Run several identical containers from one definition, for testing things that
+scale horizontally.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from seaworthy.definitions import (
+    ContainerDefinition, _ContainerHelperMixin, deep_merge)
+
+
+log = logging.getLogger(__name__)
+
+
+class ReplicaSet(_ContainerHelperMixin):
+    """
+    A set of replicas of a single :class:`.ContainerDefinition`.
+
+    Each replica is set up from a copy of the definition (see
+    :meth:`.ContainerDefinition.clone`) with a unique name like
+    ``<name>_replica0``. Replicas are set up and torn down concurrently. Every
+    replica has the definition's name as an extra network alias, so other
+    containers on the network can look up the definition's name and get the
+    addresses of all the replicas (DNS round-robin)::
+
+        web = ReplicaSet(WebContainer('web'), replicas=3)
+        with web.setup(helper=docker_helper):
+            for host, port in web.host_ports():
+                ...
+            web.scale(5)
+
+    A replica set has ``setup(helper)`` and ``teardown()`` methods, so it can
+    be used with :func:`~seaworthy.pytest.fixtures.resource_fixture` like any
+    other definition.
+    """
+
+    def __init__(self, definition, replicas=2, helper=None):
+        """
+        :param ~seaworthy.definitions.ContainerDefinition definition:
+            The definition to create replicas of.
+        :param replicas: The number of replicas to set up.
+        :param helper:
+            The helper to set the replicas up with. This can also be set
+            later using :meth:`set_helper` or :meth:`setup`.
+        """
+        if not isinstance(definition, ContainerDefinition):
+            raise TypeError(
+                'ReplicaSet requires a ContainerDefinition, got {}'.format(
+                    type(definition)))
+        if replicas < 0:
+            raise ValueError('Number of replicas must not be negative.')
+
+        self.definition = definition
+        #: The number of replicas set up by :meth:`setup`, updated by
+        #: :meth:`scale`.
+        self.replicas = replicas
+
+        self._helper = None
+        self.set_helper(helper)
+
+        self._lock = threading.Lock()
+        self._replicas = []
+        self._next_index = 0
+
+    @property
+    def name(self):
+        return self.definition.name
+
+    @property
+    def created(self):
+        return bool(self._replicas)
+
+    def __iter__(self):
+        return iter(list(self._replicas))
+
+    def __len__(self):
+        return len(self._replicas)
+
+    def __getitem__(self, index):
+        return self._replicas[index]
+
+    def setup(self, helper=None):
+        """
+        Set up the replicas that aren't set up yet. If any of them fail to
+        set up, the ones that were set up by this call are torn down again
+        and the error is raised.
+
+        :param helper:
+            The helper to use, if one was not provided when this replica set
+            was created.
+        :returns: This replica set.
+        """
+        self.set_helper(helper)
+        if self._helper is None:
+            raise RuntimeError('No helper set.')
+        self._scale_to(self.replicas)
+        return self
+
+    def teardown(self):
+        """
+        Tear down every replica. A later :meth:`setup` sets up
+        :attr:`replicas` replicas again.
+        """
+        self._scale_to(0)
+
+    def __enter__(self):
+        return self.setup()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.teardown()
+
+    def scale(self, replicas):
+        """
+        Set up or tear down replicas until there are the given number of
+        them. New replicas are set up concurrently, and the newest replicas
+        are torn down first. If any new replica fails to set up, the new
+        replicas are torn down again and the error is raised.
+
+        :param replicas: The number of replicas to scale to.
+        """
+        if replicas < 0:
+            raise ValueError('Number of replicas must not be negative.')
+        self.replicas = replicas
+        self._scale_to(replicas)
+
+    def _scale_to(self, replicas):
+        with self._lock:
+            current = len(self._replicas)
+            if replicas > current:
+                log.debug("Replica set '{}': scaling up from {} to {}".format(
+                    self.name, current, replicas))
+                added = [self._new_replica()
+                         for _ in range(replicas - current)]
+                error = self._run_all(
+                    lambda r: r.setup(helper=self.helper), added)
+                if error is not None:
+                    self._run_all(lambda r: r.teardown(), added)
+                    raise error
+                self._replicas.extend(added)
+            elif replicas < current:
+                log.debug(
+                    "Replica set '{}': scaling down from {} to {}".format(
+                        self.name, current, replicas))
+                removed = self._replicas[replicas:]
+                del self._replicas[replicas:]
+                error = self._run_all(lambda r: r.teardown(), removed)
+                if error is not None:
+                    raise error
+
+    def _new_replica(self):
+        index = self._next_index
+        self._next_index += 1
+        replica = self.definition.clone(
+            '{}_replica{}'.format(self.name, index))
+        aliases = list(replica._create_kwargs.get('network_aliases', ()))
+        replica._create_kwargs = deep_merge(
+            replica._create_kwargs,
+            {'network_aliases': aliases + [self.name]})
+        return replica
+
+    def _run_all(self, func, replicas):
+        """
+        Call ``func`` on every replica concurrently and wait for all the
+        calls to finish.
+
+        :returns: The first error raised, or ``None``.
+        """
+        if not replicas:
+            return None
+        with ThreadPoolExecutor(max_workers=len(replicas)) as executor:
+            futures = [(r, executor.submit(func, r)) for r in replicas]
+        error = None
+        for replica, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                log.error("Replica set '{}': '{}' failed: {}".format(
+                    self.name, replica.name, e))
+                if error is None:
+                    error = e
+        return error
+
+    def host_ports(self, container_port=None, proto='tcp'):
+        """
+        Get the host address that each replica publishes a port on, for
+        spreading load across the replicas from outside Docker.
+
+        :param container_port:
+            The container port. If ``None``, each replica's first published
+            port is used (see
+            :meth:`.ContainerDefinition.get_first_host_port`).
+        :param proto: The protocol ('tcp' or 'udp').
+        :returns: A list of ``(host, port)`` tuples, one for each replica.
+        """
+        if container_port is None:
+            return [r.get_first_host_port() for r in self]
+        return [r.get_host_port(container_port, proto) for r in self]
+
+
+__all__ = ['ReplicaSet']
@@ -0,0 +1,275 @@
+"""
+Set up a group of resource definitions that depend on each other, as quickly
+as their dependencies allow.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import attr
+
+
+log = logging.getLogger(__name__)
+
+
+@attr.s
+class CriticalPath:
+    """
+    The chain of dependent definitions that took the longest to set up, and
+    therefore gated the readiness of the whole stack.
+    """
+
+    #: The names of the definitions on the path, dependencies first.
+    names = attr.ib()
+    #: The total setup time in seconds of the definitions on the path.
+    seconds = attr.ib()
+
+
+class StackDefinition:
+    """
+    A group of resource definitions with dependencies between them.
+
+    The dependencies form a directed acyclic graph, which is split into
+    "waves": the first wave holds the definitions without dependencies, and
+    each later wave holds the definitions whose dependencies are all in
+    earlier waves. Every definition in a wave is set up concurrently, and the
+    next wave starts once the whole wave is ready. Teardown happens in reverse
+    wave order, also concurrently within each wave::
+
+        stack = StackDefinition()
+        db = stack.add(PostgreSQLContainer())
+        cache = stack.add(RedisContainer())
+        app = stack.add(AppContainer(db, cache), depends_on=[db, cache])
+        stack.add(NginxContainer(app), depends_on=[app])
+
+        with stack.setup(helper=docker_helper):
+            ...
+
+    After setup, :attr:`setup_seconds` holds the time each definition took,
+    and :meth:`critical_path` reports which chain of definitions gated
+    readiness.
+
+    A stack has ``setup(helper)`` and ``teardown()`` methods, so it can be
+    used with :func:`~seaworthy.pytest.fixtures.resource_fixture` like any
+    other definition.
+    """
+
+    def __init__(self, name='stack', workers=None, helper=None):
+        """
+        :param name: The name of the stack, for logging.
+        :param workers:
+            The maximum number of definitions to set up or tear down at once.
+            If ``None``, a whole wave is handled at once.
+        :param helper:
+            The helper to set the definitions up with. This can also be passed
+            to :meth:`setup`.
+        """
+        self.name = name
+        self.workers = workers
+        self._helper = helper
+        self._definitions = []
+        self._dependencies = {}
+        self._set_up = []
+        #: A dict mapping definition names to their setup time in seconds.
+        self.setup_seconds = {}
+
+    def add(self, definition, depends_on=()):
+        """
+        Add a definition to the stack.
+
+        :param definition: The resource definition.
+        :param depends_on:
+            The definitions (or their names) that must be set up before this
+            one. They must already have been added to the stack.
+        :returns: The definition, for convenience.
+        """
+        if definition.name in self._dependencies:
+            raise ValueError(
+                "Stack already has a definition named '{}'".format(
+                    definition.name))
+
+        dependencies = []
+        for dependency in depends_on:
+            name = getattr(dependency, 'name', dependency)
+            if name not in self._dependencies:
+                raise ValueError(
+                    "Unknown dependency '{}' for '{}'".format(
+                        name, definition.name))
+            dependencies.append(name)
+
+        self._definitions.append(definition)
+        self._dependencies[definition.name] = dependencies
+        return definition
+
+    def __getitem__(self, name):
+        for definition in self._definitions:
+            if definition.name == name:
+                return definition
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self._definitions)
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def dependencies(self, name):
+        """
+        Get the names of the direct dependencies of a definition.
+        """
+        return list(self._dependencies[name])
+
+    def waves(self):
+        """
+        Split the definitions into waves that can each be set up
+        concurrently, in setup order.
+
+        :returns: A list of lists of definitions.
+        """
+        # Dependencies must be added first, so the graph can't have cycles.
+        level = {}
+        for definition in self._definitions:
+            deps = self._dependencies[definition.name]
+            level[definition.name] = 1 + max(
+                (level[dep] for dep in deps), default=-1)
+
+        waves = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for definition in self._definitions:
+            waves[level[definition.name]].append(definition)
+        return waves
+
+    @property
+    def created(self):
+        return bool(self._set_up)
+
+    def _run_wave(self, executor, func, wave):
+        """
+        Call ``func`` on every definition in the wave concurrently. If any of
+        the calls fail, wait for the rest and raise the first error.
+
+        :returns: A list of ``(definition, seconds)`` for the calls that
+            succeeded.
+        """
+        def timed(definition):
+            start = time.monotonic()
+            func(definition)
+            return time.monotonic() - start
+
+        futures = [(d, executor.submit(timed, d)) for d in wave]
+        done = []
+        error = None
+        for definition, future in futures:
+            try:
+                done.append((definition, future.result()))
+            except Exception as e:
+                log.error("Stack '{}': '{}' failed: {}".format(
+                    self.name, definition.name, e))
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+        return done
+
+    def _executor(self, wave_size):
+        workers = self.workers or max(wave_size, 1)
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def setup(self, helper=None):
+        """
+        Set up every definition in the stack, wave by wave. If a definition
+        fails to set up, everything that was set up is torn down again and the
+        error is raised.
+
+        :param helper:
+            The helper to use, if one was not provided when this stack was
+            created.
+        :returns: This stack.
+        """
+        if helper is not None:
+            self._helper = helper
+        if self._helper is None:
+            raise RuntimeError('No helper set.')
+
+        waves = self.waves()
+        self.setup_seconds = {}
+        with self._executor(max(map(len, waves), default=1)) as executor:
+            for index, wave in enumerate(waves):
+                log.debug("Stack '{}': setting up wave {}: {}".format(
+                    self.name, index, ', '.join(d.name for d in wave)))
+
+                def setup(definition):
+                    definition.setup(helper=self._helper)
+                    self._set_up.append(definition)
+
+                try:
+                    done = self._run_wave(executor, setup, wave)
+                except Exception:
+                    self.teardown()
+                    raise
+                for definition, seconds in done:
+                    self.setup_seconds[definition.name] = seconds
+
+        path = self.critical_path()
+        log.info("Stack '{}' ready; critical path {} ({:.3f}s)".format(
+            self.name, ' -> '.join(path.names), path.seconds))
+        return self
+
+    def teardown(self):
+        """
+        Tear down every definition that was set up, in reverse wave order.
+        Errors are logged, and the first one is raised once everything else
+        has been torn down.
+        """
+        waves = [
+            [d for d in wave if d in self._set_up]
+            for wave in reversed(self.waves())]
+        error = None
+        with self._executor(max(map(len, waves), default=1)) as executor:
+            for wave in waves:
+                try:
+                    self._run_wave(executor, lambda d: d.teardown(), wave)
+                except Exception as e:
+                    if error is None:
+                        error = e
+        self._set_up = []
+        if error is not None:
+            raise error
+
+    def critical_path(self):
+        """
+        Find the chain of dependencies with the largest total setup time. This
+        is the chain that gates the readiness of the whole stack, so it is
+        the place to look when the stack is slow to set up.
+
+        :returns: A :class:`CriticalPath`. Definitions that haven't been set
+            up count as taking no time.
+        """
+        finish = {}
+        previous = {}
+        for definition in self._definitions:
+            name = definition.name
+            deps = self._dependencies[name]
+            slowest = max(deps, key=lambda dep: finish[dep], default=None)
+            start = 0.0 if slowest is None else finish[slowest]
+            finish[name] = start + self.setup_seconds.get(name, 0.0)
+            previous[name] = slowest
+
+        if not finish:
+            return CriticalPath([], 0.0)
+        name = max(finish, key=lambda n: finish[n])
+        seconds = finish[name]
+        names = []
+        while name is not None:
+            names.append(name)
+            name = previous[name]
+        return CriticalPath(list(reversed(names)), seconds)
+
+    def __enter__(self):
+        return self.setup()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.teardown()
+
+
+__all__ = ['CriticalPath', 'StackDefinition']
@@ -1,3 +1,4 @@
+from seaworthy import tracing
 from seaworthy.stream._timeout import stream_timeout
 
 
@@ -59,11 +60,14 @@ def wait_for_logs_matching(container, matcher, timeout=10, encoding='utf-8',
         ended without error).
     """
     try:
-        for line in stream_logs(container, timeout=timeout, **logs_kwargs):
-            # Drop the trailing newline
-            line = line.decode(encoding).rstrip()
-            if matcher(line):
-                return line
+        with tracing.span('wait_for_logs_matching', 'wait',
+                          container=container.name, matcher=str(matcher)):
+            for line in stream_logs(
+                    container, timeout=timeout, **logs_kwargs):
+                # Drop the trailing newline
+                line = line.decode(encoding).rstrip()
+                if matcher(line):
+                    return line
     except TimeoutError:
         raise TimeoutError('\n'.join([
             ('Timeout ({}s) waiting for logs matching {}.'.format(
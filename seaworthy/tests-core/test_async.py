@@ -0,0 +1,165 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from seaworthy.checks import docker_client, dockertest
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.helpers import AsyncDockerHelper, fetch_images
+
+IMG = 'nginx:alpine'
+
+
+class SlowContainer(ContainerDefinition):
+    """
+    A container definition that takes a while to set up without talking to
+    Docker.
+    """
+
+    def __init__(self, name, delay=0.3):
+        super().__init__(name, IMG)
+        self.delay = delay
+
+    def setup(self, helper=None, **run_kwargs):
+        self.set_helper(helper)
+        time.sleep(self.delay)
+        self._inner = object()
+        return self
+
+    def teardown(self):
+        time.sleep(self.delay)
+        self._inner = None
+
+    def wait_for_start(self):
+        time.sleep(self.delay)
+
+
+class AsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(self.loop.close)
+
+    def run_loop(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+
+class TestAsyncDockerHelper(AsyncTestCase):
+    def make_helper(self, **kw):
+        helper = AsyncDockerHelper(client=mock.Mock(), **kw)
+        self.addCleanup(helper.executor.shutdown)
+        return helper
+
+    def test_setup_concurrently(self):
+        """
+        Definitions are set up at the same time, in the helper's thread pool.
+        """
+        helper = self.make_helper()
+        definitions = [SlowContainer('c{}'.format(i)) for i in range(4)]
+
+        start = time.monotonic()
+        result = self.run_loop(helper.setup(*definitions))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(result, definitions)
+        self.assertLess(elapsed, 0.3 * 4)
+        for definition in definitions:
+            self.assertTrue(definition.created)
+            self.assertIs(definition.helper, helper.containers)
+            self.assertIs(definition._executor, helper.executor)
+
+    def test_workers(self):
+        """
+        The number of workers limits how many definitions are set up at once.
+        """
+        helper = self.make_helper(workers=1)
+        definitions = [SlowContainer('c{}'.format(i), 0.1) for i in range(3)]
+
+        start = time.monotonic()
+        self.run_loop(helper.setup(*definitions))
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def test_run(self):
+        """
+        Blocking functions can be run in the helper's thread pool.
+        """
+        helper = self.make_helper()
+        self.assertEqual(self.run_loop(helper.run(sum, [1, 2], start=3)), 6)
+
+    def test_teardown(self):
+        """
+        Teardown tears down the underlying helper and shuts down the thread
+        pool.
+        """
+        helper = self.make_helper()
+        helper.helper.teardown = mock.Mock(return_value=['timing'])
+
+        self.assertIs(self.run_loop(helper.__aenter__()), helper)
+        self.assertEqual(
+            self.run_loop(helper.__aexit__(None, None, None)), ['timing'])
+        with self.assertRaises(RuntimeError):
+            helper.executor.submit(print)
+
+
+class TestDefinitionAsync(AsyncTestCase):
+    def test_lifecycle(self):
+        """
+        Definitions have async versions of setup, teardown and
+        wait_for_start, which use the default executor for plain helpers.
+        """
+        definition = SlowContainer('slow', delay=0)
+        helper = object()
+
+        result = self.run_loop(definition.setup_async(helper=helper))
+        self.assertIs(result, definition)
+        self.assertIs(definition.helper, helper)
+        self.assertIsNone(definition._executor)
+        self.assertTrue(definition.created)
+
+        self.run_loop(definition.wait_for_start_async())
+        self.run_loop(definition.teardown_async())
+        self.assertFalse(definition.created)
+
+    def test_overlap(self):
+        """
+        Several definitions can wait for start at the same time.
+        """
+        definitions = [SlowContainer('c{}'.format(i)) for i in range(3)]
+        start = time.monotonic()
+        self.run_loop(asyncio.gather(
+            *[d.wait_for_start_async() for d in definitions]))
+        self.assertLess(time.monotonic() - start, 0.3 * 3)
+
+
+@dockertest()
+class TestAsyncDockerHelperWithDocker(AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        with docker_client() as client:
+            fetch_images(client, [IMG])
+
+    def test_setup_teardown(self):
+        """
+        We can set up and tear down real containers concurrently.
+        """
+        helper = AsyncDockerHelper()
+        definitions = [
+            ContainerDefinition(
+                'async{}'.format(i), IMG,
+                wait_patterns=[r'start worker process'])
+            for i in range(3)
+        ]
+        try:
+            self.run_loop(helper.setup(*definitions))
+            for definition in definitions:
+                self.assertEqual(definition.status(), 'running')
+
+            self.run_loop(asyncio.gather(
+                *[d.teardown_async() for d in definitions]))
+            for definition in definitions:
+                self.assertFalse(definition.created)
+        finally:
+            timings = self.run_loop(helper.teardown())
+        # Only the default network was left for the helper to remove.
+        self.assertEqual([t.name for t in timings], ['test_default'])
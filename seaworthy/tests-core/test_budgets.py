@@ -0,0 +1,151 @@
+import unittest
+from unittest import mock
+
+from seaworthy.budgets import (
+    Budget, BudgetExceeded, BudgetMonitor, BudgetViolation, measure)
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.timing import LifecycleTiming, PhaseTiming
+from seaworthy.usage import FIELDS, UsageSeries
+
+MIB = 1024 * 1024
+
+
+def make_container(**kwargs):
+    container = ContainerDefinition('fake', 'fake:latest', **kwargs)
+    container.set_helper(mock.Mock())
+    return container
+
+
+def memory_source(*memory):
+    """
+    A resource usage source that returns canned memory usage.
+    """
+    memory = list(memory)
+
+    def source(inner):
+        sample = dict.fromkeys(FIELDS, 0)
+        sample['memory_bytes'] = memory.pop(0) if memory else 0
+        sample['cpu_seconds'] = 0.5
+        return sample
+    return source
+
+
+class TestBudget(unittest.TestCase):
+    def test_violations(self):
+        """
+        Only the limits that are set are checked. Limits that can't be
+        measured count as violations.
+        """
+        budget = Budget(startup_seconds=2.0, max_rss_bytes=MIB)
+        self.assertEqual(budget.limits(),
+                         {'startup_seconds': 2.0, 'max_rss_bytes': MIB})
+        self.assertEqual(budget.violations({
+            'startup_seconds': 2.0, 'max_rss_bytes': MIB,
+            'max_cpu_seconds': 100}), [])
+        self.assertEqual(budget.violations({'startup_seconds': 3.0}), [
+            BudgetViolation('max_rss_bytes', None, MIB),
+            BudgetViolation('startup_seconds', 3.0, 2.0),
+        ])
+        self.assertEqual(Budget().violations({}), [])
+
+    def test_message(self):
+        """
+        The error includes the measured values and the budget.
+        """
+        with self.assertRaises(BudgetExceeded) as cm:
+            Budget(startup_seconds=2.0, max_rss_bytes=MIB).check(
+                'web', {'startup_seconds': 3.25})
+        self.assertEqual(str(cm.exception), '\n'.join([
+            'web is over budget:',
+            '  max_rss_bytes: not measured (budget 1048576 bytes (1.0 MiB))',
+            '  startup_seconds: measured 3.250s, budget 2.000s',
+        ]))
+        self.assertEqual(len(cm.exception.violations), 2)
+
+
+class TestMeasure(unittest.TestCase):
+    def test_measure(self):
+        """
+        The startup time comes from the latest setup, and memory and CPU
+        usage from the series, or from a sample if there isn't one.
+        """
+        container = make_container()
+        self.assertEqual(measure(container), {})
+
+        container.setup()
+        self.addCleanup(container.teardown)
+        # The sample is taken without starting a background sampler.
+        container.sample_resources = mock.Mock()
+        measurements = measure(container, source=memory_source(3 * MIB))
+        container.sample_resources.assert_not_called()
+        self.assertEqual(
+            measurements['startup_seconds'],
+            container.timings['setup'].seconds)
+        self.assertEqual(measurements['max_rss_bytes'], 3 * MIB)
+        self.assertEqual(measurements['max_cpu_seconds'], 0.5)
+
+        series = UsageSeries()
+        for value in [MIB, 5 * MIB, 2 * MIB]:
+            series.append(0, dict.fromkeys(FIELDS, value))
+        measurements = measure(container, series)
+        self.assertEqual(measurements['max_rss_bytes'], 5 * MIB)
+        self.assertEqual(measurements['max_cpu_seconds'], 5 * MIB)
+
+    def test_startup_without_fetch(self):
+        """
+        Time spent pulling the image doesn't count towards the startup time.
+        """
+        container = make_container()
+        container.timings['setup'] = LifecycleTiming(
+            'fake', 'setup', 0.0, 12.5, phases=[
+                PhaseTiming('fetch_image', 0.0, 10.0),
+                PhaseTiming('create', 10.0, 0.5),
+                PhaseTiming('wait_for_start', 10.5, 2.0),
+            ])
+        self.assertEqual(
+            measure(container, UsageSeries()), {'startup_seconds': 2.5})
+
+
+class TestBudgetMonitor(unittest.TestCase):
+    def test_no_budget(self):
+        """
+        A monitor needs a budget, either given or from the definition.
+        """
+        with self.assertRaises(ValueError) as cm:
+            BudgetMonitor(make_container())
+        self.assertEqual(
+            str(cm.exception), 'No budget given and fake has none.')
+
+    def test_peak_memory(self):
+        """
+        The monitor samples until it is stopped, and checks the peak memory
+        usage against the budget.
+        """
+        container = make_container(budget=Budget(max_rss_bytes=2 * MIB))
+        self.assertEqual(container.clone('other').budget, container.budget)
+        container.setup()
+        self.addCleanup(container.teardown)
+
+        monitor = BudgetMonitor(
+            container, interval=0.001,
+            source=memory_source(MIB, 4 * MIB)).start()
+        with self.assertRaises(BudgetExceeded) as cm:
+            monitor.check()
+        self.assertEqual(
+            cm.exception.violations,
+            [BudgetViolation('max_rss_bytes', 4 * MIB, 2 * MIB)])
+        self.assertFalse(any(s.running for s in container._samplers))
+
+    def test_startup_only(self):
+        """
+        A budget with only a startup time doesn't need samples.
+        """
+        container = make_container(budget=Budget(startup_seconds=60))
+        container.sample_resources = mock.Mock()
+        container.setup()
+        self.addCleanup(container.teardown)
+
+        monitor = BudgetMonitor(container).start()
+        monitor.check()
+        self.assertEqual(list(monitor.stop()), ['startup_seconds'])
+        container.sample_resources.assert_not_called()
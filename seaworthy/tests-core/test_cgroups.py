@@ -0,0 +1,217 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from seaworthy.cgroups import (
+    CgroupLocation, CgroupStatsReader, find_cgroup, parse_proc_cgroup,
+    read_cgroup_stats)
+
+CONTAINER_ID = 'abc123'
+
+NET_DEV = '''\
+Inter-|   Receive                            |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:    500       5    0    0    0     0          0         0      500       5    0    0    0     0       0          0
+  eth0:   1000      10    0    0    0     0          0         0      200       2    0    0    0     0       0          0
+  eth1:     30       1    0    0    0     0          0         0        4       1    0    0    0     0       0          0
+'''  # noqa: E501
+
+
+def fake_container(pid=None, cgroup_parent=''):
+    container = mock.Mock()
+    container.id = CONTAINER_ID
+    container.name = 'fake'
+    container.attrs = {
+        'Id': CONTAINER_ID,
+        'State': {'Pid': pid or 0},
+        'HostConfig': {'CgroupParent': cgroup_parent},
+    }
+    return container
+
+
+class CgroupTestCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = os.path.join(tmpdir.name, 'cgroup')
+        self.proc = os.path.join(tmpdir.name, 'proc')
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def make_v2(self, cgroup):
+        path = os.path.join(self.root, cgroup)
+        self.write(os.path.join(path, 'cgroup.controllers'), 'cpu io memory')
+        self.write(os.path.join(path, 'memory.current'), '10000\n')
+        self.write(os.path.join(path, 'memory.stat'),
+                   'anon 6000\nfile 4000\ninactive_file 3000\n')
+        self.write(os.path.join(path, 'cpu.stat'),
+                   'usage_usec 2500000\nuser_usec 2000000\n')
+        self.write(os.path.join(path, 'io.stat'), (
+            '8:0 rbytes=100 wbytes=20 rios=1 wios=1 dbytes=0 dios=0\n'
+            '8:16 rbytes=5 wbytes=0 rios=1 wios=0 dbytes=0 dios=0\n'))
+        return path
+
+    def make_v1(self, cgroup, cpu_dir='cpuacct'):
+        memory = os.path.join(self.root, 'memory', cgroup)
+        self.write(os.path.join(memory, 'memory.usage_in_bytes'), '10000\n')
+        self.write(os.path.join(memory, 'memory.stat'),
+                   'cache 4000\ntotal_inactive_file 3000\n')
+        cpuacct = os.path.join(self.root, cpu_dir, cgroup)
+        self.write(os.path.join(cpuacct, 'cpuacct.usage'), '2500000000\n')
+        blkio = os.path.join(self.root, 'blkio', cgroup)
+        self.write(
+            os.path.join(blkio, 'blkio.throttle.io_service_bytes_recursive'),
+            ('8:0 Read 100\n8:0 Write 20\n8:0 Total 120\n8:16 Read 5\n'
+             'Total 125\n'))
+
+    def make_proc(self, pid, cgroup):
+        self.write(os.path.join(self.proc, str(pid), 'cgroup'), cgroup)
+        self.write(os.path.join(self.proc, str(pid), 'net', 'dev'), NET_DEV)
+
+
+class TestFindCgroup(CgroupTestCase):
+    def test_parse_proc_cgroup(self):
+        """
+        Each controller, including co-mounted ones, maps to its directory.
+        Named hierarchies are ignored and cgroup v2 is "unified".
+        """
+        paths = parse_proc_cgroup(
+            '12:memory:/docker/abc\n'
+            '4:cpu,cpuacct:/docker/abc\n'
+            '1:name=systemd:/docker/abc\n'
+            '0::/system.slice/docker-abc.scope\n', '/cg')
+        self.assertEqual(paths, {
+            'memory': '/cg/memory/docker/abc',
+            'cpu': '/cg/cpu,cpuacct/docker/abc',
+            'cpuacct': '/cg/cpu,cpuacct/docker/abc',
+            'unified': '/cg/system.slice/docker-abc.scope',
+        })
+
+    def test_from_process(self):
+        """
+        The cgroup is found from the container's process if it is visible.
+        """
+        self.make_proc(42, '0::/system.slice/docker-abc123.scope\n')
+        location = find_cgroup(
+            fake_container(pid=42).attrs, self.root, self.proc)
+        self.assertEqual(location, CgroupLocation(2, {
+            'unified': os.path.join(
+                self.root, 'system.slice/docker-abc123.scope'),
+        }, 42))
+
+    def test_guessed(self):
+        """
+        If the container's process isn't visible, the cgroup is found in the
+        places Docker's cgroup drivers put it.
+        """
+        attrs = fake_container(pid=42).attrs
+        self.assertIsNone(find_cgroup(attrs, self.root, self.proc))
+
+        path = self.make_v2('system.slice/docker-abc123.scope')
+        self.assertEqual(find_cgroup(attrs, self.root, self.proc),
+                         CgroupLocation(2, {'unified': path}))
+
+        attrs = fake_container(cgroup_parent='/custom').attrs
+        self.make_v1('custom/abc123')
+        location = find_cgroup(attrs, self.root, self.proc)
+        self.assertEqual(location.version, 1)
+        self.assertEqual(location.paths['memory'],
+                         os.path.join(self.root, 'memory/custom/abc123'))
+
+    def test_unrelated_process(self):
+        """
+        With a remote daemon, the container's PID may be an unrelated local
+        process. Its cgroup isn't used, nor are its network counters.
+        """
+        self.make_proc(1, '0::/\n')
+        self.make_v2('')
+        attrs = fake_container(pid=1).attrs
+        self.assertIsNone(find_cgroup(attrs, self.root, self.proc))
+
+        fallback = mock.Mock(return_value={'cpu_seconds': 1.0})
+        reader = CgroupStatsReader(fallback, self.root, self.proc)
+        self.assertEqual(reader(fake_container(pid=1)), {'cpu_seconds': 1.0})
+
+        # The container's own cgroup is still found by its ID.
+        path = self.make_v2('docker/abc123')
+        self.assertEqual(find_cgroup(attrs, self.root, self.proc),
+                         CgroupLocation(2, {'unified': path}))
+
+
+class TestReadCgroupStats(CgroupTestCase):
+    EXPECTED = {
+        'cpu_seconds': 2.5, 'memory_bytes': 7000,
+        'blkio_read_bytes': 105, 'blkio_write_bytes': 20,
+        'net_rx_bytes': 1030, 'net_tx_bytes': 204,
+    }
+
+    def test_v2(self):
+        self.make_v2('docker/abc123')
+        self.make_proc(42, '0::/docker/abc123\n')
+        location = find_cgroup(
+            fake_container(pid=42).attrs, self.root, self.proc)
+        self.assertEqual(
+            read_cgroup_stats(location, self.proc), self.EXPECTED)
+
+    def test_v1(self):
+        self.make_v1('docker/abc123', cpu_dir='cpu,cpuacct')
+        self.make_proc(42, (
+            '12:memory:/docker/abc123\n'
+            '11:blkio:/docker/abc123\n'
+            '4:cpu,cpuacct:/docker/abc123\n'))
+        location = find_cgroup(
+            fake_container(pid=42).attrs, self.root, self.proc)
+        self.assertEqual(
+            read_cgroup_stats(location, self.proc), self.EXPECTED)
+
+    def test_no_network(self):
+        """
+        Without the container's process, network counters are zero.
+        """
+        path = self.make_v2('docker/abc123')
+        stats = read_cgroup_stats(CgroupLocation(2, {'unified': path}))
+        self.assertEqual(
+            (stats['net_rx_bytes'], stats['net_tx_bytes']), (0, 0))
+        self.assertEqual(stats['memory_bytes'], 7000)
+
+
+class TestCgroupStatsReader(CgroupTestCase):
+    def test_reads_cgroup(self):
+        """
+        The cgroup is found once and read for every sample.
+        """
+        path = self.make_v2('docker/abc123')
+        fallback = mock.Mock()
+        reader = CgroupStatsReader(fallback, self.root, self.proc)
+        container = fake_container()
+        self.assertEqual(reader(container)['cpu_seconds'], 2.5)
+
+        self.write(os.path.join(path, 'cpu.stat'), 'usage_usec 3000000\n')
+        self.assertEqual(reader(container)['cpu_seconds'], 3.0)
+        fallback.assert_not_called()
+
+    def test_fallback(self):
+        """
+        If the cgroup can't be found or read, the fallback is used from then
+        on.
+        """
+        fallback = mock.Mock(return_value={'cpu_seconds': 1.0})
+        reader = CgroupStatsReader(fallback, self.root, self.proc)
+        container = fake_container()
+        self.assertEqual(reader(container), {'cpu_seconds': 1.0})
+
+        reader = CgroupStatsReader(fallback, self.root, self.proc)
+        path = self.make_v2('docker/abc123')
+        os.remove(os.path.join(path, 'memory.current'))
+        self.assertEqual(reader(container), {'cpu_seconds': 1.0})
+        self.assertIsNone(reader.location(container))
+        self.assertEqual(fallback.call_count, 2)
+
+    def test_no_fallback(self):
+        reader = CgroupStatsReader(None, self.root, self.proc)
+        with self.assertRaises(FileNotFoundError):
+            reader(fake_container())
@@ -1,11 +1,17 @@
 import time
 import unittest
 from datetime import datetime
+from unittest import mock
 
+import attr
+
+from docker import models
+
+from seaworthy import events, timing
 from seaworthy.checks import docker_client, dockertest
 from seaworthy.definitions import (
     ContainerDefinition, NetworkDefinition, VolumeDefinition)
-from seaworthy.helpers import DockerHelper, fetch_images
+from seaworthy.helpers import ContainerState, DockerHelper, fetch_images
 from seaworthy.stream.matchers import EqualsMatcher
 
 IMG_SCRIPT = 'alpine:latest'
@@ -395,6 +401,70 @@ class TestContainerDefinition(unittest.TestCase, DefinitionTestMixin):
         self.definition.stop()
         self.assertEqual(inner.status, 'exited')
 
+    def test_status_from_state_cache(self):
+        """
+        If the helper tracks container states, reading the status doesn't
+        inspect the container.
+        """
+        helper = DockerHelper(track_state=True, instrument_api=True)
+        self.addCleanup(helper.teardown)
+        definition = ContainerDefinition('tracked', IMG_WAIT, helper=helper)
+        definition.setup()
+        self.addCleanup(definition.teardown)
+
+        inspect = 'GET /containers/{id}/json'
+        before = helper.api_calls.count(endpoint=inspect)
+        for _ in range(10):
+            self.assertEqual(definition.status(), 'running')
+        self.assertEqual(helper.api_calls.count(endpoint=inspect), before)
+        self.assertIsNone(definition.state().exit_code)
+
+    def test_wait_for_healthy(self):
+        """
+        A container that waits until it is healthy is ready as soon as its
+        healthcheck passes, with or without tracked container states.
+        """
+        for track_state in [False, True]:
+            helper = DockerHelper(track_state=track_state)
+            self.addCleanup(helper.teardown)
+            definition = ContainerDefinition(
+                'healthy_{}'.format(track_state).lower(), IMG_WAIT,
+                wait_for_healthy=True, helper=helper,
+                create_kwargs={'healthcheck': {'test': ['CMD', 'true']}})
+            definition.setup()
+            self.addCleanup(definition.teardown)
+            self.assertEqual(definition.state(reload=True).health, 'healthy')
+            self.assertLess(
+                definition.timings['setup'].phase_seconds('wait_for_start'),
+                definition.WAIT_TIMEOUT)
+
+    def test_wait_for_healthy_tracked_start(self):
+        """
+        With tracked container states, a container's health is known while
+        its healthcheck is starting, even if the start event is seen before
+        the container is inspected.
+        """
+        helper = DockerHelper(track_state=True)
+        self.addCleanup(helper.teardown)
+        definition = ContainerDefinition(
+            'slow_health', IMG_WAIT, wait_for_healthy=True, helper=helper,
+            create_kwargs={'healthcheck': {
+                'test': ['CMD', 'sh', '-c', 'sleep 1'],
+                'timeout': 5 * 10**9}})
+        self.addCleanup(definition.teardown)
+        definition.run()
+
+        # The start event is newer than the inspection's StartedAt time, and
+        # can't tell whether the container has a healthcheck.
+        states = helper.containers.states
+        states.wait_for(
+            definition.inner().id,
+            lambda s: s is not None and s.status == 'running', 5)
+        definition.state(reload=True)
+        self.assertEqual(definition.state().health, 'starting')
+        definition.wait_until_healthy()
+        self.assertEqual(definition.state().health, 'healthy')
+
     def test_wait_timeout_default(self):
         """
         When wait_timeout isn't passed to the constructor, the default timeout
@@ -749,6 +819,382 @@ class TestContainerDefinition(unittest.TestCase, DefinitionTestMixin):
         # Client is cleaned up at the end.
         self.assertEqual(self.definition._http_clients, [])
 
+    def reusable(self, **kw):
+        definition = ContainerDefinition(
+            'reuse', IMG_WAIT, reuse_expiry=600, **kw)
+        self.addCleanup(definition.expire)
+        return definition
+
+    def test_reuse_across_helpers(self):
+        """
+        A reusable container survives teardown of both the definition and the
+        helper, and is adopted by an identical definition in a later session.
+        """
+        dh = DockerHelper()
+        first = ContainerDefinition(
+            'reuse', IMG_WAIT, reuse_expiry=600, helper=dh)
+        first.setup()
+        container_id = first.inner().id
+        self.assertIn('seaworthy.reuse.hash', first.inner().labels)
+        first.teardown()
+        self.assertFalse(first.created)
+        dh.teardown()
+
+        second = self.reusable(helper=self.dh)
+        second.setup()
+        self.assertEqual(second.inner().id, container_id)
+        self.assertEqual(second.status(), 'running')
+        # Adopted containers are fully inspected
+        self.assertIn('NetworkSettings', second.inner().attrs)
+
+    def test_reuse_calls_clean(self):
+        """
+        An adopted container is cleaned if the definition knows how.
+        """
+        self.reusable(helper=self.dh).setup().teardown()
+
+        cleaned = []
+        second = self.reusable(helper=self.dh)
+        second.clean = lambda: cleaned.append(second.inner().id)
+        second.setup()
+        self.assertEqual(cleaned, [second.inner().id])
+
+    def test_reuse_hash_mismatch(self):
+        """
+        A reusable container for a different spec is replaced.
+        """
+        first = self.reusable(helper=self.dh)
+        first.setup()
+        container_id = first.inner().id
+        first.teardown()
+
+        second = self.reusable(
+            helper=self.dh, create_kwargs={'environment': {'FOO': 'bar'}})
+        second.setup()
+        self.assertNotEqual(second.inner().id, container_id)
+        self.assertEqual(self.helper.list_reusable('reuse'), [second.inner()])
+
+    def test_reuse_expired(self):
+        """
+        An expired reusable container is replaced.
+        """
+        first = ContainerDefinition(
+            'reuse', IMG_WAIT, reuse_expiry=0, helper=self.dh)
+        self.addCleanup(first.expire)
+        first.setup()
+        container_id = first.inner().id
+        first.teardown()
+
+        second = self.reusable(helper=self.dh)
+        second.setup()
+        self.assertNotEqual(second.inner().id, container_id)
+
+    def test_expire(self):
+        """
+        Expiring a reusable container removes it.
+        """
+        definition = self.reusable(helper=self.dh)
+        definition.setup()
+        definition.expire()
+        self.assertFalse(definition.created)
+        self.assertEqual(self.helper.list_reusable('reuse'), [])
+
+    def test_snapshot(self):
+        """
+        A snapshot image is built once from an initialised container, with its
+        tmpfs content, and later containers start from it.
+        """
+        calls = []
+
+        def initialise(container):
+            calls.append(container.name)
+            container.inner().exec_run(
+                ['sh', '-c', 'echo hello > /scratch/greeting'])
+
+        def make_definition():
+            definition = ContainerDefinition(
+                'snap', IMG_WAIT, helper=self.dh,
+                create_kwargs={'tmpfs': {'/scratch': ''}})
+            self.addCleanup(definition.teardown)
+            return definition
+
+        first = make_definition()
+        tag = first.snapshot_tag(initialise)
+        self.addCleanup(self.dh._client.images.remove, tag)
+        first.setup_snapshot(initialise)
+        self.assertEqual(calls, ['snap_snapshot'])
+        self.assertEqual(first.inner().attrs['Config']['Image'], tag)
+        self.assertEqual(first.status(), 'running')
+        self.assertEqual(
+            first.inner().exec_run(['cat', '/scratch/greeting']).output,
+            b'hello\n')
+        # The snapshot's content is restored into a fresh tmpfs.
+        self.assertEqual(
+            first.inner().attrs['HostConfig']['Tmpfs'], {'/scratch': ''})
+        first.teardown()
+
+        # The image isn't rebuilt if nothing has changed.
+        make_definition().setup_snapshot(initialise)
+        self.assertEqual(calls, ['snap_snapshot'])
+
+        # A different key means a different snapshot.
+        self.assertNotEqual(first.snapshot_tag(initialise, key='v2'), tag)
+
+
+class TestSnapshot(unittest.TestCase):
+    def make_definition(self, **kw):
+        definition = ContainerDefinition('Snap', IMG_WAIT, **kw)
+        helper = mock.Mock()
+        helper._image_helper.fetch.return_value = mock.Mock(id='sha256:abc')
+        definition.set_helper(helper)
+        return definition
+
+    def test_snapshot_paths(self):
+        """
+        The paths to capture are the tmpfs mounts, in either form.
+        """
+        definition = self.make_definition(
+            create_kwargs={'tmpfs': {'/b': '', '/a': 'size=1m'}})
+        self.assertEqual(definition.snapshot_paths(), ['/a', '/b'])
+        # Like other create kwargs, a list replaces the definition's dict.
+        self.assertEqual(
+            definition.snapshot_paths(tmpfs=['/c:size=1m']), ['/c'])
+        self.assertEqual(self.make_definition().snapshot_paths(), [])
+
+    def test_snapshot_tag(self):
+        """
+        The snapshot tag depends on the definition, the image ID, the
+        initialiser and the key.
+        """
+        def init_a(container):
+            pass
+
+        def init_b(container):
+            container.clean()
+
+        definition = self.make_definition()
+        tag = definition.snapshot_tag(init_a)
+        self.assertRegex(tag, r'^seaworthy-snapshot/snap:[0-9a-f]{64}$')
+        self.assertEqual(definition.snapshot_tag(init_a), tag)
+
+        others = [
+            definition.snapshot_tag(init_b),
+            definition.snapshot_tag(init_a, key=1),
+            definition.snapshot_tag(init_a, command='true'),
+        ]
+        definition.helper._image_helper.fetch.return_value = mock.Mock(
+            id='sha256:def')
+        others.append(definition.snapshot_tag(init_a))
+        self.assertNotIn(tag, others)
+        self.assertEqual(len(set(others)), len(others))
+
+
+class TestReuseHash(unittest.TestCase):
+    def test_stable(self):
+        """
+        Identical definitions have the same hash, regardless of dict ordering
+        and whether the image is fetched.
+        """
+        d1 = ContainerDefinition('a', IMG_WAIT, create_kwargs={
+            'environment': {'A': '1', 'B': '2'}})
+        d2 = ContainerDefinition('a', IMG_WAIT, create_kwargs={
+            'environment': {'B': '2', 'A': '1'}})
+        self.assertEqual(d1.reuse_hash(), d2.reuse_hash())
+        self.assertEqual(d1.reuse_hash(), d1.reuse_hash(fetch_image=False))
+
+    def test_differences(self):
+        """
+        The hash depends on the image, create kwargs, run kwargs, wait
+        patterns and definition class.
+        """
+        class Sub(ContainerDefinition):
+            pass
+
+        base = ContainerDefinition('a', IMG_WAIT).reuse_hash()
+        hashes = [
+            ContainerDefinition('a', IMG_SCRIPT).reuse_hash(),
+            ContainerDefinition('a', IMG_WAIT, create_kwargs={
+                'environment': {'A': '1'}}).reuse_hash(),
+            ContainerDefinition('a', IMG_WAIT).reuse_hash(command='true'),
+            ContainerDefinition(
+                'a', IMG_WAIT, wait_patterns=['ready']).reuse_hash(),
+            Sub('a', IMG_WAIT).reuse_hash(),
+        ]
+        self.assertNotIn(base, hashes)
+        self.assertEqual(len(set(hashes)), len(hashes))
+
+    def test_models_by_name(self):
+        """
+        Docker model objects in the spec are hashed by name, which is stable
+        across runs, rather than by ID.
+        """
+        vol1 = models.volumes.Volume(attrs={'Name': 'test_v', 'Id': 'a'})
+        vol2 = models.volumes.Volume(attrs={'Name': 'test_v', 'Id': 'b'})
+        d1 = ContainerDefinition(
+            'a', IMG_WAIT, create_kwargs={'volumes': {vol1: '/v'}})
+        d2 = ContainerDefinition(
+            'a', IMG_WAIT, create_kwargs={'volumes': {vol2: '/v'}})
+        self.assertEqual(d1.reuse_hash(), d2.reuse_hash())
+
+
+class TestWaitForHealthy(unittest.TestCase):
+    def make_definition(self, state, **kwargs):
+        definition = ContainerDefinition('healthy', IMG_WAIT, **kwargs)
+        helper = mock.Mock()
+        helper.wait_for_state.return_value = state
+        definition.set_helper(helper)
+        definition._inner = mock.Mock()
+        return definition
+
+    def test_healthcheck_kwargs(self):
+        """
+        Definitions that wait until they are healthy shorten the healthcheck
+        interval and start period, unless they are given explicitly.
+        """
+        class Healthy(ContainerDefinition):
+            WAIT_FOR_HEALTHY = True
+
+        self.assertNotIn(
+            'healthcheck', ContainerDefinition('a', IMG_WAIT).merge_kwargs(
+                {}, {}))
+        self.assertEqual(
+            Healthy('a', IMG_WAIT).merge_kwargs({}, {})['healthcheck'],
+            {'interval': 100000000, 'start_period': 500000000})
+        definition = ContainerDefinition(
+            'a', IMG_WAIT, wait_for_healthy=True, create_kwargs={
+                'healthcheck': {'test': ['CMD', 'true'], 'interval': 10**6}})
+        self.assertEqual(definition.merge_kwargs(
+            definition._create_kwargs, {})['healthcheck'], {
+                'test': ['CMD', 'true'], 'interval': 10**6,
+                'start_period': 500000000})
+        self.assertFalse(
+            Healthy('a', IMG_WAIT, wait_for_healthy=False).wait_for_healthy)
+
+    def test_wait_for_start(self):
+        """
+        Waiting for the container to start waits until it is healthy.
+        """
+        state = ContainerState('abc', 'running', 'healthy')
+        definition = self.make_definition(
+            state, wait_for_healthy=True, wait_timeout=3)
+        definition.wait_for_start()
+        [(args, kwargs)] = definition.helper.wait_for_state.call_args_list
+        predicate = args[1]
+        self.assertEqual(kwargs, {'timeout': 3})
+        self.assertTrue(predicate(state))
+        self.assertFalse(predicate(attr.evolve(state, health='starting')))
+        self.assertFalse(predicate(attr.evolve(state, health='unhealthy')))
+        self.assertTrue(predicate(attr.evolve(state, status='exited')))
+
+        definition = self.make_definition(state)
+        definition.wait_for_start()
+        definition.helper.wait_for_state.assert_not_called()
+
+    def test_not_healthy(self):
+        """
+        A container that has no healthcheck or stops before it is healthy
+        can't become healthy.
+        """
+        definition = self.make_definition(
+            ContainerState('abc', 'running', None))
+        with self.assertRaisesRegex(RuntimeError, 'no healthcheck'):
+            definition.wait_until_healthy()
+
+        definition = self.make_definition(
+            ContainerState('abc', 'exited', 'starting', exit_code=1))
+        with self.assertRaisesRegex(RuntimeError, 'stopped'):
+            definition.wait_until_healthy()
+
+
+class TestLifecycleTiming(unittest.TestCase):
+    def make_definition(self):
+        def create(name, image, **kwargs):
+            # The helper marks its own phases.
+            with timing.phase('fetch_image'):
+                pass
+            with timing.phase('create'):
+                return mock.Mock()
+
+        definition = ContainerDefinition('timed', IMG_WAIT)
+        helper = mock.Mock()
+        helper.create.side_effect = create
+        definition.set_helper(helper)
+        return definition
+
+    def test_setup_halt(self):
+        """
+        Setting up and halting a container records a timing for each operation
+        with its phases, and passes the timings to the listeners.
+        """
+        definition = self.make_definition()
+        seen = []
+        definition.timing_listeners.append(
+            lambda d, t: seen.append((d, t.operation)))
+
+        definition.setup()
+        setup = definition.timings['setup']
+        self.assertEqual(
+            [p.name for p in setup.phases],
+            ['fetch_image', 'create', 'start', 'wait_for_start'])
+        self.assertFalse(setup.failed)
+        self.assertGreaterEqual(
+            setup.seconds, sum(p.seconds for p in setup.phases))
+
+        definition.teardown()
+        self.assertEqual(
+            [p.name for p in definition.timings['teardown'].phases],
+            ['stop', 'remove'])
+        # Nested operations are absorbed by the outer one.
+        self.assertEqual(set(definition.timings), {'setup', 'teardown'})
+        self.assertEqual(
+            seen, [(definition, 'setup'), (definition, 'teardown')])
+
+        definition.run()
+        definition.halt()
+        self.assertEqual(
+            [p.name for p in definition.timings['run'].phases],
+            ['fetch_image', 'create', 'start'])
+        self.assertIn('halt', definition.timings)
+
+    def test_setup_snapshot(self):
+        """
+        Setting up a container from a snapshot is timed like any other setup,
+        and the container is announced as ready.
+        """
+        definition = self.make_definition()
+        definition.snapshot_tag = mock.Mock(return_value='snapshot:abc')
+        definition.wait_for_start = mock.Mock()
+
+        definition.setup_snapshot(lambda container: None)
+        setup = definition.timings['setup']
+        self.assertEqual(
+            [p.name for p in setup.phases][-3:],
+            ['create', 'start', 'wait_for_start'])
+        self.assertFalse(setup.failed)
+        self.assertIn(
+            events.READY,
+            [c[0][0] for c in definition.helper.events.emit.call_args_list])
+
+    def test_failure(self):
+        """
+        An operation that fails is still recorded, and marked as failed.
+        """
+        definition = self.make_definition()
+        definition.wait_for_start = mock.Mock(side_effect=TimeoutError())
+        with self.assertRaises(TimeoutError):
+            definition.setup()
+        self.assertTrue(definition.timings['setup'].failed)
+        self.assertEqual(
+            definition.timings['setup'].phases[-1].name, 'wait_for_start')
+
+    def test_clone(self):
+        """
+        Clones don't share timings.
+        """
+        definition = self.make_definition()
+        definition.setup()
+        self.assertEqual(definition.clone('other').timings, {})
+
 
 class TestNetworkDefinition(unittest.TestCase, DefinitionTestMixin):
     def setUp(self):
@@ -0,0 +1,125 @@
+import unittest
+from unittest import mock
+
+from seaworthy import events
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.events import EventBus, LifecycleEvent
+from seaworthy.helpers import DockerHelper, VolumeHelper
+
+
+class TestEventBus(unittest.TestCase):
+    def test_no_listeners(self):
+        """
+        Emitting with no listeners does nothing.
+        """
+        bus = EventBus()
+        self.assertFalse(bus.has_listeners)
+        bus.emit(events.CREATE, 'container', 'test_c')
+
+    def test_emit(self):
+        """
+        Listeners are called in order with the event, and only for the kinds
+        they are interested in.
+        """
+        bus = EventBus()
+        seen = []
+        bus.subscribe(lambda e: seen.append(('all', e)))
+        bus.subscribe(
+            lambda e: seen.append(('start', e.kind)), kinds=[events.START])
+        self.assertTrue(bus.has_listeners)
+
+        resource = object()
+        bus.emit(events.CREATE, 'container', 'test_c', resource)
+        bus.emit(events.START, 'container', 'test_c')
+
+        [(_, create), (_, start), filtered] = seen
+        self.assertEqual(filtered, ('start', 'start'))
+        self.assertEqual(
+            (create.kind, create.resource_type, create.name),
+            ('create', 'container', 'test_c'))
+        self.assertIs(create.resource, resource)
+        self.assertIsNone(create.definition)
+        self.assertLessEqual(create.timestamp, start.timestamp)
+
+    def test_unsubscribe(self):
+        """
+        Unsubscribed listeners aren't called again. Subscribe can be used as
+        a decorator.
+        """
+        bus = EventBus()
+        seen = []
+
+        @bus.subscribe
+        def listener(event):
+            seen.append(event.kind)
+
+        bus.emit(events.CREATE, 'volume', 'test_v')
+        bus.unsubscribe(listener)
+        bus.emit(events.REMOVE, 'volume', 'test_v')
+        self.assertEqual(seen, ['create'])
+        self.assertFalse(bus.has_listeners)
+
+    def test_listener_error(self):
+        """
+        Errors in listeners are logged and don't stop other listeners.
+        """
+        bus = EventBus()
+        seen = []
+
+        def broken(event):
+            raise ValueError('oops')
+
+        bus.subscribe(broken)
+        bus.subscribe(seen.append)
+        with self.assertLogs('seaworthy.events', 'ERROR'):
+            bus.emit(events.CREATE, 'volume', 'test_v')
+        self.assertEqual(len(seen), 1)
+
+
+class TestLifecycleEvents(unittest.TestCase):
+    def test_helper_events(self):
+        """
+        Helpers emit events when they create and remove resources, and a
+        DockerHelper's resource helpers share its bus.
+        """
+        bus = EventBus()
+        helper = VolumeHelper(mock.Mock(), 'test', event_bus=bus)
+        volume = mock.Mock()
+        volume.name = 'test_v'
+        helper._create = mock.Mock(return_value=volume)
+        seen = []
+        bus.subscribe(seen.append)
+
+        helper.create('v')
+        helper.remove(volume)
+        self.assertEqual(
+            [(e.kind, e.resource_type, e.name, e.resource) for e in seen],
+            [('create', 'volume', 'test_v', volume),
+             ('remove', 'volume', 'test_v', volume)])
+
+        docker_helper = DockerHelper(client=mock.Mock())
+        for h in [docker_helper.containers, docker_helper.networks,
+                  docker_helper.volumes]:
+            self.assertIs(h.events, docker_helper.events)
+
+    def test_definition_events(self):
+        """
+        Container definitions emit start, stop and ready events.
+        """
+        container = mock.Mock()
+        container.name = 'test_c'
+        helper = mock.Mock(events=EventBus())
+        helper.create.return_value = container
+        seen = []
+        helper.events.subscribe(seen.append)
+
+        definition = ContainerDefinition('c', 'nginx:alpine', helper=helper)
+        definition.setup()
+        definition.teardown()
+
+        self.assertEqual(
+            [e.kind for e in seen], ['start', 'ready', 'stop'])
+        for event in seen:
+            self.assertEqual(event, LifecycleEvent(
+                event.kind, 'container', 'test_c', event.timestamp, container,
+                definition))
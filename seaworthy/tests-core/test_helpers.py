@@ -1,13 +1,23 @@
+import gzip
+import os
+import queue
+import socket
 import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 import docker
 from docker import models
 
 from seaworthy.checks import docker_client, dockertest
 from seaworthy.helpers import (
-    ContainerHelper, DockerHelper, ImageHelper, NetworkHelper, VolumeHelper,
-    _parse_image_tag, fetch_images)
+    ContainerHelper, ContainerState, ContainerStateCache, DockerHelper,
+    ImageHelper, NetworkHelper, PullProgress, RemovalTiming, VolumeHelper,
+    _normalize_image_tag, _parse_image_tag, _parse_time_nano, export_images,
+    fetch_image, fetch_images, fetch_images_timed, image_archive_path,
+    reuse_expired)
 
 
 # We use this image to test with because it is a small (~7MB) image from
@@ -53,20 +63,610 @@ class TestParseImageTagFunc(unittest.TestCase):
                          _parse_image_tag('myregistry:5000/test'))
 
 
+class TestNormalizeImageTagFunc(unittest.TestCase):
+    def test_default_tag(self):
+        """Images without a tag get the ``latest`` tag."""
+        self.assertEqual(_normalize_image_tag('redis'), 'redis:latest')
+        self.assertEqual(
+            _normalize_image_tag('redis:alpine'), 'redis:alpine')
+
+    def test_docker_hub(self):
+        """Docker Hub prefixes are removed."""
+        self.assertEqual(
+            _normalize_image_tag('docker.io/library/redis'), 'redis:latest')
+        self.assertEqual(
+            _normalize_image_tag('index.docker.io/praekelt/foo:1'),
+            'praekelt/foo:1')
+        self.assertEqual(
+            _normalize_image_tag('myregistry:5000/library/foo'),
+            'myregistry:5000/library/foo:latest')
+
+    def test_digest(self):
+        """Image digests are left alone."""
+        self.assertEqual(
+            _normalize_image_tag('redis@sha256:abc'), 'redis@sha256:abc')
+
+
+def fake_image_client(present=(), pull_events=()):
+    """
+    Create a fake Docker client that has some images already and can pull
+    others.
+    """
+    client = mock.Mock()
+    present = set(present)
+
+    def get(name):
+        if name not in present:
+            raise docker.errors.ImageNotFound(name)
+        return mock.Mock(id='id-' + name)
+
+    def pull(name, tag, **kw):
+        present.add('{}:{}'.format(name, tag))
+        if kw.get('stream'):
+            return iter(pull_events)
+        return mock.Mock(id='id-{}:{}'.format(name, tag))
+
+    def load(data):
+        # Our fake archives contain the name of the image they hold.
+        present.add(data.read().decode('utf-8'))
+
+    client.images.get.side_effect = get
+    client.images.pull.side_effect = pull
+    client.api.pull.side_effect = pull
+    client.images.load.side_effect = load
+    client.images.client = client
+    return client
+
+
+class TestFetchImagesFunc(unittest.TestCase):
+    def test_fetch_present_and_missing(self):
+        """
+        Images that are present aren't pulled. Missing images are.
+        """
+        client = fake_image_client(present=['redis:alpine'])
+        fetches = fetch_images_timed(client, ['redis:alpine', 'nginx'])
+        self.assertEqual([f.tag for f in fetches],
+                         ['redis:alpine', 'nginx:latest'])
+        self.assertEqual([f.pulled for f in fetches], [False, True])
+        for fetch in fetches:
+            self.assertGreaterEqual(fetch.seconds, 0)
+        client.images.pull.assert_called_once_with('nginx', tag='latest')
+
+    def test_deduplicate(self):
+        """
+        Names for the same image are only fetched once, but every name gets
+        its image.
+        """
+        client = fake_image_client()
+        names = ['redis', 'redis:latest', 'docker.io/library/redis']
+        images = fetch_images(client, names)
+        self.assertEqual(
+            [i.id for i in images], ['id-redis:latest'] * 3)
+        self.assertEqual(client.images.pull.call_count, 1)
+
+    def test_concurrent(self):
+        """
+        Several images are pulled at the same time, up to the worker limit.
+        """
+        client = fake_image_client()
+        barrier = threading.Barrier(3, timeout=5)
+        pull = client.images.pull.side_effect
+
+        def slow_pull(name, tag, **kw):
+            barrier.wait()
+            return pull(name, tag, **kw)
+        client.images.pull.side_effect = slow_pull
+
+        # All three pulls must be in progress at once to pass the barrier.
+        fetches = fetch_images_timed(client, ['a', 'b', 'c'], workers=3)
+        self.assertEqual(len(fetches), 3)
+
+    def test_progress(self):
+        """
+        Progress events are streamed to the callback when one is given.
+        """
+        events = [
+            {'status': 'Pulling from library/redis', 'id': 'alpine'},
+            {'status': 'Downloading', 'id': 'abc',
+             'progressDetail': {'current': 10, 'total': 100}},
+            {'status': 'Pull complete', 'id': 'abc', 'progressDetail': {}},
+        ]
+        client = fake_image_client(pull_events=events)
+        received = []
+        image = fetch_image(client, 'redis:alpine', progress=received.append)
+        self.assertEqual(image.id, 'id-redis:alpine')
+        self.assertEqual(received, [
+            PullProgress(
+                'redis:alpine', 'alpine', 'Pulling from library/redis'),
+            PullProgress('redis:alpine', 'abc', 'Downloading', 10, 100),
+            PullProgress('redis:alpine', 'abc', 'Pull complete'),
+        ])
+
+    def test_progress_error(self):
+        """
+        Errors reported in the progress stream are raised.
+        """
+        client = fake_image_client(pull_events=[{'error': 'no such image'}])
+        with self.assertRaises(docker.errors.APIError) as cm:
+            fetch_image(client, 'nope', progress=lambda event: None)
+        self.assertIn('no such image', str(cm.exception))
+
+
+class TestImageArchives(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.archive_dir = tmpdir.name
+
+    def write_archive(self, tag, content, extension='.tar'):
+        path = image_archive_path(self.archive_dir, tag, compress=False)
+        path = path[:-len('.tar')] + extension
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_archive_path(self):
+        """
+        Archive names are the quoted, normalized image name.
+        """
+        self.assertEqual(
+            image_archive_path('/cache', 'docker.io/library/redis'),
+            '/cache/redis%3Alatest.tar.gz')
+        self.assertEqual(
+            image_archive_path('/cache', 'localhost:5000/foo:1', False),
+            '/cache/localhost%3A5000%2Ffoo%3A1.tar')
+
+    def test_load_before_pull(self):
+        """
+        A missing image is loaded from its archive instead of being pulled.
+        Compressed archives are also found.
+        """
+        client = fake_image_client()
+        self.write_archive('redis:alpine', 'redis:alpine')
+        self.write_archive('nginx:alpine', 'nginx:alpine', '.tar.gz')
+
+        fetches = fetch_images_timed(
+            client, ['redis:alpine', 'nginx:alpine'],
+            archive_dir=self.archive_dir)
+        self.assertEqual([(f.loaded, f.pulled) for f in fetches],
+                         [(True, False), (True, False)])
+        client.images.pull.assert_not_called()
+
+    def test_pull_without_archive(self):
+        """
+        An image without an archive, or whose archive doesn't contain it, is
+        pulled.
+        """
+        client = fake_image_client()
+        self.write_archive('redis:alpine', 'something:else')
+
+        with self.assertLogs('seaworthy', level='WARNING') as cm:
+            fetches = fetch_images_timed(
+                client, ['redis:alpine', 'nginx'],
+                archive_dir=self.archive_dir)
+        self.assertEqual(len(cm.records), 1)
+        self.assertEqual([(f.loaded, f.pulled) for f in fetches],
+                         [(False, True), (False, True)])
+        self.assertEqual(client.images.load.call_count, 1)
+
+    def test_export(self):
+        """
+        Images are exported as named archives, compressed or not. Existing
+        archives are skipped unless we ask for them to be overwritten.
+        """
+        client = fake_image_client(present=['redis:alpine', 'nginx:latest'])
+        images = {}
+
+        def get(name):
+            image = images.setdefault(name, mock.Mock(tags=[name]))
+            image.save.return_value = [name.encode('utf-8'), b'!']
+            return image
+        client.images.get.side_effect = get
+
+        paths = export_images(
+            client, ['redis:alpine', 'docker.io/library/nginx'],
+            self.archive_dir)
+        self.assertEqual(paths, [
+            image_archive_path(self.archive_dir, 'redis:alpine'),
+            image_archive_path(self.archive_dir, 'nginx'),
+        ])
+        with gzip.open(paths[0]) as f:
+            self.assertEqual(f.read(), b'redis:alpine!')
+        images['redis:alpine'].save.assert_called_once_with(
+            named='redis:alpine')
+
+        self.assertEqual(
+            export_images(client, ['redis:alpine'], self.archive_dir), [])
+        paths = export_images(
+            client, ['redis:alpine'], self.archive_dir, compress=False,
+            overwrite=True)
+        with open(paths[0], 'rb') as f:
+            self.assertEqual(f.read(), b'redis:alpine!')
+
+    def test_helper_export(self):
+        """
+        The image helper exports every image that was fetched through it.
+        """
+        client = fake_image_client(present=['redis:alpine'])
+        client.events.return_value = FakeEventStream()
+        ih = ImageHelper(client, archive_dir=self.archive_dir)
+        self.addCleanup(ih.close)
+        with self.assertRaises(ValueError):
+            ImageHelper(client).export()
+
+        ih.fetch('redis:alpine')
+        ih.fetch_all(['nginx', 'redis:alpine'])
+        with mock.patch('seaworthy.helpers.export_images') as export:
+            ih.export()
+        export.assert_called_once_with(
+            client, ['redis:alpine', 'nginx:latest'], self.archive_dir, True,
+            False)
+
+
+class FakeEventStream:
+    """
+    An events stream that yields events put into it until it is closed.
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def put(self, event):
+        self._events.put(event)
+
+    def close(self):
+        self._events.put(None)
+
+    def __iter__(self):
+        return iter(self._events.get, None)
+
+
+class TestImageHelperCache(unittest.TestCase):
+    def setUp(self):
+        self.client = fake_image_client(present=['redis:alpine'])
+        self.events = FakeEventStream()
+        self.client.events.return_value = self.events
+        self.ih = ImageHelper(self.client)
+        self.addCleanup(self.ih.close)
+
+    def wait_for_invalidation(self, key):
+        deadline = time.monotonic() + 5
+        while self.ih._cached(key) is not None:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_fetch_cached(self):
+        """
+        Fetching an image again makes no API calls.
+        """
+        image = self.ih.fetch('redis:alpine')
+        self.assertIs(self.ih.fetch('docker.io/library/redis:alpine'), image)
+        self.assertEqual(self.client.images.get.call_count, 1)
+        self.client.events.assert_called_once_with(
+            decode=True, filters={'type': 'image'})
+
+    def test_fetch_all_cached(self):
+        """
+        Only images that aren't cached are fetched.
+        """
+        image = self.ih.fetch('redis:alpine')
+        fetches = self.ih.fetch_all(['redis:alpine', 'nginx'])
+        self.assertIs(fetches[0].image, image)
+        self.assertEqual(fetches[0].seconds, 0.0)
+        self.assertTrue(fetches[1].pulled)
+        self.assertEqual(self.client.images.get.call_count, 2)
+
+        self.ih.fetch_all(['redis:alpine', 'nginx'])
+        self.assertEqual(self.client.images.get.call_count, 2)
+
+    def test_invalidate(self):
+        """
+        Invalidated images are looked up again.
+        """
+        self.ih.fetch('redis:alpine')
+        self.ih.fetch('nginx')
+        self.ih.invalidate('redis:alpine')
+        self.ih.fetch('redis:alpine')
+        self.ih.fetch('nginx')
+        self.assertEqual(
+            [c[0][0] for c in self.client.images.get.call_args_list],
+            ['redis:alpine', 'nginx', 'redis:alpine'])
+
+    def test_events(self):
+        """
+        Deleting or untagging a cached image invalidates it. Other images and
+        events are left alone.
+        """
+        self.ih.fetch('redis:alpine')
+        self.ih.fetch('nginx')
+        self.events.put(
+            {'Type': 'image', 'Action': 'push', 'id': 'id-redis:alpine'})
+        self.events.put(
+            {'Type': 'image', 'Action': 'delete', 'id': 'id-redis:alpine'})
+        self.wait_for_invalidation('redis:alpine')
+        self.assertIsNotNone(self.ih._cached('nginx:latest'))
+
+        self.events.put(
+            {'Type': 'image', 'Action': 'untag', 'id': 'id-nginx:latest'})
+        self.wait_for_invalidation('nginx:latest')
+
+    def test_pull_events(self):
+        """
+        A pull only invalidates the tag it pulled, and only if the tag now
+        refers to another image, so our own pulls keep their images cached.
+        """
+        self.ih.fetch('redis:alpine')
+        self.ih.fetch('nginx')
+        self.ih._handle_event({
+            'Type': 'image', 'Action': 'pull', 'id': 'nginx:latest'})
+        self.assertIsNotNone(self.ih._cached('nginx:latest'))
+
+        self.client.images.get.side_effect = (
+            lambda name: mock.Mock(id='id-new'))
+        self.ih._handle_event({
+            'Type': 'image', 'Action': 'pull', 'id': 'docker.io/nginx'})
+        self.assertIsNone(self.ih._cached('nginx:latest'))
+        self.assertIsNotNone(self.ih._cached('redis:alpine'))
+
+    def test_invalidate_while_fetching(self):
+        """
+        An image that is invalidated while it is being fetched isn't cached,
+        but others fetched at the same time are.
+        """
+        generation = self.ih._generation('redis:alpine')
+        self.ih.invalidate('redis:alpine')
+        self.ih._store('redis:alpine', mock.Mock(), generation)
+        self.assertIsNone(self.ih._cached('redis:alpine'))
+
+        generation = self.ih._generation('nginx:latest')
+        self.ih.invalidate('redis:alpine')
+        self.ih._store('nginx:latest', mock.Mock(), generation)
+        self.assertIsNotNone(self.ih._cached('nginx:latest'))
+
+    def test_no_cache(self):
+        """
+        The cache can be disabled.
+        """
+        ih = ImageHelper(self.client, cache=False)
+        ih.fetch('redis:alpine')
+        ih.fetch('redis:alpine')
+        self.assertEqual(self.client.images.get.call_count, 2)
+        self.client.events.assert_not_called()
+
+
+class TestParseTimeNanoFunc(unittest.TestCase):
+    def test_parse(self):
+        """
+        RFC 3339 times are parsed to nanoseconds, and unset or unknown times
+        are zero.
+        """
+        self.assertEqual(
+            _parse_time_nano('2018-12-06T10:11:12.123456789Z'),
+            1544091072123456789)
+        self.assertEqual(
+            _parse_time_nano('2018-12-06T12:11:12.5+02:00'),
+            1544091072500000000)
+        self.assertEqual(
+            _parse_time_nano('2018-12-06T10:11:12Z'), 1544091072000000000)
+        self.assertEqual(_parse_time_nano('0001-01-01T00:00:00Z'), 0)
+        self.assertEqual(_parse_time_nano(None), 0)
+        self.assertEqual(_parse_time_nano('yesterday'), 0)
+
+
+def container_event(action, time_nano, container_id='abc', **attributes):
+    return {
+        'Type': 'container', 'Action': action, 'id': container_id,
+        'timeNano': time_nano,
+        'Actor': {'ID': container_id, 'Attributes': attributes},
+    }
+
+
+def inspect_attrs(status, started, finished='0001-01-01T00:00:00Z',
+                  health=None):
+    state = {'Status': status, 'StartedAt': started, 'FinishedAt': finished,
+             'ExitCode': 0, 'OOMKilled': False}
+    if health is not None:
+        state['Health'] = {'Status': health}
+    return {'Id': 'abc', 'Created': '2018-12-06T10:00:00Z', 'State': state}
+
+
+class TestContainerStateCache(unittest.TestCase):
+    def make_cache(self):
+        client = mock.Mock()
+        self.events = FakeEventStream()
+        client.events.return_value = self.events
+        cache = ContainerStateCache(client, 'test')
+        self.addCleanup(cache.stop)
+        return cache
+
+    def test_events(self):
+        """
+        Container events update the status, exit code, health and OOM flag.
+        """
+        cache = self.make_cache()
+        cache.handle_event(container_event('create', 1))
+        self.assertEqual(cache.get('abc').status, 'created')
+
+        cache.handle_event(container_event('start', 2))
+        cache.handle_event(container_event('health_status: healthy', 3))
+        self.assertEqual(
+            cache.get('abc'),
+            ContainerState('abc', 'running', 'healthy', time_nano=3))
+
+        cache.handle_event(container_event('oom', 4))
+        cache.handle_event(container_event('die', 5, exitCode='137'))
+        state = cache.get('abc')
+        self.assertEqual(
+            (state.status, state.exit_code, state.oom_killed),
+            ('exited', 137, True))
+
+        cache.handle_event(container_event('start', 6))
+        self.assertEqual(
+            cache.get('abc'),
+            ContainerState('abc', 'running', 'starting', time_nano=6))
+
+        cache.handle_event(container_event('destroy', 7))
+        self.assertIsNone(cache.get('abc'))
+
+    def test_ordering(self):
+        """
+        Events older than the current state are ignored, including states
+        from inspection.
+        """
+        cache = self.make_cache()
+        container = mock.Mock(
+            id='abc', attrs=inspect_attrs('running', '2018-12-06T10:00:01Z'))
+        cache.observe(container)
+        started = _parse_time_nano('2018-12-06T10:00:01Z')
+        self.assertEqual(cache.get('abc').time_nano, started)
+
+        # A late create event doesn't undo the start.
+        cache.handle_event(container_event('create', started - 1))
+        self.assertEqual(cache.get('abc').status, 'running')
+        cache.handle_event(container_event('die', started + 1, exitCode='0'))
+        self.assertEqual(cache.get('abc').status, 'exited')
+
+        # Older inspection data fills in a status that events didn't give.
+        cache.handle_event(container_event(
+            'health_status: healthy', started, container_id='def'))
+        cache.observe(mock.Mock(attrs=dict(
+            inspect_attrs('running', '2018-12-06T10:00:00Z'), Id='def')))
+        self.assertEqual(
+            cache.get('def'),
+            ContainerState('def', 'running', 'healthy', time_nano=started))
+
+        # The start event can't tell whether the container has a
+        # healthcheck, so older inspection data fills in its health.
+        cache.handle_event(container_event(
+            'start', started + 1, container_id='ghi'))
+        cache.observe(mock.Mock(attrs=dict(inspect_attrs(
+            'running', '2018-12-06T10:00:01Z', health='starting'),
+            Id='ghi')))
+        self.assertEqual(
+            cache.get('ghi'),
+            ContainerState(
+                'ghi', 'running', 'starting', time_nano=started + 1))
+
+    def test_stream(self):
+        """
+        Events from the stream are consumed in the background, and we can
+        wait for a state.
+        """
+        cache = self.make_cache()
+        cache.start()
+        self.assertTrue(cache.running)
+        [(_, kwargs)] = cache._client.events.call_args_list
+        self.assertEqual(kwargs['filters'], {
+            'type': 'container', 'label': 'seaworthy.namespace=test'})
+
+        self.events.put(container_event('start', 1))
+        self.events.put(container_event('health_status: healthy', 2))
+        state = cache.wait_for(
+            'abc', lambda s: s is not None and s.health == 'healthy', 5)
+        self.assertEqual(state.status, 'running')
+
+        with self.assertRaises(TimeoutError):
+            cache.wait_for('abc', lambda s: s.status == 'exited', 0.05)
+
+        cache.stop()
+        self.assertFalse(cache.running)
+        self.assertIsNone(cache.get('abc'))
+
+    def test_from_attrs(self):
+        state = ContainerState.from_attrs(inspect_attrs(
+            'exited', '2018-12-06T10:00:01Z', '2018-12-06T10:00:02Z',
+            health='unhealthy'))
+        self.assertEqual(state, ContainerState(
+            'abc', 'exited', 'unhealthy', 0, False,
+            _parse_time_nano('2018-12-06T10:00:02Z')))
+
+    def test_container_helper(self):
+        """
+        ContainerHelper reads tracked states from the cache and inspects
+        untracked containers, recording what it sees.
+        """
+        cache = self.make_cache()
+        helper = ContainerHelper(
+            mock.Mock(), 'test', None, None, None)
+        container = mock.Mock(
+            id='abc', attrs=inspect_attrs('running', '2018-12-06T10:00:01Z'))
+
+        self.assertEqual(helper.get_state(container).status, 'running')
+        self.assertEqual(container.reload.call_count, 1)
+
+        helper.states = cache
+        self.assertEqual(helper.get_state(container).status, 'running')
+        self.assertEqual(container.reload.call_count, 2)
+        self.assertIsNotNone(cache.get('abc'))
+
+        cache.handle_event(container_event('die', 2 * 10**18, exitCode='1'))
+        self.assertEqual(helper.get_state(container).exit_code, 1)
+        self.assertEqual(container.reload.call_count, 2)
+
+    def test_wait_for_state(self):
+        """
+        ContainerHelper waits for a state with events from a temporary cache
+        for the container when states aren't tracked, and with the tracking
+        cache when they are.
+        """
+        client = mock.Mock()
+        events = FakeEventStream()
+        client.events.return_value = events
+        helper = ContainerHelper(client, 'test', None, None, None)
+        helper.collection.client = client
+        container = mock.Mock(id='abc', attrs=inspect_attrs(
+            'running', '2018-12-06T10:00:01Z', health='starting'))
+
+        events.put(container_event('health_status: healthy', 2 * 10**18))
+        state = helper.wait_for_state(
+            container, lambda s: s.health == 'healthy', 5)
+        self.assertEqual(state.status, 'running')
+        [(_, kwargs)] = client.events.call_args_list
+        self.assertEqual(kwargs['filters'], {
+            'type': 'container', 'label': 'seaworthy.namespace=test',
+            'container': 'abc'})
+        self.assertEqual(container.reload.call_count, 1)
+
+        cache = self.make_cache()
+        cache.start()
+        helper.states = cache
+        with self.assertRaises(TimeoutError):
+            helper.wait_for_state(
+                container, lambda s: s.health == 'healthy', 0.05)
+        self.assertEqual(container.reload.call_count, 2)
+        self.assertEqual(cache.get('abc').health, 'starting')
+        self.assertEqual(client.events.call_count, 1)
+
+
+class TestReuseExpiredFunc(unittest.TestCase):
+    def test_expiry(self):
+        """Containers expire at the time in their expiry label."""
+        labels = {'seaworthy.reuse.expires': '1000'}
+        self.assertFalse(reuse_expired(labels, now=999))
+        self.assertTrue(reuse_expired(labels, now=1000))
+
+    def test_invalid(self):
+        """Containers without a valid expiry label have expired."""
+        self.assertTrue(reuse_expired({}))
+        self.assertTrue(reuse_expired({'seaworthy.reuse.expires': 'never'}))
+
+
 @dockertest()
 class TestImageHelper(unittest.TestCase):
     def setUp(self):
         self.client = docker.client.from_env()
         self.addCleanup(self.client.api.close)
 
-    def make_helper(self):
-        return ImageHelper(self.client)
+    def make_helper(self, **kw):
+        ih = ImageHelper(self.client, **kw)
+        self.addCleanup(ih.close)
+        return ih
 
     def test_fetch(self):
         """
         We check if the image is already present and pull it if necessary.
         """
-        ih = self.make_helper()
+        ih = self.make_helper(cache=False)
 
         # First, remove the image if it's already present. (We use the busybox
         # image for this test because it's the smallest I can find that is
@@ -94,6 +694,67 @@ class TestImageHelper(unittest.TestCase):
             logs[0],
             r"Found image 'sha256:[a-f0-9]{64}' for tag 'busybox:latest'")
 
+    def test_fetch_cached(self):
+        """
+        Fetched images are cached until an image event invalidates them.
+        """
+        ih = self.make_helper()
+        image = ih.fetch(IMG)
+        with mock.patch.object(self.client.images, 'get') as get:
+            self.assertEqual(ih.fetch(IMG).id, image.id)
+            self.assertEqual(ih.fetch_all([IMG])[0].image.id, image.id)
+        get.assert_not_called()
+
+        # Untagging the image invalidates the cache.
+        image.tag('seaworthy-cache-test', 'latest')
+        self.client.images.remove('seaworthy-cache-test:latest')
+        deadline = time.monotonic() + 5
+        while ih._cached(_normalize_image_tag(IMG)) is not None:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_archive_round_trip(self):
+        """
+        An exported image can be loaded again instead of being pulled.
+        """
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        fetch_images(self.client, ['busybox'])
+
+        ih = self.make_helper(archive_dir=tmpdir.name)
+        ih.fetch('busybox')
+        [path] = ih.export()
+        self.assertTrue(os.path.exists(path))
+
+        self.client.images.remove('busybox:latest')
+        ih = self.make_helper(archive_dir=tmpdir.name)
+        fetch = ih.fetch_all(['busybox'])[0]
+        self.assertTrue(fetch.loaded)
+        self.assertFalse(fetch.pulled)
+
+    def test_fetch_all(self):
+        """
+        We can fetch several images at once, with progress events for the
+        ones that are pulled.
+        """
+        ih = self.make_helper()
+        try:
+            self.client.images.remove('busybox:latest')
+        except docker.errors.ImageNotFound:  # pragma: no cover
+            pass
+
+        events = []
+        fetches = ih.fetch_all(
+            ['busybox', IMG, 'busybox:latest'], progress=events.append)
+        self.assertEqual(
+            [(f.tag, f.pulled) for f in fetches],
+            [('busybox:latest', True), (IMG, False)])
+        self.assertEqual(
+            fetches[0].image.id, self.client.images.get('busybox').id)
+        self.assertNotEqual(events, [])
+        self.assertEqual(
+            set(e.image for e in events), {'busybox:latest'})
+
 
 @dockertest()
 class TestNetworkHelper(unittest.TestCase):
@@ -292,7 +953,8 @@ class TestVolumeHelper(unittest.TestCase):
         vol_labels = vh.create('labels', labels={'foo': 'bar'})
         self.addCleanup(vh.remove, vol_labels)
         self.assertEqual(vol_labels.name, 'test_labels')
-        self.assertEqual(vol_labels.attrs['Labels'], {'foo': 'bar'})
+        self.assertEqual(
+            vol_labels.attrs['Labels'], dict(vh.labels, foo='bar'))
 
         # Copy tmpfs example from Docker docs:
         # https://docs.docker.com/engine/reference/commandline/volume_create/#driver-specific-options
@@ -453,6 +1115,76 @@ class TestContainerHelper(unittest.TestCase):
         self.assertCountEqual(
             network['Aliases'], [con_default.id[:12], 'default'])
 
+    def test_network_aliases_at_create(self):
+        """
+        When a container is created on a network, it is given its network
+        alias at creation time, without being disconnected and reconnected.
+        """
+        ch = self.make_helper()
+
+        net = self.nh.create('aliases')
+        self.addCleanup(self.nh.remove, net)
+        with mock.patch.object(ch, '_connect_container_network') as connect:
+            con = ch.create('aliases', IMG, network=net)
+        self.addCleanup(ch.remove, con)
+
+        connect.assert_not_called()
+        networks = con.attrs['NetworkSettings']['Networks']
+        self.assertEqual(list(networks.keys()), [net.name])
+        self.assertIn('aliases', networks[net.name]['Aliases'])
+
+    def test_network_aliases_image_model(self):
+        """
+        A container created on a network with its aliases can be created from
+        an image model object rather than a tag.
+        """
+        ch = self.make_helper()
+
+        net = self.nh.create('image_model')
+        self.addCleanup(self.nh.remove, net)
+        image = self.ih.fetch(IMG)
+        con = ch.create('image_model', image, network=net)
+        self.addCleanup(ch.remove, con)
+
+        self.assertEqual(con.image.id, image.id)
+        networks = con.attrs['NetworkSettings']['Networks']
+        self.assertIn('image_model', networks[net.name]['Aliases'])
+
+    def test_network_aliases_fallback(self):
+        """
+        When network aliases can't be set at creation time, the container is
+        reconnected to its network with its alias.
+        """
+        ch = self.make_helper()
+
+        net = self.nh.create('fallback')
+        self.addCleanup(self.nh.remove, net)
+        with mock.patch.object(ch, '_can_alias_at_create', return_value=False):
+            con = ch.create('fallback', IMG, network=net)
+        self.addCleanup(ch.remove, con)
+
+        networks = con.attrs['NetworkSettings']['Networks']
+        self.assertEqual(list(networks.keys()), [net.name])
+        self.assertIn('fallback', networks[net.name]['Aliases'])
+
+    def test_extra_network_aliases(self):
+        """
+        Containers can be given extra network aliases, which several
+        containers can share.
+        """
+        ch = self.make_helper()
+
+        net = self.nh.create('shared')
+        self.addCleanup(self.nh.remove, net)
+        for name in ['shared0', 'shared1']:
+            con = ch.create(
+                name, IMG, network=net, network_aliases=['shared'])
+            self.addCleanup(ch.remove, con)
+            aliases = con.attrs['NetworkSettings']['Networks'][net.name][
+                'Aliases']
+            self.assertIn(name, aliases)
+            self.assertIn('shared', aliases)
+
     def test_network_by_id(self):
         """
         When a container is created, a network can be specified using the ID
@@ -695,6 +1427,31 @@ class TestContainerHelper(unittest.TestCase):
         with self.assertRaises(docker.errors.NotFound):
             con_running.reload()
 
+    def test_labels(self):
+        """
+        Containers are labelled with the helper's namespace, session, and
+        process, in addition to any labels they are created with.
+        """
+        ch = self.make_helper()
+
+        con = ch.create('labels', IMG, labels={'foo': 'bar'})
+        self.addCleanup(ch.remove, con)
+        self.assertEqual(con.labels, {
+            'foo': 'bar',
+            'seaworthy.namespace': 'test',
+            'seaworthy.session': ch.session,
+            'seaworthy.pid': str(os.getpid()),
+            'seaworthy.host': socket.gethostname(),
+        })
+
+        # Only containers from this session are listed
+        other_ch = self.make_helper()
+        other_con = other_ch.create('other', IMG)
+        self.addCleanup(other_ch.remove, other_con)
+        self.assertEqual([c.id for c in ch.list_session()], [con.id])
+        self.assertEqual(
+            [c.id for c in other_ch.list_session()], [other_con.id])
+
     def test_custom_namespace(self):
         """
         When the helper has a custom namespace, the containers created are
@@ -707,6 +1464,27 @@ class TestContainerHelper(unittest.TestCase):
         self.assertEqual(con.name, 'integ_con')
 
 
+class TestDockerHelperTeardown(unittest.TestCase):
+    def test_teardown_failure_closes(self):
+        """
+        If removing a resource fails during teardown, the event stream
+        watchers are still stopped and the client is still closed.
+        """
+        client = mock.Mock()
+        dh = DockerHelper(client=client)
+        dh.containers.states = mock.Mock()
+        dh.images.close = mock.Mock()
+        dh.containers._teardown_resources = mock.Mock(return_value=[])
+        dh.networks._teardown_resources = mock.Mock(
+            side_effect=docker.errors.APIError('network in use'))
+
+        with self.assertRaises(docker.errors.APIError):
+            dh.teardown()
+        dh.images.close.assert_called_once_with()
+        dh.containers.states.stop.assert_called_once_with()
+        client.api.close.assert_called_once_with()
+
+
 @dockertest()
 class TestDockerHelper(unittest.TestCase):
     def setUp(self):
@@ -744,6 +1522,76 @@ class TestDockerHelper(unittest.TestCase):
         dh.teardown()
         dh.teardown()
 
+    def test_teardown_timings(self):
+        """
+        DockerHelper.teardown() removes all remaining resources and returns a
+        removal timing for each of them. Containers are removed before the
+        networks and volumes that they use.
+        """
+        dh = self.make_helper(teardown_workers=4)
+
+        net = dh.networks.create('net')
+        vol = dh.volumes.create('vol')
+        for i in range(3):
+            con = dh.containers.create(
+                'con{}'.format(i), IMG, network=net, volumes={vol: '/vol'})
+            con.start()
+
+        timings = dh.teardown()
+        for timing in timings:
+            self.assertIsInstance(timing, RemovalTiming)
+            self.assertGreaterEqual(timing.seconds, 0)
+
+        kinds = [t.kind for t in timings]
+        self.assertEqual(kinds[:3], ['container'] * 3)
+        self.assertCountEqual(kinds[3:], ['network', 'volume'])
+        self.assertCountEqual([t.name for t in timings], [
+            'test_con0', 'test_con1', 'test_con2', 'test_net', 'test_vol'])
+
+        # Nothing is left to remove
+        self.assertEqual(dh.teardown(), [])
+
+    def test_teardown_session(self):
+        """
+        DockerHelper.teardown() removes resources by their session label, so a
+        new helper with the same session can clean up resources created by an
+        earlier helper that was never torn down.
+        """
+        dh = DockerHelper()
+        dh.networks.create('net')
+        dh.volumes.create('vol')
+        dh.containers.create('con', IMG, network_mode='none')
+        dh._client.api.close()
+
+        recovered = self.make_helper(session=dh.session)
+        self.assertEqual(recovered.session, dh.session)
+        timings = recovered.teardown()
+        self.assertCountEqual(
+            [(t.kind, t.name) for t in timings],
+            [('container', 'test_con'), ('network', 'test_net'),
+             ('volume', 'test_vol')])
+
+    def test_track_state(self):
+        """
+        With state tracking, container states are kept up to date from the
+        events stream.
+        """
+        dh = self.make_helper(track_state=True)
+        self.assertTrue(dh.containers.states.running)
+
+        con = dh.containers.create('con', IMG, network_mode='none')
+        con.start()
+        dh.containers.states.wait_for(
+            con.id, lambda s: s is not None and s.status == 'running', 5)
+        con.kill()
+        state = dh.containers.states.wait_for(
+            con.id, lambda s: s.status == 'exited', 5)
+        self.assertEqual(state.exit_code, 137)
+
+        dh.teardown()
+        self.assertIsNone(dh.containers.states.get(con.id))
+        self.assertFalse(dh.containers.states.running)
+
     def test_remove_network_connected_to_created_container(self):
         """
         We can remove a network when it is connected to a container if the
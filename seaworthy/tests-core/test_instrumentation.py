@@ -0,0 +1,170 @@
+import json
+import unittest
+
+import docker
+
+import requests
+from requests.adapters import BaseAdapter
+
+from seaworthy import timing
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.helpers import DockerHelper
+from seaworthy.instrumentation import ApiCallRecorder, endpoint_name
+
+
+class FakeDaemonAdapter(BaseAdapter):
+    """
+    A requests transport adapter that answers every request with the same
+    JSON body, without a Docker daemon.
+    """
+
+    def __init__(self, body=None, status_code=200):
+        super().__init__()
+        if body is None:
+            body = {'Id': 'abc123', 'Name': '/test_c'}
+        self.body = body
+        self.status_code = status_code
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(self.body).encode('utf-8')
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def fake_client(**kw):
+    client = docker.DockerClient(
+        base_url='tcp://127.0.0.1:2375', version='1.35')
+    adapter = FakeDaemonAdapter(**kw)
+    client.api.mount('http://', adapter)
+    return client, adapter
+
+
+class TestEndpointName(unittest.TestCase):
+    def test_endpoints(self):
+        """
+        Versions are stripped and resource IDs and names are replaced.
+        """
+        base = 'http+docker://localhost/v1.35'
+        for method, path, expected in [
+            ('get', '/containers/abc/json', 'GET /containers/{id}/json'),
+            ('get', '/containers/json?all=1', 'GET /containers/json'),
+            ('post', '/containers/create', 'POST /containers/create'),
+            ('post', '/containers/abc/start', 'POST /containers/{id}/start'),
+            ('delete', '/containers/abc', 'DELETE /containers/{id}'),
+            ('get', '/images/library/nginx:alpine/json',
+             'GET /images/{id}/json'),
+            ('delete', '/images/library/nginx', 'DELETE /images/{id}'),
+            ('post', '/images/create', 'POST /images/create'),
+            ('post', '/networks/net/connect', 'POST /networks/{id}/connect'),
+            ('get', '/events', 'GET /events'),
+            ('get', '/version', 'GET /version'),
+        ]:
+            self.assertEqual(
+                endpoint_name(method, base + path), expected, path)
+        self.assertEqual(
+            endpoint_name('get', 'http://localhost/_ping'), 'GET /_ping')
+
+
+class TestApiCallRecorder(unittest.TestCase):
+    def make_client(self, **kw):
+        client, adapter = fake_client(**kw)
+        self.addCleanup(client.api.close)
+        recorder = ApiCallRecorder(helper='test')
+        recorder.instrument(client)
+        return client, recorder
+
+    def test_record(self):
+        """
+        Each request is recorded with its endpoint, and can be queried.
+        """
+        client, recorder = self.make_client()
+        container = client.containers.get('abc123')
+        container.reload()
+        client.api.start('abc123')
+
+        self.assertEqual(recorder.count(), 3)
+        self.assertEqual(
+            recorder.count(endpoint='GET /containers/{id}/json'), 2)
+        [start] = recorder.calls(endpoint='POST /containers/{id}/start')
+        self.assertEqual(start.helper, 'test')
+        self.assertIsNone(start.definition)
+        self.assertFalse(start.failed)
+        self.assertGreaterEqual(start.seconds, 0.0)
+
+        stats = recorder.stats()
+        self.assertEqual(
+            [(s.endpoint, s.count) for s in stats],
+            [('GET /containers/{id}/json', 2),
+             ('POST /containers/{id}/start', 1)])
+
+        recorder.reset()
+        self.assertEqual(recorder.calls(), [])
+
+    def test_attribution(self):
+        """
+        Calls are attributed to the definition whose operation is running, or
+        to an explicitly given definition.
+        """
+        client, recorder = self.make_client()
+        definition = ContainerDefinition('web', 'fake:latest')
+        with timing.operation(definition, 'setup') as t:
+            client.containers.get('abc123')
+            client.api.start('abc123')
+        with recorder.attribute(ContainerDefinition('db', 'fake:latest')):
+            client.containers.get('abc123')
+        client.containers.get('abc123')
+
+        self.assertEqual(t.api_calls, 2)
+        self.assertEqual(
+            recorder.by_definition(), {'web': 2, 'db': 1, None: 1})
+        self.assertEqual(
+            recorder.count(definition=definition, operation='setup'), 2)
+        self.assertEqual(
+            [c.operation for c in recorder.calls(definition='db')], [None])
+
+    def test_failed(self):
+        """
+        Error responses are recorded as failed.
+        """
+        client, recorder = self.make_client(
+            body={'message': 'nope'}, status_code=404)
+        with self.assertRaises(docker.errors.NotFound):
+            client.containers.get('missing')
+        [call] = recorder.calls()
+        self.assertTrue(call.failed)
+
+    def test_uninstrument(self):
+        """
+        Instrumenting twice doesn't record twice, and uninstrumenting stops
+        the recording.
+        """
+        client, recorder = self.make_client()
+        recorder.instrument(client)
+        client.containers.get('abc123')
+        self.assertEqual(recorder.count(), 1)
+
+        recorder.uninstrument(client)
+        client.containers.get('abc123')
+        self.assertEqual(recorder.count(), 1)
+
+    def test_docker_helper(self):
+        """
+        DockerHelper only instruments its client when asked to.
+        """
+        client, _ = fake_client()
+        self.assertIsNone(DockerHelper(client=client).api_calls)
+
+        helper = DockerHelper(client=client, instrument_api=True)
+        client.api.version()
+        self.assertEqual(helper.api_calls.count(endpoint='GET /version'), 1)
+        self.assertEqual(helper.api_calls.helper, 'test')
+        client.api.close()
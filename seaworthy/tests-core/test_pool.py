@@ -0,0 +1,287 @@
+import threading
+import time
+import unittest
+
+from seaworthy.checks import docker_client, dockertest
+from seaworthy.containers.redis import RedisContainer
+from seaworthy.definitions import ContainerDefinition, VolumeDefinition
+from seaworthy.helpers import DockerHelper, fetch_images
+from seaworthy.pool import ContainerPool
+
+
+class FakeContainer(ContainerDefinition):
+    """
+    A container definition that pretends to set up containers without talking
+    to Docker.
+    """
+
+    def __init__(self, name='fake', setup_delay=0.0, cleanable=True,
+                 failures=None):
+        super().__init__(name, 'fake:latest')
+        self.setup_delay = setup_delay
+        self.cleanable = cleanable
+        # Shared with clones, so that a pool's containers fail in turn.
+        self.failures = [] if failures is None else failures
+        self.cleaned = 0
+        self.torn_down = False
+
+    def setup(self, helper=None, **run_kwargs):
+        self.set_helper(helper)
+        time.sleep(self.setup_delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        self._inner = object()
+        self.torn_down = False
+        return self
+
+    def teardown(self):
+        self._inner = None
+        self.torn_down = True
+
+    def clean(self):
+        if not self.cleanable:
+            raise NotImplementedError()
+        self.cleaned += 1
+
+
+class TestContainerPool(unittest.TestCase):
+    def make_pool(self, definition=None, size=2, **kw):
+        if definition is None:
+            definition = FakeContainer()
+        pool = ContainerPool(definition, size=size, helper=object(), **kw)
+        self.addCleanup(pool.teardown)
+        return pool
+
+    def test_requires_container_definition(self):
+        """
+        Pools can only be created for container definitions.
+        """
+        with self.assertRaises(TypeError):
+            ContainerPool(VolumeDefinition('vol'))
+        with self.assertRaises(ValueError) as cm:
+            ContainerPool(FakeContainer(), size=0)
+        self.assertEqual(str(cm.exception), 'Pool size must be at least 1.')
+
+    def test_requires_helper(self):
+        """
+        A pool can't be set up without a helper.
+        """
+        pool = ContainerPool(FakeContainer())
+        with self.assertRaises(RuntimeError) as cm:
+            pool.setup()
+        self.assertEqual(str(cm.exception), 'No helper set.')
+        with self.assertRaises(RuntimeError) as cm:
+            pool.acquire()
+        self.assertEqual(str(cm.exception), 'Pool not set up.')
+
+    def test_helper(self):
+        """
+        The helper works the same way as for definitions.
+        """
+        helper = object()
+        pool = ContainerPool(FakeContainer())
+        pool.set_helper(None)
+        pool.set_helper(helper)
+        pool.set_helper(helper)
+        self.assertIs(pool.helper, helper)
+        with self.assertRaises(RuntimeError) as cm:
+            pool.set_helper(object())
+        self.assertEqual(str(cm.exception), 'Cannot replace existing helper.')
+
+    def test_fill(self):
+        """
+        When the pool is set up, it is filled with copies of the definition.
+        """
+        template = FakeContainer()
+        pool = self.make_pool(template, size=3).setup(wait=True)
+
+        self.assertFalse(template.created)
+        self.assertEqual(len(pool.stats.refill_seconds), 3)
+        containers = [pool.acquire() for _ in range(3)]
+        self.assertCountEqual(
+            [c.name for c in containers],
+            ['fake_pool0', 'fake_pool1', 'fake_pool2'])
+        for container in containers:
+            self.assertTrue(container.created)
+            self.assertIsNot(container, template)
+        self.assertEqual(pool.stats.hits, 3)
+        self.assertEqual(pool.stats.misses, 0)
+
+    def test_miss(self):
+        """
+        If no container is ready, we wait for one and count a miss.
+        """
+        pool = self.make_pool(FakeContainer(setup_delay=0.2), size=1)
+        pool.setup()
+        container = pool.acquire(timeout=5)
+        self.assertTrue(container.created)
+        self.assertEqual(pool.stats.misses, 1)
+        self.assertEqual(pool.stats.hits, 0)
+
+    def test_acquire_timeout(self):
+        """
+        If no container becomes ready within the timeout, we get an error.
+        """
+        pool = self.make_pool(FakeContainer(setup_delay=1), size=1)
+        pool.setup()
+        with self.assertRaises(TimeoutError) as cm:
+            pool.acquire(timeout=0.01)
+        self.assertEqual(
+            str(cm.exception), 'Timeout (0.01s) waiting for a pool container.')
+
+    def test_setup_failure(self):
+        """
+        If a container fails to set up, a waiting lease gets the error instead
+        of waiting forever, and the next lease gets a new container.
+        """
+        failures = [RuntimeError('boom')]
+        pool = self.make_pool(
+            FakeContainer(setup_delay=0.1, failures=failures), size=1)
+        pool.setup()
+        with self.assertRaises(RuntimeError) as cm:
+            pool.acquire()
+        self.assertEqual(str(cm.exception), 'boom')
+
+        container = pool.acquire(timeout=5)
+        self.assertTrue(container.created)
+        self.assertEqual(pool.stats.misses, 2)
+
+    def test_refill_on_acquire(self):
+        """
+        Leased containers are replaced in the background.
+        """
+        pool = self.make_pool(size=2).setup(wait=True)
+        pool.acquire()
+        pool.acquire()
+
+        deadline = time.monotonic() + 5
+        while len(pool.stats.refill_seconds) < 4:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        pool.acquire()
+        self.assertEqual(pool.stats.hits, 3)
+
+    def test_release_cleans(self):
+        """
+        Released containers are cleaned and leased again if the pool needs
+        them.
+        """
+        pool = self.make_pool(FakeContainer(setup_delay=0.5), size=1)
+        pool.setup(wait=True)
+
+        container = pool.acquire()
+        pool.release(container)
+        self.assertEqual(container.cleaned, 1)
+        self.assertIs(pool.acquire(), container)
+
+    def test_release_surplus(self):
+        """
+        Released containers that aren't needed to keep the pool full are torn
+        down.
+        """
+        pool = self.make_pool(size=1).setup(wait=True)
+        container = pool.acquire()
+        # Wait for the replacement
+        deadline = time.monotonic() + 5
+        while len(pool.stats.refill_seconds) < 2:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        pool.release(container)
+        self.assertTrue(container.torn_down)
+        self.assertEqual(container.cleaned, 0)
+
+    def test_release_uncleanable(self):
+        """
+        Containers that can't be cleaned are torn down and replaced.
+        """
+        pool = self.make_pool(
+            FakeContainer(setup_delay=0.5, cleanable=False), size=1)
+        pool.setup(wait=True)
+
+        container = pool.acquire()
+        pool.release(container)
+        self.assertTrue(container.torn_down)
+        self.assertEqual(pool.stats.discarded, 1)
+        self.assertIsNot(pool.acquire(timeout=5), container)
+
+    def test_lease(self):
+        """
+        Containers can be leased for the duration of a with block.
+        """
+        pool = self.make_pool(FakeContainer(setup_delay=0.5), size=1)
+        pool.setup(wait=True)
+        with pool.lease() as container:
+            self.assertTrue(container.created)
+        self.assertEqual(container.cleaned, 1)
+
+    def test_concurrent_leases(self):
+        """
+        Containers can be leased from many threads at once, and every thread
+        gets its own container.
+        """
+        pool = self.make_pool(size=4).setup(wait=True)
+        leased = []
+        lock = threading.Lock()
+
+        def lease():
+            container = pool.acquire(timeout=5)
+            with lock:
+                leased.append(container)
+
+        threads = [threading.Thread(target=lease) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(id(c) for c in leased)), 8)
+        self.assertEqual(pool.stats.hits + pool.stats.misses, 8)
+
+    def test_teardown(self):
+        """
+        Teardown removes ready and leased containers, and is safe to call more
+        than once.
+        """
+        pool = self.make_pool(size=2).setup(wait=True)
+        leased = pool.acquire()
+        pool.teardown()
+        self.assertTrue(leased.torn_down)
+        self.assertFalse(pool.started)
+        pool.teardown()
+
+        # Containers released after teardown are torn down
+        pool.setup(wait=True)
+        leased = pool.acquire()
+        pool.teardown()
+        self.assertTrue(leased.torn_down)
+
+
+@dockertest()
+class TestContainerPoolWithDocker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with docker_client() as client:
+            fetch_images(client, [RedisContainer.DEFAULT_IMAGE])
+
+    def test_redis_pool(self):
+        """
+        We can lease real containers, and they are cleaned when released.
+        """
+        dh = DockerHelper()
+        self.addCleanup(dh.teardown)
+        pool = ContainerPool(RedisContainer(), size=1, helper=dh)
+        self.addCleanup(pool.teardown)
+        pool.setup(wait=True)
+
+        with pool.lease() as redis:
+            self.assertEqual(redis.status(), 'running')
+            redis.exec_redis_cli('SET', ['foo', 'bar'])
+            self.assertEqual(redis.list_keys(), ['foo'])
+
+        with pool.lease() as redis2:
+            self.assertEqual(redis2.list_keys(), [])
+        self.assertEqual(pool.stats.hits, 2)
+
+        pool.teardown()
+        self.assertFalse(redis.created)
@@ -0,0 +1,312 @@
+import socket
+import threading
+import unittest
+from unittest import mock
+
+from docker.models.containers import ExecResult
+
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.helpers import ContainerState
+from seaworthy.probes import (
+    Backoff, ExecProbe, HealthProbe, HttpProbe, LogProbe, Probe, ProbeResult,
+    ProbeTimeout, TcpProbe, all_of, any_of, wait_for_ports)
+
+# Waits in these tests should be short.
+FAST = Backoff(initial=0.001, maximum=0.01)
+
+
+class FakeProbe(Probe):
+    """
+    A probe that fails a number of times before it passes, optionally by
+    raising an exception.
+    """
+
+    def __init__(self, name, failures=0, error=None):
+        super().__init__(name)
+        self.failures = failures
+        self.error = error
+        self.checks = 0
+
+    def check(self, timeout):
+        self.checks += 1
+        if self.checks <= self.failures:
+            if self.error is not None:
+                raise self.error
+            return False
+        return True
+
+
+def closed_port():
+    """
+    Get a local port that nothing is listening on.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestBackoff(unittest.TestCase):
+    def test_delays(self):
+        """
+        Delays grow exponentially up to the maximum, with jitter taking up to
+        the given fraction off each one.
+        """
+        delays = Backoff(initial=1, maximum=5, factor=2, jitter=0.5).delays()
+        for nominal in [1, 2, 4, 5, 5]:
+            delay = next(delays)
+            self.assertLessEqual(delay, nominal)
+            self.assertGreaterEqual(delay, nominal / 2)
+
+        delays = Backoff(initial=1, maximum=5, jitter=0).delays()
+        self.assertEqual([next(delays) for _ in range(4)], [1, 2, 4, 5])
+
+
+class TestProbe(unittest.TestCase):
+    def test_wait(self):
+        """
+        A probe is checked until it passes, and the result records how long
+        that took. Errors count as failures.
+        """
+        probe = FakeProbe('fake', failures=2, error=OSError('refused'))
+        result = probe.wait(5, backoff=FAST)
+        self.assertTrue(result.ready)
+        self.assertEqual((result.name, result.attempts), ('fake', 3))
+        self.assertIsNone(result.error)
+        self.assertGreater(result.seconds, 0)
+
+    def test_timeout(self):
+        """
+        A probe that doesn't pass in time raises an exception with the
+        result, including the last error.
+        """
+        probe = FakeProbe('fake', failures=1000, error=OSError('refused'))
+        with self.assertRaises(ProbeTimeout) as cm:
+            probe.wait(0.05, backoff=FAST)
+        self.assertIsInstance(cm.exception, TimeoutError)
+        result = cm.exception.result
+        self.assertFalse(result.ready)
+        self.assertGreater(result.attempts, 1)
+        self.assertGreaterEqual(result.seconds, 0.05)
+        self.assertEqual(result.error, 'OSError: refused')
+        self.assertIn('fake: not ready after', str(cm.exception))
+
+    def test_all(self):
+        """
+        An all probe passes when all its probes have passed, and doesn't
+        check probes again once they've passed.
+        """
+        fast, slow = FakeProbe('fast'), FakeProbe('slow', failures=3)
+        result = all_of(fast, slow).wait(5, backoff=FAST)
+        self.assertEqual((result.name, result.attempts), ('all', 4))
+        self.assertEqual((fast.checks, slow.checks), (1, 4))
+        self.assertEqual(
+            [(r.name, r.ready, r.attempts) for r in result.probes],
+            [('fast', True, 1), ('slow', True, 4)])
+        self.assertLessEqual(result.probes[0].seconds,
+                             result.probes[1].seconds)
+
+    def test_any(self):
+        """
+        An any probe passes as soon as one of its probes passes.
+        """
+        never = FakeProbe('never', failures=1000)
+        soon = FakeProbe('soon', failures=1)
+        result = any_of(never, soon).wait(5, backoff=FAST)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(
+            [(r.name, r.ready) for r in result.probes],
+            [('never', False), ('soon', True)])
+
+        with self.assertRaises(ValueError):
+            any_of()
+
+    def test_nested_timeout(self):
+        """
+        Combined probes share a single deadline, and the timeout error
+        describes each of them.
+        """
+        probe = all_of(
+            FakeProbe('ok'),
+            any_of(FakeProbe('a', failures=1000),
+                   FakeProbe('b', failures=1000, error=OSError('nope'))))
+        with self.assertRaises(ProbeTimeout) as cm:
+            probe.wait(0.05, backoff=FAST)
+        result = cm.exception.result
+        [ok, either] = result.probes
+        self.assertTrue(ok.ready)
+        self.assertFalse(either.ready)
+        self.assertEqual(
+            [p.error for p in either.probes], [None, 'OSError: nope'])
+        lines = str(cm.exception).splitlines()
+        self.assertEqual(
+            [line.split(':')[0] for line in lines[1:]],
+            ['all', '  ok', '  any', '    a', '    b'])
+
+
+class TestProbes(unittest.TestCase):
+    def test_tcp(self):
+        """
+        A TCP probe passes when a connection is accepted.
+        """
+        server = socket.socket()
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        probe = TcpProbe(*server.getsockname())
+        self.assertTrue(probe.check(1))
+
+        with self.assertRaises(OSError):
+            TcpProbe('127.0.0.1', closed_port()).check(1)
+
+    def test_tcp_for_container(self):
+        container = mock.Mock(spec=ContainerDefinition)
+        container.name = 'web'
+        container.get_first_host_port.return_value = ('127.0.0.1', '8000')
+        container.get_host_port.return_value = ('127.0.0.1', '9000')
+        probe = TcpProbe.for_container(container)
+        self.assertEqual((probe.port, probe.name), (8000, 'tcp web 8000'))
+        probe = TcpProbe.for_container(container, 90)
+        self.assertEqual(probe.port, 9000)
+        container.get_host_port.assert_called_once_with(90)
+
+    def test_http(self):
+        """
+        An HTTP probe passes on any response, or only on the expected status
+        code if there is one.
+        """
+        client = mock.Mock()
+        client.get.return_value = mock.Mock(status_code=503)
+        self.assertTrue(HttpProbe(client).check(1))
+        client.get.assert_called_once_with(
+            '/', timeout=1, allow_redirects=False)
+        self.assertFalse(
+            HttpProbe(client, expected_status_code=200).check(1))
+
+    def test_exec(self):
+        """
+        An exec probe passes when the command exits with 0.
+        """
+        container = mock.Mock(spec=ContainerDefinition)
+        container.name = 'db'
+        exec_run = container.inner.return_value.exec_run
+        exec_run.return_value = ExecResult(1, b'no')
+        probe = ExecProbe(container, ['pg_isready'])
+        self.assertFalse(probe.check(1))
+        exec_run.return_value = ExecResult(0, b'ok')
+        self.assertTrue(probe.check(1))
+        exec_run.assert_called_with(['pg_isready'])
+
+    def test_logs(self):
+        """
+        A log probe passes once all its patterns have matched complete lines,
+        and only matches each line once.
+        """
+        container = mock.Mock(spec=ContainerDefinition)
+        container.name = 'app'
+        logs = container.inner.return_value.logs
+        probe = LogProbe(container, r'^listening$', r'^ready$')
+
+        logs.return_value = b'listening\nread'
+        self.assertFalse(probe.check(1))
+        logs.return_value = b'listening\nready\n'
+        self.assertTrue(probe.check(1))
+
+        # Waiting again starts from scratch.
+        probe.reset()
+        logs.return_value = b'ready\nready\n'
+        self.assertFalse(probe.check(1))
+
+        with self.assertRaises(ValueError):
+            LogProbe(container)
+
+    def test_health(self):
+        container = mock.Mock(spec=ContainerDefinition)
+        container.name = 'app'
+        container.state.return_value = None
+        probe = HealthProbe(container)
+        self.assertFalse(probe.check(1))
+        container.state.return_value = ContainerState(
+            'abc', 'running', 'starting')
+        self.assertFalse(probe.check(1))
+        container.state.return_value = ContainerState(
+            'abc', 'running', 'healthy')
+        self.assertTrue(probe.check(1))
+
+
+class TestWaitForPorts(unittest.TestCase):
+    def bound_socket(self, listen=True):
+        sock = socket.socket()
+        self.addCleanup(sock.close)
+        sock.bind(('127.0.0.1', 0))
+        if listen:
+            sock.listen(5)
+        return sock
+
+    def test_many_ports(self):
+        """
+        All the ports are waited for at once, and the result has the time
+        each one took to accept a connection.
+        """
+        listening = [self.bound_socket() for _ in range(20)]
+        # Connections to a port that isn't listening yet are refused.
+        late = self.bound_socket(listen=False)
+        timer = threading.Timer(0.1, late.listen, [5])
+        self.addCleanup(timer.cancel)
+        timer.start()
+
+        targets = [s.getsockname() for s in listening]
+        targets.append(TcpProbe(*late.getsockname(), name='late'))
+        result = wait_for_ports(targets, 5, backoff=FAST)
+        self.assertTrue(result.ready)
+        self.assertEqual(len(result.probes), 21)
+        self.assertEqual(
+            [r.attempts for r in result.probes[:20]], [1] * 20)
+        late_result = result.probes[-1]
+        self.assertEqual(late_result.name, 'late')
+        self.assertGreater(late_result.attempts, 1)
+        self.assertGreaterEqual(late_result.seconds, 0.1)
+        self.assertLess(
+            max(r.seconds for r in result.probes[:20]), late_result.seconds)
+
+    def test_timeout(self):
+        """
+        If a port doesn't accept connections in time, the timeout error has
+        the results for every port.
+        """
+        ok = self.bound_socket().getsockname()
+        refused = ('127.0.0.1', closed_port())
+        with self.assertRaises(ProbeTimeout) as cm:
+            wait_for_ports([ok, refused], 0.1, backoff=FAST)
+        [ok_result, refused_result] = cm.exception.result.probes
+        self.assertTrue(ok_result.ready)
+        self.assertFalse(refused_result.ready)
+        self.assertIn('ECONNREFUSED', refused_result.error)
+
+        with self.assertRaises(ValueError):
+            wait_for_ports([], 1)
+
+
+class TestDefinitionProbe(unittest.TestCase):
+    def test_wait_for_start(self):
+        """
+        Container definitions wait for their readiness probe when they start,
+        and keep the result.
+        """
+        probe = FakeProbe('fake', failures=1)
+
+        class Probed(ContainerDefinition):
+            def readiness_probe(self):
+                return probe
+
+        definition = Probed('probed', 'nginx:alpine', wait_timeout=5)
+        definition.wait_for_start()
+        self.assertEqual(definition.probe_result.attempts, 2)
+        self.assertIsNone(definition.clone('other').probe_result)
+
+        probe.failures = 1000
+        with self.assertRaises(ProbeTimeout):
+            definition.wait_for_probe(probe, timeout=0.01)
+        self.assertIsInstance(definition.probe_result, ProbeResult)
+        self.assertFalse(definition.probe_result.ready)
@@ -0,0 +1,185 @@
+import os
+import socket
+import subprocess
+import sys
+import unittest
+
+import docker
+
+from seaworthy.checks import docker_client, dockertest
+from seaworthy.helpers import DockerHelper, LABEL_PID, fetch_images
+from seaworthy.reaper import (
+    ReapSummary, _parse_timestamp, find_orphans, owner_alive, reap)
+
+IMG = 'nginx:alpine'
+
+
+@dockertest()
+def setUpModule():  # noqa: N802 (The camelCase is mandated by unittest.)
+    with docker_client() as client:
+        fetch_images(client, [IMG])
+
+
+def dead_pid():
+    """
+    Get the pid of a process that has exited.
+    """
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+class TestParseTimestampFunc(unittest.TestCase):
+    def test_integer(self):
+        """Integer timestamps (from containers) are used as-is."""
+        self.assertEqual(_parse_timestamp(1539831399), 1539831399.0)
+
+    def test_utc(self):
+        """RFC 3339 timestamps in UTC are parsed."""
+        self.assertEqual(
+            _parse_timestamp('2018-10-18T02:56:39Z'), 1539831399.0)
+
+    def test_nanoseconds(self):
+        """Fractional seconds are discarded."""
+        self.assertEqual(
+            _parse_timestamp('2018-10-18T02:56:39.123456789Z'), 1539831399.0)
+
+    def test_offset(self):
+        """Timezone offsets are taken into account."""
+        self.assertEqual(
+            _parse_timestamp('2018-10-18T04:56:39+02:00'), 1539831399.0)
+        self.assertEqual(
+            _parse_timestamp('2018-10-18T00:26:39-02:30'), 1539831399.0)
+
+    def test_invalid(self):
+        """Unknown formats raise an error."""
+        with self.assertRaises(ValueError) as cm:
+            _parse_timestamp('yesterday')
+        self.assertEqual(
+            str(cm.exception), "Unknown timestamp format: 'yesterday'")
+
+
+class TestOwnerAliveFunc(unittest.TestCase):
+    def labels(self, pid, host=None):
+        return {
+            'seaworthy.pid': str(pid),
+            'seaworthy.host': socket.gethostname() if host is None else host,
+        }
+
+    def test_running_process(self):
+        """A process that is still running is alive."""
+        self.assertTrue(owner_alive(self.labels(os.getpid())))
+
+    def test_dead_process(self):
+        """A process that has exited is not alive."""
+        self.assertFalse(owner_alive(self.labels(dead_pid())))
+
+    def test_other_host(self):
+        """We can't tell for processes on other hosts, so assume alive."""
+        self.assertTrue(
+            owner_alive(self.labels(dead_pid(), host='elsewhere.invalid')))
+
+    def test_no_labels(self):
+        """Without process labels, assume alive."""
+        self.assertTrue(owner_alive({}))
+        self.assertTrue(owner_alive({'seaworthy.host': socket.gethostname()}))
+
+
+class TestReapSummary(unittest.TestCase):
+    def test_describe(self):
+        """The summary lists the counts and names of reclaimed resources."""
+        summary = ReapSummary(
+            containers=['test_a', 'test_b'], networks=['test_default'])
+        self.assertEqual(summary.total(), 3)
+        self.assertEqual(summary.describe(), '\n'.join([
+            'Reclaimed 2 containers, 1 networks, 0 volumes',
+            '  container test_a',
+            '  container test_b',
+            '  network test_default',
+        ]))
+
+    def test_describe_dry_run_failed(self):
+        """Dry runs and failures are described."""
+        summary = ReapSummary(
+            volumes=['test_v'], failed=['test_n'], dry_run=True)
+        self.assertEqual(summary.describe(), '\n'.join([
+            'Would reclaim 0 containers, 0 networks, 1 volumes',
+            '  volume test_v',
+            'Failed to remove 1 resources:',
+            '  test_n',
+        ]))
+
+
+@dockertest()
+class TestReap(unittest.TestCase):
+    def setUp(self):
+        self.client = docker.client.from_env()
+        self.addCleanup(self.client.api.close)
+
+    def make_orphans(self, namespace, pid):
+        """
+        Create some resources with a DockerHelper, as though the process with
+        the given pid created them and then died.
+        """
+        dh = DockerHelper(namespace=namespace)
+        self.addCleanup(dh.teardown)
+        for helper in [dh.containers, dh.networks, dh.volumes]:
+            helper.labels[LABEL_PID] = str(pid)
+
+        net = dh.networks.create('net')
+        vol = dh.volumes.create('vol')
+        dh.containers.create('con', IMG, network=net, volumes={vol: '/vol'})
+        return dh
+
+    def test_reap_dead_owner(self):
+        """
+        Resources whose creating process is gone are removed, containers
+        first.
+        """
+        self.make_orphans('reap_dead', dead_pid())
+
+        orphans = find_orphans(self.client, namespace='reap_dead', min_age=0)
+        self.assertEqual(
+            {kind: [r.name for r in rs] for kind, rs in orphans.items()},
+            {'container': ['reap_dead_con'],
+             'network': ['reap_dead_net'],
+             'volume': ['reap_dead_vol']})
+
+        dry = reap(self.client, namespace='reap_dead', min_age=0,
+                   dry_run=True)
+        self.assertEqual(dry.total(), 3)
+        self.assertEqual(
+            len(find_orphans(self.client, 'reap_dead', 0)['container']), 1)
+
+        summary = reap(self.client, namespace='reap_dead', min_age=0)
+        self.assertEqual(summary.containers, ['reap_dead_con'])
+        self.assertEqual(summary.networks, ['reap_dead_net'])
+        self.assertEqual(summary.volumes, ['reap_dead_vol'])
+        self.assertEqual(summary.failed, [])
+
+        orphans = find_orphans(self.client, namespace='reap_dead', min_age=0)
+        self.assertEqual(orphans,
+                         {'container': [], 'network': [], 'volume': []})
+
+    def test_live_owner_skipped(self):
+        """
+        Resources whose creating process is still running are only removed if
+        the owner check is disabled.
+        """
+        self.make_orphans('reap_live', os.getpid())
+
+        summary = reap(self.client, namespace='reap_live', min_age=0)
+        self.assertEqual(summary.total(), 0)
+
+        summary = reap(self.client, namespace='reap_live', min_age=0,
+                       check_owner=False)
+        self.assertEqual(summary.total(), 3)
+
+    def test_young_resources_skipped(self):
+        """
+        Resources younger than the minimum age are not removed.
+        """
+        self.make_orphans('reap_young', dead_pid())
+
+        summary = reap(self.client, namespace='reap_young', min_age=3600)
+        self.assertEqual(summary.total(), 0)
@@ -0,0 +1,169 @@
+import threading
+import unittest
+
+from seaworthy.checks import dockertest
+from seaworthy.containers.nginx import NginxContainer
+from seaworthy.definitions import ContainerDefinition, VolumeDefinition
+from seaworthy.helpers import DockerHelper
+from seaworthy.replicas import ReplicaSet
+
+
+class FakeReplica(ContainerDefinition):
+    """
+    A container definition whose setup waits at a shared barrier (so we can
+    tell that replicas are set up concurrently) and fails for chosen names.
+    """
+
+    def __init__(self, name='fake', barrier=None, fail=(), **kwargs):
+        super().__init__(name, 'fake:latest', **kwargs)
+        self.barrier = barrier
+        self.fail = fail
+
+    def setup(self, helper=None, **run_kwargs):
+        self._inner = object()
+        if self.barrier is not None:
+            self.barrier.wait()
+        if self.name in self.fail:
+            raise RuntimeError('{} failed'.format(self.name))
+        return self
+
+    def teardown(self):
+        self._inner = None
+
+    def get_first_host_port(self):
+        return ('127.0.0.1', self.name)
+
+    def get_host_port(self, container_port, proto='tcp', index=0):
+        return ('127.0.0.1', '{}/{}/{}'.format(
+            self.name, container_port, proto))
+
+
+class TestReplicaSet(unittest.TestCase):
+    def make_replicas(self, definition=None, replicas=2):
+        if definition is None:
+            definition = FakeReplica()
+        replica_set = ReplicaSet(
+            definition, replicas=replicas, helper=object())
+        self.addCleanup(replica_set.teardown)
+        return replica_set
+
+    def test_requires_container_definition(self):
+        with self.assertRaises(TypeError):
+            ReplicaSet(VolumeDefinition('vol'))
+        with self.assertRaises(ValueError):
+            ReplicaSet(FakeReplica(), replicas=-1)
+        with self.assertRaises(RuntimeError) as cm:
+            ReplicaSet(FakeReplica()).setup()
+        self.assertEqual(str(cm.exception), 'No helper set.')
+
+    def test_setup_teardown(self):
+        """
+        Replicas are uniquely named copies of the definition that share its
+        name as a network alias, and are set up concurrently.
+        """
+        # Every replica must be setting up at once to pass the barrier.
+        definition = FakeReplica(barrier=threading.Barrier(3, timeout=5))
+        replica_set = self.make_replicas(definition, replicas=3)
+        self.assertFalse(replica_set.created)
+
+        replica_set.setup()
+        self.assertTrue(replica_set.created)
+        self.assertEqual(
+            [r.name for r in replica_set],
+            ['fake_replica0', 'fake_replica1', 'fake_replica2'])
+        for replica in replica_set:
+            self.assertTrue(replica.created)
+            self.assertEqual(
+                replica._create_kwargs['network_aliases'], ['fake'])
+        self.assertFalse(definition.created)
+        self.assertNotIn('network_aliases', definition._create_kwargs)
+
+        replicas = list(replica_set)
+        replica_set.teardown()
+        self.assertEqual(len(replica_set), 0)
+        self.assertFalse(any(r.created for r in replicas))
+
+        # The replicas come back with new names.
+        definition.barrier = None
+        replica_set.setup()
+        self.assertEqual(replica_set[0].name, 'fake_replica3')
+        self.assertEqual(len(replica_set), 3)
+
+    def test_existing_aliases(self):
+        """
+        The definition's own network aliases are kept, and the definition's
+        name is added to them.
+        """
+        definition = FakeReplica(
+            create_kwargs={'network_aliases': ['api']})
+        replica_set = self.make_replicas(definition, replicas=1)
+        replica_set.setup()
+        self.assertEqual(
+            replica_set[0]._create_kwargs['network_aliases'], ['api', 'fake'])
+        self.assertEqual(
+            definition._create_kwargs['network_aliases'], ['api'])
+
+    def test_scale(self):
+        """
+        Replica sets can be scaled up and down, and the newest replicas are
+        removed first.
+        """
+        replica_set = self.make_replicas(replicas=1).setup()
+        first = replica_set[0]
+        replica_set.scale(4)
+        self.assertEqual(len(replica_set), 4)
+        self.assertEqual(replica_set.replicas, 4)
+        self.assertIs(replica_set[0], first)
+
+        removed = replica_set[2:]
+        replica_set.scale(2)
+        self.assertEqual(
+            [r.name for r in replica_set], ['fake_replica0', 'fake_replica1'])
+        self.assertFalse(any(r.created for r in removed))
+        with self.assertRaises(ValueError):
+            replica_set.scale(-1)
+
+    def test_setup_failure(self):
+        """
+        If a new replica fails to set up, all the new replicas are torn down
+        and the error is raised.
+        """
+        definition = FakeReplica(fail=['fake_replica2'])
+        replica_set = self.make_replicas(definition, replicas=1).setup()
+        with self.assertRaises(RuntimeError) as cm:
+            replica_set.scale(3)
+        self.assertEqual(str(cm.exception), 'fake_replica2 failed')
+        self.assertEqual([r.name for r in replica_set], ['fake_replica0'])
+        self.assertTrue(replica_set[0].created)
+
+    def test_host_ports(self):
+        """
+        We can get every replica's published port.
+        """
+        replica_set = self.make_replicas().setup()
+        self.assertEqual(replica_set.host_ports(), [
+            ('127.0.0.1', 'fake_replica0'), ('127.0.0.1', 'fake_replica1')])
+        self.assertEqual(replica_set.host_ports(80, 'udp'), [
+            ('127.0.0.1', 'fake_replica0/80/udp'),
+            ('127.0.0.1', 'fake_replica1/80/udp')])
+
+
+@dockertest()
+class TestReplicaSetWithDocker(unittest.TestCase):
+    def test_shared_alias(self):
+        """
+        Real replicas publish their own ports and share a network alias.
+        """
+        dh = DockerHelper()
+        self.addCleanup(dh.teardown)
+        replica_set = ReplicaSet(NginxContainer(), replicas=2, helper=dh)
+        self.addCleanup(replica_set.teardown)
+        replica_set.setup()
+
+        ports = replica_set.host_ports()
+        self.assertEqual(len(set(ports)), 2)
+        for replica in replica_set:
+            networks = replica.inner().attrs['NetworkSettings']['Networks']
+            [network] = networks.values()
+            self.assertIn('nginx', network['Aliases'])
+            self.assertIn(replica.name, network['Aliases'])
@@ -0,0 +1,192 @@
+import threading
+import time
+import unittest
+
+from seaworthy.stack import CriticalPath, StackDefinition
+
+
+class FakeDefinition:
+    """
+    Just enough of a resource definition to put in a stack, recording the
+    order of events in a shared log.
+    """
+
+    def __init__(self, name, log, delay=0.0, fail_setup=False):
+        self.name = name
+        self.log = log
+        self.delay = delay
+        self.fail_setup = fail_setup
+        self.helper = None
+        self.created = False
+
+    def setup(self, helper=None):
+        self.helper = helper
+        self.log.append(('start', self.name))
+        time.sleep(self.delay)
+        if self.fail_setup:
+            raise RuntimeError('{} failed'.format(self.name))
+        self.created = True
+        self.log.append(('setup', self.name))
+        return self
+
+    def teardown(self):
+        self.log.append(('teardown', self.name))
+        self.created = False
+
+
+class TestStackDefinition(unittest.TestCase):
+    def make_stack(self, **kw):
+        """
+        A diamond: ``db`` and ``cache`` have no dependencies, ``app`` depends
+        on both of them and ``web`` depends on ``app``.
+        """
+        self.log = []
+        stack = StackDefinition(helper='helper', **kw)
+        db = stack.add(FakeDefinition('db', self.log, 0.2))
+        cache = stack.add(FakeDefinition('cache', self.log, 0.05))
+        app = stack.add(
+            FakeDefinition('app', self.log, 0.1), depends_on=[db, cache])
+        stack.add(FakeDefinition('web', self.log), depends_on=['app'])
+        self.assertIs(stack['app'], app)
+        return stack
+
+    def names(self, waves):
+        return [[d.name for d in wave] for wave in waves]
+
+    def test_waves(self):
+        """
+        Definitions are grouped into waves by the depth of their
+        dependencies.
+        """
+        stack = self.make_stack()
+        self.assertEqual(
+            self.names(stack.waves()), [['db', 'cache'], ['app'], ['web']])
+        self.assertEqual(stack.dependencies('app'), ['db', 'cache'])
+        self.assertEqual(StackDefinition().waves(), [])
+
+    def test_add_errors(self):
+        """
+        Dependencies must already be in the stack, and names must be unique.
+        """
+        stack = StackDefinition()
+        with self.assertRaises(ValueError):
+            stack.add(FakeDefinition('app', []), depends_on=['db'])
+        stack.add(FakeDefinition('db', []))
+        with self.assertRaises(ValueError):
+            stack.add(FakeDefinition('db', []))
+        self.assertEqual(len(stack), 1)
+
+    def test_setup_order(self):
+        """
+        Each wave is set up concurrently, and only once its dependencies are
+        ready.
+        """
+        stack = self.make_stack()
+        start = time.monotonic()
+        self.assertIs(stack.setup(), stack)
+        elapsed = time.monotonic() - start
+
+        # db and cache overlap, so the stack takes the time of the critical
+        # path rather than the sum of all setups.
+        self.assertLess(elapsed, 0.2 + 0.05 + 0.1)
+        self.assertEqual(
+            set(self.log[:2]), {('start', 'db'), ('start', 'cache')})
+        self.assertLess(
+            self.log.index(('setup', 'db')), self.log.index(('start', 'app')))
+        self.assertLess(
+            self.log.index(('setup', 'app')), self.log.index(('start', 'web')))
+        self.assertTrue(stack.created)
+        for definition in stack:
+            self.assertTrue(definition.created)
+            self.assertEqual(definition.helper, 'helper')
+
+    def test_teardown_order(self):
+        """
+        Teardown happens in reverse wave order.
+        """
+        stack = self.make_stack()
+        with stack:
+            del self.log[:]
+        self.assertEqual(
+            self.log[:2], [('teardown', 'web'), ('teardown', 'app')])
+        self.assertEqual(
+            set(self.log[2:]), {('teardown', 'db'), ('teardown', 'cache')})
+        self.assertFalse(stack.created)
+
+    def test_workers(self):
+        """
+        The number of workers limits how many definitions in a wave are set up
+        at once.
+        """
+        log = []
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        class Counting(FakeDefinition):
+            def setup(self, helper=None):
+                with lock:
+                    active.append(self.name)
+                    peak.append(len(active))
+                super().setup(helper)
+                with lock:
+                    active.remove(self.name)
+
+        stack = StackDefinition(workers=2, helper='helper')
+        for i in range(5):
+            stack.add(Counting('c{}'.format(i), log, 0.05))
+        with stack:
+            self.assertEqual(max(peak), 2)
+
+    def test_setup_failure(self):
+        """
+        If a definition fails to set up, everything that was set up is torn
+        down and the error is raised.
+        """
+        log = []
+        stack = StackDefinition(helper='helper')
+        db = stack.add(FakeDefinition('db', log))
+        broken = stack.add(FakeDefinition('broken', log, fail_setup=True))
+        stack.add(FakeDefinition('app', log), depends_on=[db, broken])
+
+        with self.assertRaisesRegex(RuntimeError, 'broken failed'):
+            stack.setup()
+        self.assertIn(('teardown', 'db'), log)
+        self.assertNotIn(('teardown', 'broken'), log)
+        self.assertNotIn(('start', 'app'), log)
+        self.assertFalse(stack.created)
+
+    def test_no_helper(self):
+        """
+        A helper must be provided to set up the stack.
+        """
+        with self.assertRaises(RuntimeError):
+            StackDefinition().setup()
+
+    def test_critical_path(self):
+        """
+        The critical path is the chain of dependencies with the largest total
+        setup time.
+        """
+        stack = self.make_stack()
+        self.assertEqual(stack.critical_path().seconds, 0.0)
+
+        stack.setup_seconds = {'db': 2.0, 'cache': 3.0, 'app': 1.0, 'web': 0.5}
+        self.assertEqual(
+            stack.critical_path(),
+            CriticalPath(['cache', 'app', 'web'], 4.5))
+
+        stack.setup_seconds['db'] = 6.0
+        self.assertEqual(
+            stack.critical_path(), CriticalPath(['db', 'app', 'web'], 7.5))
+
+        with stack:
+            path = stack.critical_path()
+        self.assertEqual(path.names, ['db', 'app', 'web'])
+        self.assertGreaterEqual(path.seconds, 0.2 + 0.1)
+        self.assertEqual(
+            set(stack.setup_seconds), {'db', 'cache', 'app', 'web'})
+
+    def test_critical_path_empty(self):
+        self.assertEqual(
+            StackDefinition().critical_path(), CriticalPath([], 0.0))
@@ -0,0 +1,105 @@
+import threading
+import unittest
+
+from seaworthy import timing
+from seaworthy.definitions import ContainerDefinition
+
+
+class TestTiming(unittest.TestCase):
+    def test_phase_without_operation(self):
+        """
+        Phases outside a timed operation do nothing.
+        """
+        self.assertIsNone(timing.current_operation())
+        with timing.phase('create'):
+            pass
+        self.assertIsNone(timing.current_operation())
+
+    def test_operation(self):
+        """
+        An operation records its phases and is stored on the definition.
+        """
+        definition = ContainerDefinition('fake', 'fake:latest')
+        with timing.operation(definition, 'setup') as t:
+            self.assertIs(timing.current_operation(), t)
+            with timing.phase('create'):
+                pass
+            with timing.phase('start'):
+                pass
+            with timing.phase('start'):
+                pass
+
+        self.assertIsNone(timing.current_operation())
+        self.assertIs(definition.timings['setup'], t)
+        self.assertEqual(t.name, 'fake')
+        self.assertEqual(
+            [p.name for p in t.phases], ['create', 'start', 'start'])
+        self.assertEqual(
+            t.phase_seconds('start'),
+            t.phases[1].seconds + t.phases[2].seconds)
+        self.assertEqual(t.phase_seconds('wait_for_start'), 0.0)
+        self.assertGreaterEqual(t.seconds, 0.0)
+
+    def test_nested_operation(self):
+        """
+        Inner operations contribute their phases to the outer one.
+        """
+        definition = ContainerDefinition('fake', 'fake:latest')
+        with timing.operation(definition, 'setup') as outer:
+            with timing.operation(definition, 'run') as inner:
+                with timing.phase('create'):
+                    pass
+        self.assertIs(inner, outer)
+        self.assertEqual(list(definition.timings), ['setup'])
+        self.assertEqual([p.name for p in outer.phases], ['create'])
+
+    def test_listeners(self):
+        """
+        Definition listeners are called before global ones, and errors in
+        listeners are logged rather than raised.
+        """
+        calls = []
+        definition = ContainerDefinition('fake', 'fake:latest')
+        definition.timing_listeners.append(
+            lambda d, t: calls.append(('definition', t.operation)))
+
+        def global_listener(d, t):
+            calls.append(('global', t.operation))
+
+        def broken(d, t):
+            raise ValueError('oops')
+
+        timing.add_listener(broken)
+        self.addCleanup(timing.remove_listener, broken)
+        timing.add_listener(global_listener)
+        self.addCleanup(timing.remove_listener, global_listener)
+
+        with self.assertLogs('seaworthy.timing', 'ERROR'):
+            with timing.operation(definition, 'halt'):
+                pass
+        self.assertEqual(
+            calls, [('definition', 'halt'), ('global', 'halt')])
+
+    def test_failed(self):
+        """
+        Operations that raise are marked as failed.
+        """
+        definition = ContainerDefinition('fake', 'fake:latest')
+        with self.assertRaises(RuntimeError):
+            with timing.operation(definition, 'setup'):
+                raise RuntimeError()
+        self.assertTrue(definition.timings['setup'].failed)
+        self.assertIsNone(timing.current_operation())
+
+    def test_per_thread(self):
+        """
+        Operations on different threads are timed separately.
+        """
+        definition = ContainerDefinition('fake', 'fake:latest')
+        seen = []
+        with timing.operation(definition, 'setup'):
+            thread = threading.Thread(
+                target=lambda: seen.append(timing.current_operation()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
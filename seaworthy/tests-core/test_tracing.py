@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from seaworthy import timing, tracing
+from seaworthy.definitions import ContainerDefinition
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        # Hide any tracing that the test run itself is doing.
+        recorder = tracing.stop_tracing()
+        self.addCleanup(setattr, tracing, '_recorder', recorder)
+
+    def start(self, process_name='test'):
+        recorder = tracing.start_tracing(process_name)
+        self.addCleanup(tracing.stop_tracing)
+        return recorder
+
+    def spans(self, recorder):
+        return [e for e in recorder.events() if e['ph'] == 'X']
+
+    def test_off(self):
+        """
+        Spans do nothing until tracing is started.
+        """
+        self.assertFalse(tracing.tracing_enabled())
+        with tracing.span('nothing'):
+            pass
+        self.assertIsNone(tracing.stop_tracing())
+
+    def test_span(self):
+        """
+        Spans are recorded as complete events in microseconds, with their
+        arguments.
+        """
+        recorder = self.start()
+        self.assertTrue(tracing.tracing_enabled())
+        with tracing.span('outer', 'test', container='c'):
+            with tracing.span('inner'):
+                pass
+        with self.assertRaises(ValueError):
+            with tracing.span('failing'):
+                raise ValueError()
+
+        inner, outer, failing = self.spans(recorder)
+        self.assertEqual(outer['name'], 'outer')
+        self.assertEqual(outer['cat'], 'test')
+        self.assertEqual(outer['args'], {'container': 'c'})
+        self.assertEqual(outer['pid'], os.getpid())
+        self.assertEqual(inner['cat'], 'seaworthy')
+        self.assertNotIn('args', inner)
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['dur'], inner['dur'])
+        self.assertEqual(failing['name'], 'failing')
+
+        self.assertIs(tracing.stop_tracing(), recorder)
+        self.assertFalse(tracing.tracing_enabled())
+
+    def test_metadata(self):
+        """
+        The process and every thread that recorded a span are named.
+        """
+        recorder = self.start('gw1')
+
+        def record():
+            with tracing.span('threaded'):
+                pass
+
+        thread = threading.Thread(target=record, name='worker-thread')
+        thread.start()
+        thread.join()
+        with tracing.span('main'):
+            pass
+
+        metadata = [e for e in recorder.events() if e['ph'] == 'M']
+        names = {(e['name'], e['args']['name']) for e in metadata}
+        self.assertEqual(names, {
+            ('process_name', 'gw1'),
+            ('thread_name', 'worker-thread'),
+            ('thread_name', threading.current_thread().name),
+        })
+        self.assertEqual(
+            {s['tid'] for s in self.spans(recorder)},
+            {thread.ident, threading.get_ident()})
+
+    def test_process_name_default(self):
+        """
+        Processes are named after their xdist worker by default.
+        """
+        os.environ['PYTEST_XDIST_WORKER'] = 'gw3'
+        try:
+            self.assertEqual(tracing.TraceRecorder().process_name, 'gw3')
+        finally:
+            del os.environ['PYTEST_XDIST_WORKER']
+        self.assertEqual(tracing.TraceRecorder().process_name, 'seaworthy')
+
+    def test_lifecycle_spans(self):
+        """
+        Timed lifecycle operations and their phases are recorded as spans.
+        """
+        recorder = self.start()
+        definition = ContainerDefinition('db', 'fake:latest')
+        with timing.operation(definition, 'setup'):
+            with timing.phase('create'):
+                pass
+
+        phase, operation = self.spans(recorder)
+        self.assertEqual(operation['name'], 'setup db')
+        self.assertEqual(operation['cat'], 'lifecycle')
+        self.assertEqual(
+            operation['args'], {'definition': 'db', 'operation': 'setup'})
+        self.assertEqual(phase['name'], 'create')
+        self.assertEqual(phase['args'], {'definition': 'db'})
+
+    def test_write(self):
+        """
+        The trace is written as a JSON object with a list of events, and can
+        include events from other processes.
+        """
+        recorder = self.start()
+        with tracing.span('local'):
+            pass
+        other = tracing.TraceRecorder('gw0')
+        other.pid += 1
+        other.add_span('remote', 'test', 1.0, 2.0)
+        recorder.extend(other.events())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'trace.json')
+            recorder.write(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace['traceEvents']
+        self.assertEqual(
+            sorted(e['name'] for e in events if e['ph'] == 'X'),
+            ['local', 'remote'])
+        self.assertEqual(
+            sorted(e['args']['name'] for e in events
+                   if e['name'] == 'process_name'),
+            ['gw0', 'test'])
+        [remote] = [e for e in events if e['name'] == 'remote']
+        self.assertEqual((remote['ts'], remote['dur']), (1e6, 1e6))
@@ -0,0 +1,193 @@
+import io
+import json
+import threading
+import unittest
+from unittest import mock
+
+import docker
+
+from seaworthy.checks import docker_client, dockertest
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.helpers import DockerHelper, fetch_images
+from seaworthy.usage import (
+    FIELDS, ResourceSampler, UsageSeries, parse_api_stats, percentile)
+
+IMG = 'nginx:alpine'
+
+
+def counters(**values):
+    sample = dict.fromkeys(FIELDS, 0)
+    sample.update(values)
+    return sample
+
+
+def fake_container(name='fake'):
+    container = mock.Mock(spec=ContainerDefinition)
+    container.name = name
+    return container
+
+
+class TestParseApiStats(unittest.TestCase):
+    def test_parse(self):
+        """
+        Counters are taken from the stats, with the inactive page cache left
+        out of the memory usage.
+        """
+        stats = {
+            'cpu_stats': {'cpu_usage': {'total_usage': 2500000000}},
+            'memory_stats': {
+                'usage': 10000, 'stats': {'total_inactive_file': 3000}},
+            'blkio_stats': {'io_service_bytes_recursive': [
+                {'major': 8, 'minor': 0, 'op': 'Read', 'value': 100},
+                {'major': 8, 'minor': 0, 'op': 'Write', 'value': 20},
+                {'major': 8, 'minor': 16, 'op': 'read', 'value': 5},
+                {'major': 8, 'minor': 0, 'op': 'Total', 'value': 120},
+            ]},
+            'networks': {
+                'eth0': {'rx_bytes': 10, 'tx_bytes': 1},
+                'eth1': {'rx_bytes': 20, 'tx_bytes': 2},
+            },
+        }
+        self.assertEqual(parse_api_stats(stats), {
+            'cpu_seconds': 2.5, 'memory_bytes': 7000,
+            'blkio_read_bytes': 105, 'blkio_write_bytes': 20,
+            'net_rx_bytes': 30, 'net_tx_bytes': 3,
+        })
+
+    def test_missing(self):
+        """
+        Stats for a container that isn't running are mostly missing, which
+        counts as zero.
+        """
+        self.assertEqual(
+            parse_api_stats({'blkio_stats': {}, 'networks': None}),
+            counters())
+
+
+class TestUsageSeries(unittest.TestCase):
+    def make_series(self, memory):
+        series = UsageSeries()
+        for i, value in enumerate(memory):
+            series.append(1000.0 + i, counters(memory_bytes=value))
+        return series
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4], 100), 4)
+        self.assertEqual(percentile([7], 90), 7)
+
+    def test_summary(self):
+        series = self.make_series([30, 10, 20, 40])
+        self.assertEqual(len(series), 4)
+        summary = series.summary('memory_bytes', percentiles=(50, 100))
+        self.assertEqual(
+            (summary.count, summary.min, summary.max, summary.mean),
+            (4, 10, 40, 25))
+        self.assertEqual(summary.percentiles, {50: 25, 100: 40})
+        self.assertEqual(set(series.summaries()), set(FIELDS))
+        self.assertIsNone(UsageSeries().summary('cpu_seconds'))
+        self.assertEqual(series.latest()['memory_bytes'], 40)
+        self.assertIsNone(UsageSeries().latest())
+
+    def test_export(self):
+        """
+        Series can be written as CSV with a header row, or as JSON columns.
+        """
+        series = self.make_series([10, 20])
+        f = io.StringIO()
+        series.write_csv(f)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[0], ','.join(('timestamp',) + FIELDS))
+        self.assertEqual(lines[1], '1000.0,0.0,10.0,0.0,0.0,0.0,0.0')
+        self.assertEqual(len(lines), 3)
+
+        f = io.StringIO()
+        series.write_json(f)
+        data = json.loads(f.getvalue())
+        self.assertEqual(data['timestamp'], [1000.0, 1001.0])
+        self.assertEqual(data['memory_bytes'], [10, 20])
+
+
+class TestResourceSampler(unittest.TestCase):
+    def test_background(self):
+        """
+        The sampler samples in the background until it is stopped.
+        """
+        sampled = threading.Semaphore(0)
+        values = iter(range(1000))
+
+        def source(inner):
+            sampled.release()
+            return counters(cpu_seconds=next(values))
+
+        sampler = ResourceSampler(fake_container(), 0.001, source=source)
+        self.addCleanup(sampler.stop)
+        with sampler:
+            self.assertTrue(sampler.running)
+            for _ in range(3):
+                self.assertTrue(sampled.acquire(timeout=5))
+        self.assertFalse(sampler.running)
+        count = len(sampler.series)
+        self.assertGreaterEqual(count, 3)
+        self.assertEqual(
+            list(sampler.series.column('cpu_seconds')), list(range(count)))
+
+    def test_container_removed(self):
+        """
+        Sampling stops when the container goes away, and other errors are
+        skipped.
+        """
+        results = [ValueError('oops'), counters(memory_bytes=1),
+                   docker.errors.NotFound('gone')]
+
+        def source(inner):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        sampler = ResourceSampler(fake_container(), 0.001, source=source)
+        sampler.start()
+        sampler._thread.join(timeout=5)
+        self.assertFalse(sampler.running)
+        self.assertEqual(list(sampler.series.column('memory_bytes')), [1])
+        sampler.stop()
+
+    def test_definition_teardown(self):
+        """
+        Samplers started by a definition are stopped when it is torn down.
+        """
+        definition = ContainerDefinition('sampled', IMG)
+        definition._inner = mock.Mock()
+        definition.set_helper(mock.Mock())
+        sampler = definition.sample_resources(
+            0.001, source=lambda inner: counters())
+        self.assertTrue(sampler.running)
+        definition.teardown()
+        self.assertFalse(sampler.running)
+        self.assertEqual(definition.clone('other')._samplers, [])
+
+
+@dockertest()
+class TestResourceSamplerWithDocker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with docker_client() as client:
+            fetch_images(client, [IMG])
+
+    def test_nginx(self):
+        """
+        We can sample a real container's resource usage.
+        """
+        dh = DockerHelper()
+        self.addCleanup(dh.teardown)
+        container = ContainerDefinition(
+            'sampled', IMG, wait_patterns=[r'.*'], helper=dh)
+        container.setup()
+        self.addCleanup(container.teardown)
+
+        sampler = container.sample_resources(interval=0.1)
+        sampler.sample()
+        series = sampler.stop()
+        self.assertGreater(series.summary('memory_bytes').max, 0)
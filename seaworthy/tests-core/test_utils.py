@@ -2,7 +2,7 @@ import unittest
 
 from docker.models.containers import ExecResult
 
-from seaworthy.utils import output_lines
+from seaworthy.utils import output_lines, parse_rfc3339_nano
 
 
 class TestOutputLinesFunc(unittest.TestCase):
@@ -18,3 +18,27 @@ class TestOutputLinesFunc(unittest.TestCase):
     def test_custom_encoding(self):
         """String lines can be parsed using a custom encoding."""
         self.assertEqual(output_lines(b'\xe1', encoding='latin1'), ['á'])
+
+
+class TestParseRfc3339NanoFunc(unittest.TestCase):
+    def test_parse(self):
+        """
+        Times are parsed with up to nanosecond precision, taking the timezone
+        offset into account.
+        """
+        self.assertEqual(
+            parse_rfc3339_nano('2018-12-06T10:11:12.123456789Z'),
+            1544091072123456789)
+        self.assertEqual(
+            parse_rfc3339_nano('2018-12-06T12:11:12.5+02:00'),
+            1544091072500000000)
+        self.assertEqual(
+            parse_rfc3339_nano('2018-12-06T07:41:12-02:30'),
+            1544091072000000000)
+
+    def test_invalid(self):
+        """Unknown formats raise an error."""
+        with self.assertRaises(ValueError) as cm:
+            parse_rfc3339_nano('yesterday')
+        self.assertEqual(
+            str(cm.exception), "Unknown timestamp format: 'yesterday'")
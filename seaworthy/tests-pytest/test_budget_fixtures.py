@@ -0,0 +1,86 @@
+"""
+These tests use the ``pytester`` plugin to check that fixtures created with
+``resource_fixture`` check the budgets of their containers. The containers
+have mock helpers and fake resource usage, so Docker isn't needed.
+"""
+
+CONFTEST = """
+from unittest import mock
+
+import pytest
+
+from seaworthy.budgets import Budget
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.pytest.fixtures import resource_fixture
+from seaworthy.usage import FIELDS
+
+
+def fake_container(name, memory_bytes, **kwargs):
+    container = ContainerDefinition(name, 'nginx:alpine', **kwargs)
+    sample = dict.fromkeys(FIELDS, 0)
+    sample['memory_bytes'] = memory_bytes
+
+    def sample_resources(interval=1.0, **kwargs):
+        return ContainerDefinition.sample_resources(
+            container, interval, source=lambda inner: sample)
+    container.sample_resources = sample_resources
+    return container
+
+
+@pytest.fixture
+def docker_helper():
+    return mock.Mock()
+
+
+MIB = 1024 * 1024
+
+LARGE = fake_container(
+    'large', 2 * MIB, budget=Budget(startup_seconds=60, max_rss_bytes=MIB))
+
+small = resource_fixture(
+    fake_container('small', MIB, budget=Budget(max_rss_bytes=MIB)), 'small')
+large = resource_fixture(LARGE, 'large')
+unbudgeted = resource_fixture(fake_container('unbudgeted', 2 * MIB), 'free')
+"""
+
+
+def test_within_budget(testdir):
+    """
+    Containers within their budgets, or without budgets, pass.
+    """
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile("""
+        def test_small(small):
+            assert small.created
+
+        def test_unbudgeted(free):
+            assert free.created
+    """)
+
+    result = testdir.runpytest()
+    result.assert_outcomes(passed=2)
+
+
+def test_over_budget(testdir):
+    """
+    A container over its budget fails the test at teardown, with the measured
+    values and the budget in the error. The container is still torn down.
+    """
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile("""
+        import conftest
+
+        def test_large(large):
+            assert large.created
+
+        def test_torn_down():
+            assert not conftest.LARGE.created
+    """)
+
+    result = testdir.runpytest()
+    result.assert_outcomes(passed=2, errors=1)
+    result.stdout.fnmatch_lines([
+        '*BudgetExceeded: large is over budget:',
+        '*max_rss_bytes: measured 2097152 bytes (2.0 MiB), '
+        'budget 1048576 bytes (1.0 MiB)',
+    ])
@@ -0,0 +1,180 @@
+from unittest import mock
+
+import pytest
+
+from seaworthy import timing
+from seaworthy.definitions import ContainerDefinition
+from seaworthy.pytest import durations
+from seaworthy.replicas import ReplicaSet
+
+
+class FakeTerminalReporter:
+    def __init__(self, config):
+        self.config = config
+        self.lines = []
+
+    def write_sep(self, sep, title):
+        self.lines.append(title)
+
+    def write_line(self, line):
+        self.lines.append(line)
+
+
+class FakeConfig:
+    def __init__(self, count):
+        self.count = count
+
+    def getoption(self, name):
+        assert name == 'seaworthy_durations'
+        return self.count
+
+
+@pytest.fixture(autouse=True)
+def isolate_plugin(monkeypatch):
+    """
+    Hide the state of the plugin in the pytest run that runs these tests, in
+    case ``--seaworthy-durations`` is used for it.
+    """
+    monkeypatch.setattr(durations, '_recorder', None)
+    monkeypatch.setattr(timing, '_listeners', [])
+
+
+@pytest.fixture
+def container():
+    """
+    A container definition with a mock helper, so that it can be set up and
+    torn down without Docker.
+    """
+    container = ContainerDefinition('timed', 'nginx:alpine')
+    container.set_helper(mock.Mock())
+    return container
+
+
+@pytest.fixture
+def recorder():
+    recorder = durations.DurationsRecorder()
+    timing.add_listener(recorder)
+    yield recorder
+    timing.remove_listener(recorder)
+
+
+class TestDurationsRecorder:
+    def test_fixture_scope(self, recorder, container):
+        """
+        Only the operations run by fixtures are recorded. Setups have a
+        separate row for the wait for the container to start, and halts
+        count as teardowns.
+        """
+        container.setup()
+        container.teardown()
+        assert recorder.slowest() == []
+
+        with durations.fixture_scope('web'):
+            container.setup()
+        with durations.fixture_scope('web'):
+            container.halt()
+
+        rows = sorted(
+            (d.fixture, d.definition, d.image, d.kind)
+            for d in recorder.slowest())
+        assert rows == [
+            ('web', 'timed', 'nginx:alpine', 'setup'),
+            ('web', 'timed', 'nginx:alpine', 'teardown'),
+            ('web', 'timed', 'nginx:alpine', 'wait'),
+        ]
+
+    def test_worker_threads(self, recorder, container):
+        """
+        Setups made on other threads while a fixture is being set up, such as
+        the replicas of a replica set, are charged to the fixture.
+        """
+        replicas = ReplicaSet(container, replicas=2, helper=container.helper)
+        with durations.fixture_scope('web'):
+            replicas.setup()
+        replicas.teardown()
+
+        rows = sorted(
+            (d.fixture, d.definition, d.kind) for d in recorder.slowest()
+            if d.kind == 'setup')
+        assert rows == [
+            ('web', 'timed_replica0', 'setup'),
+            ('web', 'timed_replica1', 'setup'),
+        ]
+
+    def test_slowest(self):
+        """
+        Durations are sorted slowest first and limited to the count, where
+        zero means all of them.
+        """
+        recorder = durations.DurationsRecorder()
+        for seconds in [1.0, 3.0, 2.0]:
+            recorder._durations.append(durations.FixtureDuration(
+                'f', 'd', None, 'setup', seconds))
+        assert [d.seconds for d in recorder.slowest(2)] == [3.0, 2.0]
+        assert [d.seconds for d in recorder.slowest(0)] == [3.0, 2.0, 1.0]
+
+    def test_format(self):
+        """
+        Each row shows the duration, kind, fixture, definition, image, phases
+        and API calls.
+        """
+        duration = durations.FixtureDuration(
+            'postgresql', 'db', 'postgres:10', 'setup', 3.456,
+            [timing.PhaseTiming('create', 0.0, 0.5),
+             timing.PhaseTiming('wait_for_start', 0.5, 2.9)],
+            api_calls=7)
+        assert duration.format() == (
+            '3.46s setup    postgresql [db] (postgres:10) -- '
+            'create 0.50s, wait_for_start 2.90s -- 7 API calls')
+
+        duration = durations.FixtureDuration('vol', 'v', None, 'wait', 0.1)
+        assert duration.format() == '0.10s wait     vol [v]'
+
+
+class TestPluginHooks:
+    def test_disabled(self):
+        """
+        Without the option, nothing is recorded or reported.
+        """
+        config = FakeConfig(None)
+        durations.pytest_configure(config)
+        assert not durations.enabled()
+
+        reporter = FakeTerminalReporter(config)
+        durations.pytest_terminal_summary(reporter)
+        assert reporter.lines == []
+
+    def test_report(self, container):
+        """
+        With the option, timings from fixtures are reported in the terminal
+        summary.
+        """
+        config = FakeConfig(1)
+        durations.pytest_configure(config)
+        try:
+            assert durations.enabled()
+            with durations.fixture_scope('web'):
+                container.setup()
+
+            reporter = FakeTerminalReporter(config)
+            durations.pytest_terminal_summary(reporter)
+        finally:
+            durations.pytest_unconfigure(config)
+
+        assert not durations.enabled()
+        assert len(reporter.lines) == 2
+        assert reporter.lines[0] == 'slowest 1 seaworthy durations'
+        assert ' web [timed] (nginx:alpine)' in reporter.lines[1]
+
+    def test_report_empty(self):
+        config = FakeConfig(0)
+        durations.pytest_configure(config)
+        try:
+            reporter = FakeTerminalReporter(config)
+            durations.pytest_terminal_summary(reporter)
+        finally:
+            durations.pytest_unconfigure(config)
+        assert reporter.lines == [
+            'slowest seaworthy durations',
+            'No containers were set up by seaworthy fixtures.',
+        ]
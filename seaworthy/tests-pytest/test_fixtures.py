@@ -6,10 +6,11 @@ from seaworthy.checks import docker_client
 from seaworthy.definitions import (
     ContainerDefinition, NetworkDefinition, VolumeDefinition)
 from seaworthy.helpers import DockerHelper, fetch_images
+from seaworthy.pool import ContainerPool
 from seaworthy.pytest.checks import dockertest
 from seaworthy.pytest.fixtures import (
-    clean_container_fixtures, docker_helper_fixture, image_fetch_fixture,
-    resource_fixture)
+    clean_container_fixtures, container_pool_fixtures, docker_helper_fixture,
+    image_fetch_fixture, resource_fixture)
 
 
 # FIXME 2018-12-06: https://github.com/praekeltfoundation/seaworthy/issues/84
@@ -146,6 +147,31 @@ class TestCleanContainerFixturesFunc:
         assert not container.created
 
 
+@dockertest()
+class TestContainerPoolFixturesFunc:
+    def test_setup_teardown(self, docker_helper):
+        """
+        The pool fixture should yield a set up pool, and afterwards tear down
+        the pool and any containers in it.
+        """
+        pool = ContainerPool(
+            ContainerDefinition(name='test', image=IMG), size=1)
+        pool_fixture, lease_fixture = container_pool_fixtures(pool, 'test')
+        fixture_gen = pool_fixture(docker_helper)
+        assert next(fixture_gen) is pool
+        assert pool.started
+
+        container = pool.acquire()
+        assert container.inner().status == 'running'
+
+        # Test things are torn down
+        with pytest.raises(StopIteration):
+            next(fixture_gen)
+
+        assert not pool.started
+        assert not container.created
+
+
 @dockertest()
 class PytestFixtureMixin:
     def make_definition(self, name):
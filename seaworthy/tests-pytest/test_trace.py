@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from seaworthy import tracing
+from seaworthy.pytest import trace
+
+
+class FakeConfig:
+    def __init__(self, path, worker=False):
+        self.path = path
+        if worker:
+            self.workerinput = {}
+            self.workeroutput = {}
+
+    def getoption(self, name):
+        assert name == 'seaworthy_trace'
+        return self.path
+
+
+class FakeSession:
+    def __init__(self, config):
+        self.config = config
+
+
+class FakeNode:
+    def __init__(self, config, workeroutput):
+        self.config = config
+        self.workeroutput = workeroutput
+
+
+@pytest.fixture(autouse=True)
+def isolate_tracing(monkeypatch):
+    """
+    Hide the tracing state of the pytest run that runs these tests, in case
+    ``--seaworthy-trace`` is used for it.
+    """
+    monkeypatch.setattr(tracing, '_recorder', None)
+
+
+class TestTraceHooks:
+    def test_disabled(self):
+        """
+        Without the option, tracing isn't started.
+        """
+        config = FakeConfig(None)
+        trace.pytest_configure(config)
+        assert not tracing.tracing_enabled()
+        trace.pytest_sessionfinish(FakeSession(config))
+        trace.pytest_unconfigure(config)
+
+    def test_write(self, tmpdir):
+        """
+        With the option, spans are written to the given path when pytest
+        finishes.
+        """
+        path = str(tmpdir.join('trace.json'))
+        config = FakeConfig(path)
+        trace.pytest_configure(config)
+        assert tracing.tracing_enabled()
+        with tracing.span('setup db'):
+            pass
+        trace.pytest_sessionfinish(FakeSession(config))
+        trace.pytest_unconfigure(config)
+        assert not tracing.tracing_enabled()
+
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        assert [e['name'] for e in events if e['ph'] == 'X'] == ['setup db']
+        assert {'name': 'pytest'} in [
+            e['args'] for e in events if e['name'] == 'process_name']
+
+    def test_xdist(self, tmpdir, monkeypatch):
+        """
+        Workers send their spans to the controller instead of writing them,
+        and the controller writes them all in one file.
+        """
+        path = str(tmpdir.join('trace.json'))
+        monkeypatch.setenv('PYTEST_XDIST_WORKER', 'gw0')
+        worker = FakeConfig(path, worker=True)
+        trace.pytest_configure(worker)
+        with tracing.span('setup db'):
+            pass
+        trace.pytest_sessionfinish(FakeSession(worker))
+        trace.pytest_unconfigure(worker)
+        assert not tmpdir.join('trace.json').check()
+        monkeypatch.delenv('PYTEST_XDIST_WORKER')
+
+        controller = FakeConfig(path)
+        trace.pytest_configure(controller)
+        trace.pytest_testnodedown(
+            FakeNode(controller, worker.workeroutput), None)
+        trace.pytest_unconfigure(controller)
+
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        assert [e['name'] for e in events if e['ph'] == 'X'] == ['setup db']
+        assert sorted(e['args']['name'] for e in events
+                      if e['name'] == 'process_name') == ['gw0', 'pytest']
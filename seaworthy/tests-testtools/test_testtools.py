@@ -3,8 +3,14 @@ import unittest
 from testtools.assertions import assert_that
 from testtools.matchers import Not
 
+from seaworthy.budgets import Budget
+from seaworthy.definitions import ContainerDefinition
 from seaworthy.ps import PsRow, PsTree
-from seaworthy.testtools import MatchesPsTree
+from seaworthy.testtools import (
+    MatchesBudget, MatchesPsTree, StartsWithin, UsesAtMostCpu,
+    UsesAtMostMemory)
+from seaworthy.timing import LifecycleTiming
+from seaworthy.usage import FIELDS, UsageSeries
 
 
 class TestMatchesPsTree(unittest.TestCase):
@@ -217,3 +223,71 @@ class TestMatchesPsTree(unittest.TestCase):
                 MatchesPsTree('appuser', 'app --child2'),
             ]),
         ])))
+
+
+class TestBudgetMatchers(unittest.TestCase):
+    def make_container(self, setup_seconds=1.5, budget=None):
+        container = ContainerDefinition('web', 'nginx:alpine', budget=budget)
+        container.timings['setup'] = LifecycleTiming(
+            'web', 'setup', 0.0, setup_seconds)
+        return container
+
+    def make_series(self, memory, cpu):
+        series = UsageSeries()
+        sample = dict.fromkeys(FIELDS, 0)
+        sample.update(memory_bytes=memory, cpu_seconds=cpu)
+        series.append(0, sample)
+        return series
+
+    def test_starts_within(self):
+        """
+        StartsWithin matches containers that set up quickly enough, and
+        describes the mismatch with the measured time and the budget.
+        """
+        container = self.make_container(setup_seconds=1.5)
+        assert_that(container, StartsWithin(2))
+
+        mismatch = StartsWithin(1).match(container)
+        assert mismatch.describe() == '\n'.join([
+            'web is over budget:',
+            '  startup_seconds: measured 1.500s, budget 1.000s',
+        ])
+
+    def test_resource_usage(self):
+        """
+        UsesAtMostMemory and UsesAtMostCpu check a series of samples.
+        """
+        container = self.make_container()
+        series = self.make_series(memory=2048, cpu=3.0)
+        assert_that(container, UsesAtMostMemory(2048, series=series))
+        assert_that(container, UsesAtMostCpu(3.0, series=series))
+        assert_that(container, Not(UsesAtMostMemory(1024, series=series)))
+
+        mismatch = UsesAtMostCpu(2.5, series=series).match(container)
+        assert 'max_cpu_seconds: measured 3.000s, budget 2.500s' in (
+            mismatch.describe())
+
+        # Without samples, and with the container not created, nothing can
+        # be measured.
+        mismatch = UsesAtMostMemory(1024).match(container)
+        assert 'max_rss_bytes: not measured' in mismatch.describe()
+
+    def test_matches_budget(self):
+        """
+        MatchesBudget defaults to the container's own budget.
+        """
+        container = self.make_container(
+            budget=Budget(startup_seconds=1, max_rss_bytes=1024))
+        series = self.make_series(memory=1024, cpu=0)
+        mismatch = MatchesBudget(series=series).match(container)
+        assert [v.name for v in mismatch.violations] == ['startup_seconds']
+        assert_that(container, MatchesBudget(
+            Budget(startup_seconds=2), series=series))
+
+    def test_matches_no_budget(self):
+        """
+        MatchesBudget needs a budget, either given or from the container.
+        """
+        with self.assertRaises(ValueError) as cm:
+            MatchesBudget().match(self.make_container())
+        assert str(cm.exception) == 'No budget given and web has none.'
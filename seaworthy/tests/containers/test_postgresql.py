@@ -92,3 +92,20 @@ class TestPostgreSQLContainer:
         ]
         postgresql.clean()
         assert postgresql.list_tables() == []
+
+    def test_snapshot(self, docker_helper):
+        """
+        A PostgreSQL container started from a snapshot has the tables that
+        were created by the initialiser.
+        """
+        def create_table(container):
+            container.exec_psql('CREATE TABLE snapped(name varchar(40))')
+
+        snapshot = PostgreSQLContainer(name='snapshot')
+        snapshot.setup_snapshot(create_table, helper=docker_helper)
+        try:
+            assert snapshot.list_tables() == [
+                ['public', 'snapped', 'table', snapshot.user],
+            ]
+        finally:
+            snapshot.teardown()
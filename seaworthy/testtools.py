@@ -8,6 +8,9 @@ pieces to make Seaworthy work better with testtools.
 
 from testtools.matchers import MatchesSetwise, MatchesStructure, Mismatch
 
+from seaworthy.budgets import Budget, describe_violations, measure
+from seaworthy.usage import UsageSeries
+
 
 class PsTreeMismatch(Mismatch):
     """
@@ -77,3 +80,98 @@ class MatchesPsTree:
         if fields_mm is not None or children_mm is not None:
             return PsTreeMismatch(
                 self.row_fields, len(self.children), fields_mm, children_mm)
+
+
+class BudgetMismatch(Mismatch):
+    """
+    Mismatch for a container that is over its performance budget.
+    """
+
+    def __init__(self, name, violations):
+        self.name = name
+        self.violations = violations
+
+    def describe(self):
+        """
+        Describe the mismatch, with the measured values and the budget.
+        """
+        return describe_violations(self.name, self.violations)
+
+
+class MatchesBudget:
+    """
+    Matches a container definition that is within a
+    :class:`~seaworthy.budgets.Budget`::
+
+        self.assertThat(container, MatchesBudget(Budget(startup_seconds=5)))
+
+    Memory and CPU usage are taken from ``series`` if it is given, and
+    otherwise from a single sample taken when matching.
+    """
+
+    def __init__(self, budget=None, series=None):
+        """
+        :param budget:
+            The :class:`~seaworthy.budgets.Budget`. Defaults to the budget of
+            the matched definition.
+        :param series:
+            A :class:`~seaworthy.usage.UsageSeries` of the container's
+            resource usage, such as the ``series`` of a sampler started with
+            :meth:`~seaworthy.definitions.ContainerDefinition.sample_resources`.
+        """
+        self.budget = budget
+        self.series = series
+
+    def __str__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.budget)
+
+    def match(self, definition):
+        """
+        Return ``None`` if the definition is within the budget, a
+        :class:`BudgetMismatch` otherwise.
+
+        :raises ValueError:
+            If no budget was given and the definition doesn't have one.
+        """
+        budget = self.budget
+        if budget is None:
+            budget = definition.budget
+        if budget is None:
+            raise ValueError('No budget given and {} has none.'.format(
+                definition.name))
+        series = self.series
+        if series is None and not budget.needs_sampling():
+            series = UsageSeries()
+        violations = budget.violations(measure(definition, series))
+        if violations:
+            return BudgetMismatch(definition.name, violations)
+
+
+class StartsWithin(MatchesBudget):
+    """
+    Matches a container definition whose latest setup took at most the given
+    number of seconds.
+    """
+
+    def __init__(self, seconds):
+        super().__init__(Budget(startup_seconds=seconds))
+
+
+class UsesAtMostMemory(MatchesBudget):
+    """
+    Matches a container definition whose memory usage is at most the given
+    number of bytes. See :class:`MatchesBudget` for ``series``.
+    """
+
+    def __init__(self, max_rss_bytes, series=None):
+        super().__init__(Budget(max_rss_bytes=max_rss_bytes), series)
+
+
+class UsesAtMostCpu(MatchesBudget):
+    """
+    Matches a container definition that has used at most the given number of
+    seconds of CPU time. See :class:`MatchesBudget` for ``series``.
+    """
+
+    def __init__(self, max_cpu_seconds, series=None):
+        super().__init__(Budget(max_cpu_seconds=max_cpu_seconds), series)
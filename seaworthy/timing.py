@@ -0,0 +1,161 @@
+"""
+Timing of the phases of resource lifecycle operations, such as setting up or
+halting a container, so that slow fixtures can be broken down into the parts
+that are actually slow.
+
+An operation is timed on the thread that runs it. While it runs, code further
+down the stack (including the helpers) marks its phases with :func:`phase`,
+which does nothing when no operation is being timed.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+import attr
+
+from seaworthy import tracing
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+_listeners = []
+
+
+@attr.s
+class PhaseTiming:
+    """
+    The time taken by one phase of a lifecycle operation.
+    """
+
+    #: The name of the phase, for example ``'create'`` or ``'start'``.
+    name = attr.ib()
+    #: The :func:`time.monotonic` time at which the phase started.
+    started = attr.ib()
+    #: The duration of the phase in seconds.
+    seconds = attr.ib()
+
+
+@attr.s
+class LifecycleTiming:
+    """
+    The time taken by a lifecycle operation on a resource definition, broken
+    down into phases.
+    """
+
+    #: The name of the definition.
+    name = attr.ib()
+    #: The operation, for example ``'setup'`` or ``'halt'``.
+    operation = attr.ib()
+    #: The :func:`time.monotonic` time at which the operation started.
+    started = attr.ib()
+    #: The duration of the operation in seconds.
+    seconds = attr.ib(default=None)
+    #: A list of :class:`PhaseTiming` objects, in the order they finished.
+    phases = attr.ib(default=attr.Factory(list))
+    #: Whether the operation raised an exception.
+    failed = attr.ib(default=False)
+    #: The number of Docker API calls made during the operation, if they
+    #: were recorded (see :mod:`seaworthy.instrumentation`).
+    api_calls = attr.ib(default=0)
+
+    def phase_seconds(self, name):
+        """
+        Get the total time spent in the named phase, or ``0.0`` if there was
+        no such phase.
+        """
+        return sum(p.seconds for p in self.phases if p.name == name)
+
+
+def add_listener(listener):
+    """
+    Register a function to be called with ``(definition, timing)`` whenever
+    any definition finishes a timed operation.
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """
+    Unregister a function that was registered with :func:`add_listener`.
+    """
+    _listeners.remove(listener)
+
+
+def current_operation():
+    """
+    Get the :class:`LifecycleTiming` of the operation being timed on this
+    thread, or ``None``.
+    """
+    return getattr(_local, 'operation', None)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Time a phase of the operation being timed on this thread, if there is
+    one.
+    """
+    timing = current_operation()
+    if timing is None:
+        yield
+        return
+
+    start = time.monotonic()
+    try:
+        with tracing.span(name, 'phase', definition=timing.name):
+            yield
+    finally:
+        timing.phases.append(
+            PhaseTiming(name, start, time.monotonic() - start))
+
+
+@contextlib.contextmanager
+def operation(definition, name):
+    """
+    Time a lifecycle operation on a definition. When it finishes, the timing
+    is stored in the definition's ``timings`` dict (keyed by operation name)
+    and passed to the definition's ``timing_listeners`` and then to the
+    global listeners.
+
+    If another operation is already being timed on this thread (for example,
+    ``run()`` called from ``setup()``), the outer operation absorbs the
+    phases of the inner one and nothing else is recorded.
+    """
+    if current_operation() is not None:
+        yield current_operation()
+        return
+
+    timing = LifecycleTiming(definition.name, name, time.monotonic())
+    _local.operation = timing
+    try:
+        with tracing.span('{} {}'.format(name, definition.name), 'lifecycle',
+                          definition=definition.name, operation=name):
+            yield timing
+    except BaseException:
+        timing.failed = True
+        raise
+    finally:
+        _local.operation = None
+        timing.seconds = time.monotonic() - timing.started
+        _report(definition, timing)
+
+
+def _report(definition, timing):
+    log.debug("{} '{}' took {:.3f}s ({})".format(
+        timing.operation.title(), timing.name, timing.seconds,
+        ', '.join('{} {:.3f}s'.format(p.name, p.seconds)
+                  for p in timing.phases)))
+
+    definition.timings[timing.operation] = timing
+    for listener in list(definition.timing_listeners) + list(_listeners):
+        try:
+            listener(definition, timing)
+        except Exception:
+            log.exception('Error in timing listener {!r}'.format(listener))
+
+
+__all__ = [
+    'LifecycleTiming', 'PhaseTiming', 'add_listener', 'current_operation',
+    'operation', 'phase', 'remove_listener']
@@ -0,0 +1,154 @@
+"""
+Recording of resource lifecycle spans in the `Trace Event format`_, so
+that a test run can be viewed as a timeline in ``chrome://tracing`` or
+`Perfetto`_.
+
+Tracing is off until :func:`start_tracing` is called, and :func:`span` costs
+almost nothing while it is off. Spans are recorded for definition lifecycle
+operations and their phases (see :mod:`seaworthy.timing`), waiting for log
+lines, cleaning containers and helper teardown.
+
+.. _`Trace Event format`:
+    https://perfetto.dev/docs/getting-started/other-formats
+.. _`Perfetto`: https://ui.perfetto.dev/
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+_recorder = None
+
+
+class TraceRecorder:
+    """
+    Collect spans in memory, as Chrome trace events.
+    """
+
+    def __init__(self, process_name=None):
+        """
+        :param process_name:
+            A name for the process the spans are recorded in, shown in trace
+            viewers. Defaults to the pytest-xdist worker ID if there is one.
+        """
+        if process_name is None:
+            process_name = os.environ.get('PYTEST_XDIST_WORKER', 'seaworthy')
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, category, start, end, args=None):
+        """
+        Record a complete span.
+
+        :param start: The start time, in seconds since the epoch.
+        :param end: The end time, in seconds since the epoch.
+        :param args: A dict of extra information about the span.
+        """
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self.pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self._events.append(event)
+
+    def extend(self, events):
+        """
+        Add events recorded elsewhere, such as in another process.
+        """
+        with self._lock:
+            self._events.extend(events)
+
+    def events(self):
+        """
+        Get the recorded events, with metadata events naming this process and
+        the threads that recorded spans.
+        """
+        metadata = [{
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+            'args': {'name': self.process_name},
+        }]
+        with self._lock:
+            for tid, name in sorted(self._threads.items()):
+                metadata.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                    'tid': tid, 'args': {'name': name},
+                })
+            return metadata + list(self._events)
+
+    def write(self, path):
+        """
+        Write the events to a JSON file that trace viewers can load.
+        """
+        with open(path, 'w') as f:
+            json.dump(
+                {'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+
+
+def start_tracing(process_name=None):
+    """
+    Start recording spans in this process.
+
+    :returns: The new :class:`TraceRecorder`.
+    """
+    global _recorder
+    _recorder = TraceRecorder(process_name)
+    return _recorder
+
+
+def stop_tracing():
+    """
+    Stop recording spans.
+
+    :returns: The :class:`TraceRecorder` that was recording, or ``None``.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def tracing_enabled():
+    """
+    Whether spans are being recorded.
+    """
+    return _recorder is not None
+
+
+@contextlib.contextmanager
+def span(name, category='seaworthy', **args):
+    """
+    Record a span around the code in the block, if tracing has been started.
+
+    :param name: The name of the span.
+    :param category: The category of the span, for filtering in viewers.
+    :param args: Extra information about the span.
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        recorder.add_span(name, category, start, time.time(), args)
+
+
+__all__ = [
+    'TraceRecorder', 'span', 'start_tracing', 'stop_tracing',
+    'tracing_enabled']
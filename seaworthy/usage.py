@@ -0,0 +1,318 @@
+"""
+Sampling of the resources (CPU, memory, block I/O and network) used by a
+container over time, so that tests can make assertions about them.
+
+A :class:`ResourceSampler` reads a container's counters at a regular interval
+in a background thread and stores them in a :class:`UsageSeries`::
+
+    sampler = container.sample_resources(interval=0.5)
+    ...  # Exercise the container
+    sampler.stop()
+    print(sampler.series.summary('memory_bytes'))
+    with open('usage.csv', 'w') as f:
+        sampler.series.write_csv(f)
+
+The CPU, block I/O and network counters are cumulative since the container
+started. Memory usage is the current usage, not counting the page cache.
+
+By default the counters are read from the container's cgroup files (see
+:mod:`seaworthy.cgroups`), which is much cheaper than the Docker stats API,
+falling back to the API where the files can't be read.
+"""
+
+import array
+import csv
+import json
+import logging
+import threading
+import time
+
+import attr
+
+import docker
+
+from seaworthy.cgroups import CgroupStatsReader
+
+
+log = logging.getLogger(__name__)
+
+#: The counters in each sample, in the order they are stored.
+FIELDS = (
+    'cpu_seconds', 'memory_bytes', 'blkio_read_bytes', 'blkio_write_bytes',
+    'net_rx_bytes', 'net_tx_bytes')
+
+
+def _blkio_bytes(blkio_stats, op):
+    entries = (blkio_stats or {}).get('io_service_bytes_recursive') or []
+    return sum(e['value'] for e in entries if e.get('op', '').lower() == op)
+
+
+def parse_api_stats(stats):
+    """
+    Convert the result of a Docker stats API call into a dict of counters
+    named by :data:`FIELDS`.
+    """
+    cpu = stats.get('cpu_stats', {}).get('cpu_usage', {})
+    memory = stats.get('memory_stats', {})
+    memory_detail = memory.get('stats', {})
+    # Like the Docker CLI, leave out inactive page cache (cgroup v2 names it
+    # differently).
+    cache = memory_detail.get(
+        'total_inactive_file', memory_detail.get('inactive_file', 0))
+    networks = (stats.get('networks') or {}).values()
+    blkio = stats.get('blkio_stats')
+    return {
+        'cpu_seconds': cpu.get('total_usage', 0) / 1e9,
+        'memory_bytes': max(memory.get('usage', 0) - cache, 0),
+        'blkio_read_bytes': _blkio_bytes(blkio, 'read'),
+        'blkio_write_bytes': _blkio_bytes(blkio, 'write'),
+        'net_rx_bytes': sum(n.get('rx_bytes', 0) for n in networks),
+        'net_tx_bytes': sum(n.get('tx_bytes', 0) for n in networks),
+    }
+
+
+def api_stats(container):
+    """
+    Read a container's counters with the Docker stats API. Note that the
+    daemon takes a second or two to answer, because it measures CPU usage
+    over an interval.
+
+    :param container: The Docker container model.
+    """
+    return parse_api_stats(container.stats(stream=False))
+
+
+@attr.s
+class UsageSummary:
+    """
+    A summary of one field of a :class:`UsageSeries`.
+    """
+
+    #: The name of the field.
+    name = attr.ib()
+    #: The number of samples.
+    count = attr.ib()
+    #: The smallest value.
+    min = attr.ib()
+    #: The largest value.
+    max = attr.ib()
+    #: The mean value.
+    mean = attr.ib()
+    #: A dict mapping percentiles (0 to 100) to values.
+    percentiles = attr.ib(default=attr.Factory(dict))
+
+
+def percentile(values, pct):
+    """
+    Get a percentile of some sorted values, interpolating linearly between
+    the closest values.
+
+    :param values: A non-empty sorted sequence of numbers.
+    :param pct: The percentile, from 0 to 100.
+    """
+    position = (len(values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class UsageSeries:
+    """
+    A time series of resource usage samples. Each field is stored in its own
+    array of doubles, so long series stay small.
+    """
+
+    def __init__(self):
+        #: The :func:`time.time` of each sample.
+        self.timestamps = array.array('d')
+        self._columns = {name: array.array('d') for name in FIELDS}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp, counters):
+        """
+        Add a sample.
+
+        :param timestamp: The :func:`time.time` of the sample.
+        :param counters: A dict with a value for each of :data:`FIELDS`.
+        """
+        with self._lock:
+            for name in FIELDS:
+                self._columns[name].append(counters[name])
+            self.timestamps.append(timestamp)
+
+    def column(self, name):
+        """
+        Get a copy of the values of a field, as an array.
+        """
+        with self._lock:
+            return array.array('d', self._columns[name])
+
+    def latest(self):
+        """
+        Get the latest sample as a dict, or ``None`` if there isn't one.
+        """
+        with self._lock:
+            if not self.timestamps:
+                return None
+            sample = {n: self._columns[n][-1] for n in FIELDS}
+            sample['timestamp'] = self.timestamps[-1]
+            return sample
+
+    def summary(self, name, percentiles=(50, 90, 99)):
+        """
+        Summarise a field.
+
+        :param name: The field, one of :data:`FIELDS`.
+        :param percentiles: The percentiles to calculate.
+        :returns: A :class:`UsageSummary`, or ``None`` if there are no
+            samples.
+        """
+        values = sorted(self.column(name))
+        if not values:
+            return None
+        return UsageSummary(
+            name, len(values), values[0], values[-1],
+            sum(values) / len(values),
+            {p: percentile(values, p) for p in percentiles})
+
+    def summaries(self, percentiles=(50, 90, 99)):
+        """
+        Summarise every field.
+
+        :returns: A dict mapping field names to :class:`UsageSummary`
+            objects.
+        """
+        return {name: self.summary(name, percentiles) for name in FIELDS}
+
+    def rows(self):
+        """
+        Get the samples as a list of tuples of the timestamp and then each
+        of :data:`FIELDS`.
+        """
+        with self._lock:
+            columns = [self.timestamps] + [self._columns[n] for n in FIELDS]
+            return list(zip(*columns))
+
+    def write_csv(self, f):
+        """
+        Write the samples to a file as CSV, with a header row.
+        """
+        writer = csv.writer(f)
+        writer.writerow(('timestamp',) + FIELDS)
+        writer.writerows(self.rows())
+
+    def as_dict(self):
+        """
+        Get the samples as a dict of lists, keyed by ``'timestamp'`` and each
+        of :data:`FIELDS`.
+        """
+        with self._lock:
+            result = {n: list(self._columns[n]) for n in FIELDS}
+            result['timestamp'] = list(self.timestamps)
+            return result
+
+    def write_json(self, f):
+        """
+        Write the samples to a file as JSON (see :meth:`as_dict`).
+        """
+        json.dump(self.as_dict(), f)
+
+
+class ResourceSampler:
+    """
+    Sample a container's resource usage at a regular interval in a
+    background thread.
+
+    Sampling stops when :meth:`stop` is called or the container goes away.
+    Errors reading the counters are logged and the sample is skipped.
+    """
+
+    def __init__(self, container, interval=1.0, source=None):
+        """
+        :param container:
+            The :class:`~seaworthy.definitions.ContainerDefinition` to
+            sample. It must have been created.
+        :param interval: The number of seconds between samples.
+        :param source:
+            A function that reads the counters from the Docker container
+            model. Defaults to a
+            :class:`~seaworthy.cgroups.CgroupStatsReader` that falls back
+            to :func:`api_stats`.
+        """
+        if source is None:
+            source = CgroupStatsReader(fallback=api_stats)
+        self.container = container
+        self.interval = interval
+        self.source = source
+        #: The :class:`UsageSeries` the samples are stored in.
+        self.series = UsageSeries()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample(self):
+        """
+        Take a sample now, on this thread.
+
+        :returns: The counters that were recorded.
+        """
+        counters = self.source(self.container.inner())
+        self.series.append(time.time(), counters)
+        return counters
+
+    def start(self):
+        """
+        Start sampling in the background.
+
+        :returns: This sampler.
+        """
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, daemon=True,
+                name='seaworthy-usage-{}'.format(self.container.name))
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            start = time.monotonic()
+            try:
+                self.sample()
+            except (docker.errors.NotFound, RuntimeError):
+                # The container has been removed.
+                break
+            except Exception:
+                log.exception('Error sampling resource usage of {}'.format(
+                    self.container.name))
+            elapsed = time.monotonic() - start
+            self._stopped.wait(max(self.interval - elapsed, 0))
+
+    def stop(self):
+        """
+        Stop sampling and wait for the background thread to finish.
+
+        :returns: The :class:`UsageSeries`.
+        """
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        return self.series
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+__all__ = [
+    'FIELDS', 'ResourceSampler', 'UsageSeries', 'UsageSummary', 'api_stats',
+    'parse_api_stats', 'percentile']
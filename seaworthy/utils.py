@@ -1,6 +1,14 @@
+import calendar
+import re
+from datetime import datetime
+
 from docker.models.containers import ExecResult
 
 
+_RFC3339_RE = re.compile(
+    r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)$')
+
+
 def output_lines(output, encoding='utf-8'):
     """
     Convert bytestring container output or the result of a container exec
@@ -18,3 +26,26 @@ def output_lines(output, encoding='utf-8'):
         _, output = output
 
     return output.decode(encoding).splitlines()
+
+
+def parse_rfc3339_nano(value):
+    """
+    Parse an RFC 3339 time from the Docker API, with up to nanosecond
+    precision, into nanoseconds since the epoch.
+
+    :param value: The time string, such as ``2018-12-06T10:11:12.5Z``.
+
+    :returns: int
+    :raises ValueError: If the time isn't in RFC 3339 format.
+    """
+    match = _RFC3339_RE.match(value)
+    if match is None:
+        raise ValueError("Unknown timestamp format: '{}'".format(value))
+    dt_str, fraction, offset = match.groups()
+    seconds = calendar.timegm(
+        datetime.strptime(dt_str, '%Y-%m-%dT%H:%M:%S').timetuple())
+    if offset != 'Z':
+        sign = -1 if offset[0] == '+' else 1
+        hours, minutes = offset[1:].split(':')
+        seconds += sign * (int(hours) * 3600 + int(minutes) * 60)
+    return seconds * 10**9 + int((fraction or '0')[:9].ljust(9, '0'))
@@ -79,6 +79,7 @@ setup(
         'Topic :: Software Development :: Testing',
     ],
     entry_points={
+        'console_scripts': ['seaworthy-reap = seaworthy.reaper:main'],
         'pytest11': ['seaworthy = seaworthy.pytest'],
     },
 )